@@ -0,0 +1,61 @@
+"""Compare memos per second of the available memo crypto backends
+
+Usage: python benchmarks/bench_memo_crypto.py [NB_MEMOS]
+
+"""
+
+import sys
+import time
+
+from ecdsa import SigningKey, SECP256k1
+
+from pyc3l import CryptoAsim
+
+
+def main(nb=500):
+    private_key = SigningKey.generate(curve=SECP256k1)
+    private_key_hex = private_key.to_string().hex()
+    public_key_hex = private_key.get_verifying_key().to_string().hex()
+    memos = [f"Payout n°{i} of the month" for i in range(nb)]
+
+    ciphered = None
+    for name in CryptoAsim.BACKENDS:
+        try:
+            backend = CryptoAsim.get_backend(name)
+        except ImportError:
+            print(f"{name:>10}: not available")
+            continue
+
+        start = time.time()
+        encrypted = [
+            CryptoAsim.EncryptMessage(public_key_hex, memo, backend=name)
+            for memo in memos
+        ]
+        enc_rate = nb / (time.time() - start)
+
+        start = time.time()
+        for e in encrypted:
+            CryptoAsim.DecryptMessage(private_key_hex, e, backend=name)
+        dec_rate = nb / (time.time() - start)
+
+        start = time.time()
+        res = CryptoAsim.decrypt_many(private_key_hex, encrypted, backend=name)
+        many_rate = nb / (time.time() - start)
+        assert res == memos
+
+        ## wire compatibility between backends
+        if ciphered is not None:
+            assert CryptoAsim.decrypt_many(
+                private_key_hex, ciphered, backend=backend.name, processes=1
+            ) == memos
+        ciphered = encrypted
+
+        print(
+            f"{name:>10}: encrypt {enc_rate:9.1f} memo/s, "
+            f"decrypt {dec_rate:9.1f} memo/s, "
+            f"decrypt_many {many_rate:9.1f} memo/s"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,63 @@
+"""Rows per second of TxStore ingestion, one by one vs bulk
+
+Usage: python benchmarks/bench_txstore_ingest.py [NB_TXS]
+
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from pyc3l.store import TxStore
+
+
+def synthetic_txs(nb, nb_accounts=5000):
+    """Cheap deterministic generator, not to benchmark ``random``"""
+    accounts = [f"0x{(a * 2654435761) % 2**160:040x}" for a in range(nb_accounts)]
+    for i in range(nb):
+        kind = "pledge" if i % 20 == 0 else "transfer"
+        yield {
+            "hash": f"0x{i:064x}",
+            "block": i // 5,
+            "received_at": 1600000000 + i * 3,
+            "caller": accounts[i % nb_accounts],
+            "contract": "0x" + "c" * 40,
+            "contract_abi": "XXX-1",
+            "fn": "a5f7c148",
+            "fn_abi": "nantTransfer" if kind == "transfer" else "pledge",
+            "type": kind,
+            "sender": accounts[(i * 7919) % nb_accounts],
+            "receiver": accounts[(i * 104729) % nb_accounts],
+            "amount": (i * 31) % 100000 + 1,
+            "status": 0,
+        }
+
+
+def main(nb=1000000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["PYC3L_CACHE_DIR"] = tmpdir
+
+        ## one by one, on a sample as it is slow
+        sample = min(nb, 20000)
+        for label, commit_every in (("one transaction", sample), ("commit per block", 5)):
+            store = TxStore(None, f"bench_single_{commit_every}", None)
+            start = time.time()
+            for i, tx in enumerate(synthetic_txs(sample)):
+                store.add_tx(tx)
+                if i % commit_every == commit_every - 1:
+                    store.commit()
+            store.commit()
+            elapsed = time.time() - start
+            print(f"add_tx:  {sample:>9} rows, {sample / elapsed:>10.0f} rows/s ({label})")
+
+        store = TxStore(None, "bench_bulk", None)
+        start = time.time()
+        with store.bulk_ingest():
+            store.add_txs(synthetic_txs(nb))
+        elapsed = time.time() - start
+        print(f"add_txs: {nb:>9} rows, {nb / elapsed:>10.0f} rows/s (bulk_ingest)")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
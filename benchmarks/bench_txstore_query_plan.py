@@ -0,0 +1,107 @@
+"""Check that TxStore report queries use the transactions indexes
+
+Builds a store of NB_TXS synthetic transactions, then prints the
+``EXPLAIN QUERY PLAN`` and timing of the report queries, as built by
+``TxStore._record_query()`` and ``TxStore._records_query()``. Exits
+with an error if a query doesn't use its expected indexes.
+
+Usage: python benchmarks/bench_txstore_query_plan.py [NB_TXS]
+
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from pyc3l.store import TxStore
+
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_txstore_ingest import synthetic_txs  # noqa: E402
+
+
+DAY = 24 * 60 * 60
+
+
+class Date:
+    """Bare date argument of ``TxStore.records()``"""
+
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+
+
+def main(nb=3000000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["PYC3L_CACHE_DIR"] = tmpdir
+        txs = list(synthetic_txs(1000))
+        safe_wallets = [txs[0]["sender"], txs[1]["receiver"]]
+        store = TxStore(None, "bench", safe_wallets)
+        start = time.time()
+        with store.bulk_ingest():
+            store.add_txs(synthetic_txs(nb))
+        print(f"Loaded {nb} rows in {time.time() - start:.1f}s")
+        conn = store._sqlite3_conn
+        conn.execute("ANALYZE")
+
+        (account, ) = conn.execute(
+            "SELECT sender FROM transactions LIMIT 1").fetchone()
+        (t0, ) = conn.execute(
+            "SELECT received_at FROM transactions ORDER BY rowid DESC LIMIT 1"
+        ).fetchone()
+        t0 -= 2 * DAY
+
+        ## queries issued by the store, and the indexes they must use
+        queries = {
+            "records (date range)": (
+                store._records_query(
+                    "%Y-%m-%d", Date(t0), Date(t0 + DAY),
+                    address_groups={"shops": [tx["receiver"] for tx in txs[:50]]},
+                ),
+                ["idx_tx_received_at", "sqlite_autoindex_address_groups_1"],
+            ),
+            "monthly totals (rollups)": (
+                store._record_query("%Y-%m"),
+                ["sqlite_autoindex_rollups_1"],
+            ),
+            "weekly totals (safe wallets)": (
+                store._record_query("%Y-%W"),
+                ["sqlite_autoindex_safe_wallets_1"],
+            ),
+        }
+        ## ad hoc queries the secondary indexes are also meant for
+        queries.update({
+            "account sent (date range)": (
+                ("SELECT * FROM transactions WHERE sender = ? AND received_at >= ?",
+                 (account, t0)),
+                ["idx_tx_sender_received_at"],
+            ),
+            "account received (date range)": (
+                ("SELECT * FROM transactions WHERE receiver = ? AND received_at >= ?",
+                 (account, t0)),
+                ["idx_tx_receiver_received_at"],
+            ),
+            "pledges (date range)": (
+                ("""
+                SELECT SUM(amount), COUNT(*) FROM transactions
+                WHERE type = 'pledge' AND received_at >= ?
+                """, (t0, )),
+                ["idx_tx_type_received_at"],
+            ),
+        })
+        failed = False
+        for label, ((sql, params), indexes) in queries.items():
+            plan = [r[-1] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            start = time.time()
+            rows = len(conn.execute(sql, params).fetchall())
+            elapsed = time.time() - start
+            ok = all(any(index in line for line in plan) for index in indexes)
+            failed = failed or not ok
+            print(f"{'OK ' if ok else 'KO '} {label}: {rows} rows in {elapsed * 1000:.1f}ms")
+            for line in plan:
+                print(f"      {line}")
+        store.close()
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,84 @@
+"""Report query time of TxStore by number of safe wallets
+
+Compares the joined ``temp.safe_wallets`` classification of
+``_record_sql`` with the former parameter-expanded ``IN`` lists, for
+1 to 1000 safe wallets, on NB_TXS synthetic transactions.
+
+Usage: python benchmarks/bench_txstore_safe_wallets.py [NB_TXS]
+
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from pyc3l.store import TxStore
+
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_txstore_ingest import synthetic_txs  # noqa: E402
+
+
+NB_ACCOUNTS = 5000
+
+
+def in_lists_record_sql(store, safe_wallets, granularity="%Y-%m"):
+    """Former classification with ten ``IN (?, ...)`` lists"""
+    safe_wallets_sql = f"({','.join(['?' for _ in safe_wallets])})"
+    is_topup_sql = f"(type = 'pledge' AND receiver NOT IN {safe_wallets_sql})"
+    is_topup_sql += " OR "
+    is_topup_sql += f"(type = 'transfer' AND sender IN {safe_wallets_sql})"
+    is_transfer_sql = f"(type = 'transfer' AND sender NOT IN {safe_wallets_sql}"
+    is_transfer_sql += f" AND receiver NOT IN {safe_wallets_sql})"
+    is_reconv_sql = f"(type = 'transfer' AND receiver IN {safe_wallets_sql})"
+    query = f"""
+        SELECT
+            strftime(?, received_at, 'unixepoch') AS month,
+            SUM(CASE WHEN {is_topup_sql} THEN amount ELSE 0 END)/100.0,
+            COUNT(CASE WHEN {is_topup_sql} THEN 1 ELSE NULL END),
+            SUM(CASE WHEN {is_transfer_sql} THEN amount ELSE 0 END)/100.0,
+            COUNT(CASE WHEN {is_transfer_sql} THEN 1 ELSE NULL END),
+            SUM(CASE WHEN {is_reconv_sql} THEN amount ELSE 0 END)/100.0,
+            COUNT(CASE WHEN {is_reconv_sql} THEN 1 ELSE NULL END)
+        FROM transactions
+        GROUP BY month
+        ORDER BY month
+    """
+    params = [granularity] + 10 * list(safe_wallets)
+    return [tuple(r) for r in store._sqlite3_conn.execute(query, params)]
+
+
+def timed(fn):
+    start = time.time()
+    result = fn()
+    return time.time() - start, result
+
+
+def main(nb=500000):
+    accounts = [
+        f"0x{(a * 2654435761) % 2**160:040x}" for a in range(NB_ACCOUNTS)
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["PYC3L_CACHE_DIR"] = tmpdir
+        with TxStore(None, "bench", None).bulk_ingest() as store:
+            store.add_txs(synthetic_txs(nb, nb_accounts=NB_ACCOUNTS))
+        print(f"{nb} transactions")
+        for nb_safe in (1, 10, 100, 1000):
+            safe_wallets = accounts[:nb_safe]
+            store = TxStore(None, "bench", safe_wallets)
+            joined_time, joined = timed(
+                lambda: list(store._record_sql(use_rollups=False))
+            )
+            in_lists_time, in_lists = timed(
+                lambda: in_lists_record_sql(store, safe_wallets)
+            )
+            same = [r[:7] for r in joined] == in_lists
+            print(
+                f"{nb_safe:5d} safe wallets: join {joined_time:6.2f}s, "
+                f"IN lists {in_lists_time:6.2f}s"
+                f"{'' if same else ' (RESULTS DIFFER)'}"
+            )
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
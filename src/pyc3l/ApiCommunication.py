@@ -1,10 +1,13 @@
 import logging
 import inspect
 import re
+import time
 from typing import NewType
+from concurrent.futures import ThreadPoolExecutor
 
 
 from .CryptoAsim import EncryptMessage, DecryptMessage
+from .pcache import PersistentTTLCache
 
 
 logger = logging.getLogger(__name__)
@@ -43,6 +46,69 @@ def encodeAddressForTransaction(address):
     return full_address.zfill(64)
 
 
+def input_words(input_hex):
+    """Return the 32 bytes words (as hex) of the arguments of a call
+
+    >>> input_words("0x12345678" + "00" * 31 + "0a")
+    ['000000000000000000000000000000000000000000000000000000000000000a']
+
+    """
+    args = input_hex[10:]
+    return [args[i:i + 64] for i in range(0, len(args), 64)]
+
+
+def word_to_address(word):
+    return "0x" + word[24:]
+
+
+def word_to_int(word):
+    """Decode a signed int256 word
+
+    >>> word_to_int("f" * 64)
+    -1
+    >>> word_to_int("0" * 62 + "64")
+    100
+
+    """
+    value = int(word, 16)
+    return value - 2 ** 256 if value >= 2 ** 255 else value
+
+
+WORD_DECODERS = {
+    Address: word_to_address,
+    Uint256: lambda word: int(word, 16),
+    Amount: word_to_int,
+    Bool: lambda word: bool(int(word, 16)),
+    int: word_to_int,
+}
+
+
+def abi_args_decoder(fn):
+    """Return a function decoding the input of a call to ABI ``fn``
+
+    The function returns a dict of the arguments by name, or None if
+    the input is too short.
+
+    >>> def transfer(dest: Address, amount: int): "a5f7c148"
+    >>> decode = abi_args_decoder(transfer)
+    >>> decode("0xa5f7c148" + "0" * 24 + "ab" * 20 + "f" * 64)
+    {'dest': '0xabababababababababababababababababababab', 'amount': -1}
+    >>> decode("0xa5f7c148") is None
+    True
+
+    """
+    sig = inspect.getfullargspec(fn)
+    decoders = [(name, WORD_DECODERS[sig.annotations[name]]) for name in sig.args]
+
+    def decode(input_hex):
+        words = input_words(input_hex)
+        if len(words) < len(decoders):
+            return None
+        return {name: decoder(word) for (name, decoder), word in zip(decoders, words)}
+
+    return decode
+
+
 class MetaABI(type):
 
     def __new__(cls, name, bases, dct):
@@ -65,6 +131,10 @@ class MetaABI(type):
             (fn_hex, key)
             for key, fn_hex in new_cls._transaction_functions.items()
         ])
+        new_cls._transaction_decoders = dict([
+            (key, abi_args_decoder(dct[key]))
+            for key in new_cls._transaction_functions.keys()
+        ])
         return new_cls
 
     
@@ -213,6 +283,10 @@ class Contract:
 
 class ApiCommunication:
 
+    MESSAGE_KEY_TTL = 24 * 60 * 60  ## 1 day
+    ## seconds an admin status is trusted without checking for a new block
+    ADMIN_CACHE_TTL = 2
+
     def __init__(self, currency_name, pyc3l, abi=ComChainABI):
         self._currency_name = currency_name
 
@@ -222,6 +296,8 @@ class ApiCommunication:
 
         self._comchain = None
         self._abi = abi
+        ## address -> (block number, checked at, (is admin, has gas))
+        self._admin_cache = {}
 
     @property
     def comchain(self):
@@ -255,20 +331,102 @@ class ApiCommunication:
             server["contract_2"],
         )
 
-    def checkAdmin(self, address):
-        if not self.getAccountIsValidAdmin(address):
+    def checkAdmin(self, address, snapshot=None):
+        is_admin, has_gas = self._admin_status(address, snapshot)
+        if not is_admin:
             raise Exception(
                 f"The provided account {address} is not an "
                 f"active admin on f{self._currency_name}"
                 f" ({self.contracts[0]})"
             )
 
-        if not self.getAccountHasEnoughGas(address):
+        if not has_gas:
             raise Exception(
                 f"The provided account {address} has not enough gas."
             )
 
+    def _admin_status(self, address, snapshot=None):
+        """Return (is valid admin, has enough gas) of ``address``
+
+        Values are taken from ``snapshot`` if available, otherwise they
+        are fetched concurrently and cached until a new block is mined.
+        The block number itself is only checked again after
+        ``ADMIN_CACHE_TTL`` seconds, so that checks in a row cost no
+        request.
+
+        """
+        entry = (snapshot or {}).get(address.lower(), {})
+        if "IsValidAdmin" in entry and "HasEnoughGas" in entry:
+            return entry["IsValidAdmin"], entry["HasEnoughGas"]
+
+        now = time.monotonic()
+        cached = self._admin_cache.get(address.lower())
+        if cached is not None and now - cached[1] < self.ADMIN_CACHE_TTL:
+            return cached[2]
+        block = self._pyc3l.getBlockNumber()
+        if cached is not None and cached[0] == block:
+            self._admin_cache[address.lower()] = (block, now, cached[2])
+            return cached[2]
+        infos = self._preflight([
+            ("Type", address),
+            ("IsActive", address),
+            ("HasEnoughGas", address),
+        ])
+        status = (
+            infos[("Type", address)] == 2 and infos[("IsActive", address)] == True,
+            infos[("HasEnoughGas", address)],
+        )
+        self._admin_cache[address.lower()] = (block, now, status)
+        return status
+
+    ############################### Preflight reads
+
+    def _read_account(self, field, address):
+        return getattr(self, f"getAccount{field}")(address)
+
+    def _preflight(self, reads, snapshot=None):
+        """Return dict of ``(field, address)`` -> value for given reads
 
+        ``field`` is the name of an account getter without the
+        ``getAccount`` prefix (ie: ``"IsActive"``, ``"NantBalance"``...).
+        Values available in ``snapshot`` (as returned by
+        :meth:`snapshot`) cost nothing, the others are fetched
+        concurrently.
+
+        """
+        snapshot = snapshot or {}
+        results = {}
+        missing = []
+        for field, address in dict.fromkeys(reads):
+            entry = snapshot.get(address.lower(), {})
+            if field in entry:
+                results[(field, address)] = entry[field]
+            else:
+                missing.append((field, address))
+        if len(missing) == 1:
+            results[missing[0]] = self._read_account(*missing[0])
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(len(missing), 8)) as executor:
+                values = executor.map(lambda r: self._read_account(*r), missing)
+                results.update(zip(missing, values))
+        return results
+
+    def snapshot(self, addresses, fields=("IsActive", "NantBalance"), max_workers=8):
+        """Prefetch concurrently account values for batch operations
+
+        Returns a dict ``{address: {field: value}}`` (with lower case
+        addresses) that can be given as ``snapshot`` argument to
+        transfer, pledge and admin methods to skip their preflight
+        reads.
+
+        """
+        reads = [(field, address) for address in addresses for field in fields]
+        snapshot = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            values = executor.map(lambda r: self._read_account(*r), reads)
+            for (field, address), value in zip(reads, values):
+                snapshot.setdefault(address.lower(), {})[field] = value
+        return snapshot
 
     ############################### messages with transaction handling
     def getMessageKeys(self, address, with_private):
@@ -277,16 +435,76 @@ class ApiCommunication:
             params["private"] = 1
         return self.endpoint.keys.get(params=params)
 
+    @property
+    def message_key_cache(self):
+        return PersistentTTLCache("message_keys", ttl=self.MESSAGE_KEY_TTL)
+
+    def getPublicMessageKey(self, address, use_cache=True):
+        """Return public message key of address or None if it has none
+
+        Keys are kept in a persistent cache for ``MESSAGE_KEY_TTL``
+        seconds. Accounts without keys are not cached.
+
+        """
+        key = address.lower()
+        if use_cache:
+            try:
+                return self.message_key_cache[key]
+            except KeyError:
+                pass
+        response = self.getMessageKeys(address, False)
+        public_message_key = response.get("public_message_key")
+        if public_message_key is not None:
+            self.message_key_cache[key] = public_message_key
+        return public_message_key
+
+    def prefetchMessageKeys(self, addresses, max_workers=8):
+        """Fetch concurrently public message keys not yet in cache
+
+        Returns the dict of address -> public message key for all
+        addresses having one.
+
+        """
+        keys = [address.lower() for address in addresses]
+        cache = self.message_key_cache
+        found = cache.get_many(keys)
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing:
+            logger.info("Fetching %d public message keys", len(missing))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                responses = executor.map(
+                    lambda a: self.getMessageKeys(a, False), missing
+                )
+                fetched = {
+                    address: response["public_message_key"]
+                    for address, response in zip(missing, responses)
+                    if response.get("public_message_key") is not None
+                }
+            cache.set_many(fetched)
+            found.update(fetched)
+        return found
+
+    def invalidateMessageKeys(self, *addresses):
+        """Remove given addresses (or all if none given) from the key cache"""
+        cache = self.message_key_cache
+        if not addresses:
+            cache.clear()
+            return
+        for address in addresses:
+            try:
+                del cache[address.lower()]
+            except KeyError:
+                pass
+
     def encryptTransactionMessage(self, plain_text, **kwargs):
         # if public_message_key is present use it if not get the key from the address
         if "public_message_key" in kwargs:
             public_message_key = kwargs["public_message_key"]
         elif "address" in kwargs:
-            response = self.getMessageKeys(kwargs["address"], False)
-            if "public_message_key" not in response:
+            public_message_key = self.getPublicMessageKey(kwargs["address"])
+            if public_message_key is None:
                 logger.warn("No message key for account %s", kwargs["address"])
                 return "", ""
-            public_message_key = response["public_message_key"]
         else:
             raise ValueError("public_message_key or address agrgument must be present")
 
@@ -326,7 +544,7 @@ class ApiCommunication:
         return int(self._pyc3l.getTrInfos(address)["balance"]) > min_gas
 
     ############################### High level Transactions
-    def transferNant(self, account, dest_address, amount, **kwargs):
+    def transferNant(self, account, dest_address, amount, snapshot=None, **kwargs):
         # message_from="", message_to=""):
         """Transfer Nantissed current Currency (server) from the sender to the destination wallet
 
@@ -334,6 +552,7 @@ class ApiCommunication:
         account (eth_account import::Account): An account with enough balance on the current server. Will sign the transaction
         dest_address (string): The public address of the wallet to be credited (0x12345... format)
         amount (double): amount (in the current Currency) to be transfered from the sender wallet to the destination wallet
+        snapshot (dict): optional pre-fetched account values (see ``snapshot()``)
 
         """
 
@@ -353,15 +572,20 @@ class ApiCommunication:
         else:
             ciphered_message_to = ""
 
-        # Get sender wallet infos
-        if not self.getAccountIsActive(account.address):
+        # Get sender and destination wallet infos
+        infos = self._preflight([
+            ("IsActive", account.address),
+            ("NantBalance", account.address),
+            ("IsActive", dest_address),
+        ], snapshot)
+        if not infos[("IsActive", account.address)]:
             raise Exception(
                 f"The sender wallet {account.address} is locked "
                 f"on {self._currency_name} ({self.contracts[0]}) "
                 "and therefore cannot initiate a transfer."
             )
 
-        balance = self.getAccountNantBalance(account.address)
+        balance = infos[("NantBalance", account.address)]
         if balance < amount:
             raise Exception(
                 f"The sender wallet {account.address} has an "
@@ -369,8 +593,7 @@ class ApiCommunication:
                 f"({self.contracts[0]}) to complete this transfer."
             )
 
-        # Get destination wallet infos
-        if not self.getAccountIsActive(dest_address):
+        if not infos[("IsActive", dest_address)]:
             raise Exception(
                 f"The destination wallet {dest_address} is locked on "
                 f"{self._currency_name}  ({self.contracts[0]}) and "
@@ -399,7 +622,7 @@ class ApiCommunication:
             ciphered_message_to,
         )
 
-    def transferCM(self, account, dest_address, amount, **kwargs):
+    def transferCM(self, account, dest_address, amount, snapshot=None, **kwargs):
         # message_from="", message_to=""):
         """Transfer Mutual Credit current Currency (server) from the sender to the destination wallet
 
@@ -407,6 +630,7 @@ class ApiCommunication:
         account (eth_account import::Account): An account with enough balance on the current server. Will sign the transaction
         dest_address (string): The public address of the wallet to be credited (0x12345... format)
         amount (double): amount (in the current Currency) to be transfered from the sender wallet to the destination wallet
+        snapshot (dict): optional pre-fetched account values (see ``snapshot()``)
 
         """
         # prepare messages
@@ -424,8 +648,13 @@ class ApiCommunication:
         else:
             ciphered_message_to = ""
 
-        # Get sender wallet infos
-        if not self.getAccountIsActive(account.address):
+        # Get sender and destination wallet infos
+        infos = self._preflight([
+            ("IsActive", account.address),
+            ("CmBalance", account.address),
+            ("IsActive", dest_address),
+        ], snapshot)
+        if not infos[("IsActive", account.address)]:
             raise Exception(
                 "The sender wallet "
                 + account.address
@@ -436,7 +665,7 @@ class ApiCommunication:
                 + ") and therefore cannot initiate a transfer."
             )
 
-        balance = self.getAccountCMBalance(account.address)
+        balance = infos[("CmBalance", account.address)]
         if balance < amount:
             raise Exception(
                 "The sender wallet "
@@ -448,8 +677,7 @@ class ApiCommunication:
                 + ") to complete this transfer."
             )
 
-        # Get destination wallet infos
-        if not self.getAccountIsActive(dest_address):
+        if not infos[("IsActive", dest_address)]:
             raise Exception(
                 "The destination wallet "
                 + dest_address
@@ -484,26 +712,27 @@ class ApiCommunication:
         )
 
     ############################### High level Admin restricted Transactions
-    def enable(self, account, address):
-        return self._lockUnlockAccount(account, address, lock=False)
+    def enable(self, account, address, snapshot=None):
+        return self._lockUnlockAccount(account, address, lock=False, snapshot=snapshot)
 
-    def disable(self, account, address):
-        return self._lockUnlockAccount(account, address, lock=True)
+    def disable(self, account, address, snapshot=None):
+        return self._lockUnlockAccount(account, address, lock=True, snapshot=snapshot)
 
-    def _lockUnlockAccount(self, account, address, lock=True):
+    def _lockUnlockAccount(self, account, address, lock=True, snapshot=None):
         """Lock or unlock an Wallet on the current Currency (server)
 
         Parameters:
         account (eth_account import::Account): An account with admin permission on the current server. Will sign the transaction
         address (string): The public address of the wallet to be locked/unlocked (0x12345... format)
         lock (bool): if True, lock the wallet, if False unlock it
+        snapshot (dict): optional pre-fetched account values (see ``snapshot()``)
 
         """
         # Check the admin
-        self.checkAdmin(account.address)
+        self.checkAdmin(account.address, snapshot)
 
         # Get wallet infos
-        status = self.getAccountIsActive(address)
+        status = self._preflight([("IsActive", address)], snapshot)[("IsActive", address)]
 
         if lock and not status:
             logger.info("The wallet %s is already locked", address)
@@ -512,10 +741,14 @@ class ApiCommunication:
             logger.info("The wallet %s is already unlocked", address)
             return None
 
-        # Get wallet infos
-        acc_type = self.getAccountType(address)
-        lim_m = self.getAccountCmLimitMin(address)
-        lim_p = self.getAccountCmLimitMax(address)
+        infos = self._preflight([
+            ("Type", address),
+            ("CmLimitMin", address),
+            ("CmLimitMax", address),
+        ], snapshot)
+        acc_type = infos[("Type", address)]
+        lim_m = infos[("CmLimitMin", address)]
+        lim_p = infos[("CmLimitMax", address)]
 
         status = 1
         if lock:
@@ -542,20 +775,21 @@ class ApiCommunication:
             self.comchain._get_contract_fn_hexs("setAccountParam")[0],
             data, account)
 
-    def pledge(self, account, address, amount, **kwargs):
+    def pledge(self, account, address, amount, snapshot=None, **kwargs):
         """Pledge a given amount to a Wallet on the current Currency (server)
 
         Parameters:
         account (eth_account import::Account): An account with admin permission on the current server. Will sign the transaction
         address (string): The public address of the wallet to be pledged (0x12345... format)
         amount (double): amount (in the current Currency) to be pledged to the wallet
+        snapshot (dict): optional pre-fetched account values (see ``snapshot()``)
 
         """
         # Check the admin
-        self.checkAdmin(account.address)
+        self.checkAdmin(account.address, snapshot)
 
         # Get wallet infos
-        if not self.getAccountIsActive(address):
+        if not self._preflight([("IsActive", address)], snapshot)[("IsActive", address)]:
             logger.warn(
                 "The target wallet %s is locked on server %s (%s)",
                 address,
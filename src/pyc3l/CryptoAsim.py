@@ -3,12 +3,19 @@ from Crypto.Cipher import AES
 from Crypto.Hash import SHA512
 from ecdsa import SigningKey, SECP256k1, ECDH, VerifyingKey
 
+import os
 import struct
 import hmac
 
+from concurrent.futures import ProcessPoolExecutor
+
 
 ## Code adapted from https://github.com/LimelabsTech/eth-ecies
 ## Match (tested against) the JS code of Biletujo
+##
+## The ECDH part is delegated to a backend: ``coincurve`` (native
+## libsecp256k1) when available, pure python ``ecdsa`` otherwise. Both
+## produce the same wire format.
 
 
 BS = 16
@@ -34,24 +41,98 @@ def AES256CbcEncrypt(bin_data, key=b"0" * 32, iv=b"0" * 16):
     return aes.encrypt(pad(bin_data))
 
 
-def EncryptMessage(publicKey_hex, plainText_string):
-    if publicKey_hex[:2] == "0x":
-        publicKey_hex = publicKey_hex[2:]
-    publicKey_bin = bytearray.fromhex(publicKey_hex)
+class EcdsaBackend:
+    """Pure python ECDH on SECP256k1 using ``ecdsa`` package"""
 
-    # Generate the temporary key
-    ecdh = ECDH(curve=SECP256k1)
-    ecdh.generate_private_key()
+    name = "ecdsa"
 
-    ephemPubKeyEncoded = bytearray.fromhex(ecdh.get_public_key().to_string().hex())
+    def load_private_key(self, privateKey_bin):
+        return SigningKey.from_string(bytes(privateKey_bin), curve=SECP256k1)
 
-    # Load the public key
-    publicKey = VerifyingKey.from_string(publicKey_bin, curve=SECP256k1)
+    def generate_ephemeral_key(self):
+        """Return a new private key and its 64 bytes encoded public key"""
+        ecdh = ECDH(curve=SECP256k1)
+        ecdh.generate_private_key()
+        return ecdh.private_key, ecdh.get_public_key().to_string()
+
+    def shared_secret(self, private_key, publicKey_bin):
+        """Return the x coordinate of the ECDH shared point (32 bytes)"""
+        ecdh = ECDH(curve=SECP256k1, private_key=private_key)
+        ecdh.load_received_public_key(
+            VerifyingKey.from_string(bytes(publicKey_bin), curve=SECP256k1)
+        )
+        return ecdh.generate_sharedsecret_bytes()
+
+
+class CoincurveBackend:
+    """ECDH on SECP256k1 using ``libsecp256k1`` through ``coincurve``"""
+
+    name = "coincurve"
+
+    def __init__(self):
+        import coincurve
+        self._coincurve = coincurve
+
+    def load_private_key(self, privateKey_bin):
+        return self._coincurve.PrivateKey(bytes(privateKey_bin))
+
+    def generate_ephemeral_key(self):
+        private_key = self._coincurve.PrivateKey()
+        return private_key, private_key.public_key.format(compressed=False)[1:]
+
+    def shared_secret(self, private_key, publicKey_bin):
+        ## not using ``PrivateKey.ecdh()`` as it hashes the shared point
+        point = self._coincurve.PublicKey(b"\x04" + bytes(publicKey_bin)).multiply(
+            private_key.secret
+        )
+        return point.format(compressed=False)[1:33]
+
+
+BACKENDS = {
+    "coincurve": CoincurveBackend,
+    "ecdsa": EcdsaBackend,
+}
+
+_backends = {}
 
-    # ECDH => get the shared secret
-    ecdh.load_received_public_key(publicKey)
 
-    px = ecdh.generate_sharedsecret_bytes()
+def get_backend(name=None):
+    """Return crypto backend instance of given name
+
+    If no name is given, ``PYC3L_CRYPTO_BACKEND`` environment variable
+    is used, and fallbacks on the fastest available backend.
+
+    """
+    name = name or os.environ.get("PYC3L_CRYPTO_BACKEND")
+    names = [name] if name else list(BACKENDS)
+    for label in names:
+        if label in _backends:
+            return _backends[label]
+        if label not in BACKENDS:
+            raise ValueError(
+                f"Unknown crypto backend {label!r}, choose from {list(BACKENDS)}"
+            )
+        try:
+            _backends[label] = BACKENDS[label]()
+        except ImportError:
+            if name:
+                raise
+            continue
+        return _backends[label]
+
+
+def _strip_hex(hex_string):
+    return hex_string[2:] if hex_string[:2] == "0x" else hex_string
+
+
+def _encrypt(backend, publicKey_bin, plainText_string):
+
+    # Generate the temporary key
+    ephem_private_key, ephemPubKeyEncoded = backend.generate_ephemeral_key()
+    ephemPubKeyEncoded = bytearray(ephemPubKeyEncoded)
+
+    # ECDH => get the shared secret
+    px = backend.shared_secret(ephem_private_key, publicKey_bin)
 
     # compute the encription and MAC keys
     hash_px = SHA512.new(data=px).digest()
@@ -72,29 +153,17 @@ def EncryptMessage(publicKey_hex, plainText_string):
     return serializedCiphertext.hex()
 
 
-def DecryptMessage(privateKey_hex, encrypted_hex):
-    if privateKey_hex[:2] == "0x":
-        privateKey_hex = privateKey_hex[2:]
-    if encrypted_hex[:2] == "0x":
-        encrypted_hex = encrypted_hex[2:]
+def _decrypt(backend, private_key, encrypted_hex):
 
     # get the components
-    encrypted = bytearray.fromhex(encrypted_hex)
+    encrypted = bytearray.fromhex(_strip_hex(encrypted_hex))
     iv = encrypted[:16]
     ephemPubKeyEncoded = encrypted[17:81]
     mac = encrypted[81:113]
     ciphertext = encrypted[113:]
 
-    # recover the temporary public key
-    ephemPubKey = VerifyingKey.from_string(ephemPubKeyEncoded, curve=SECP256k1)
-
-    # load the private key
-    priv_key = SigningKey.from_secret_exponent(int(privateKey_hex, 16), curve=SECP256k1)
-    ecdh = ECDH(curve=SECP256k1, private_key=priv_key)
-
     # ECDH => get the shared secret
-    ecdh.load_received_public_key(ephemPubKey)
-    px = ecdh.generate_sharedsecret_bytes()
+    px = backend.shared_secret(private_key, ephemPubKeyEncoded)
 
     # compute the encription and MAC keys
     hash_px = SHA512.new(data=px).digest()
@@ -110,3 +179,91 @@ def DecryptMessage(privateKey_hex, encrypted_hex):
     # decipher the text
     plaintext = AES256CbcDecrypt(ciphertext.hex(), encryptionKey, iv)
     return plaintext.decode("utf-8")
+
+
+def EncryptMessage(publicKey_hex, plainText_string, backend=None):
+    publicKey_bin = bytearray.fromhex(_strip_hex(publicKey_hex))
+    return _encrypt(get_backend(backend), publicKey_bin, plainText_string)
+
+
+def DecryptMessage(privateKey_hex, encrypted_hex, backend=None):
+    backend = get_backend(backend)
+    private_key = backend.load_private_key(
+        int(_strip_hex(privateKey_hex), 16).to_bytes(32, "big")
+    )
+    return _decrypt(backend, private_key, encrypted_hex)
+
+
+## Batch operations
+
+_worker_state = {}
+
+
+def _init_worker(backend_name, privateKey_hex=None):
+    backend = get_backend(backend_name)
+    _worker_state["backend"] = backend
+    if privateKey_hex is not None:
+        _worker_state["private_key"] = backend.load_private_key(
+            int(_strip_hex(privateKey_hex), 16).to_bytes(32, "big")
+        )
+
+
+def _decrypt_one(encrypted_hex):
+    try:
+        return _decrypt(
+            _worker_state["backend"], _worker_state["private_key"], encrypted_hex
+        )
+    except ValueError as e:
+        return e
+
+
+def _encrypt_one(item):
+    publicKey_hex, plainText_string = item
+    return _encrypt(
+        _worker_state["backend"],
+        bytearray.fromhex(_strip_hex(publicKey_hex)),
+        plainText_string,
+    )
+
+
+def _map(fn, items, initargs, processes, chunksize):
+    items = list(items)
+    if processes == 1 or len(items) <= chunksize:
+        ## not worth spawning processes
+        _init_worker(*initargs)
+        try:
+            return [fn(item) for item in items]
+        finally:
+            _worker_state.clear()
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=initargs
+    ) as executor:
+        return list(executor.map(fn, items, chunksize=chunksize))
+
+
+def decrypt_many(privateKey_hex, encrypted_hexs, processes=None, backend=None,
+                 chunksize=64, errors="raise"):
+    """Decrypt all memos ciphered for the same private key
+
+    The private key is parsed only once per worker process. With
+    ``errors="ignore"``, memos that can't be decrypted give ``None``
+    instead of raising ``ValueError``.
+
+    """
+    backend = get_backend(backend)
+    results = _map(
+        _decrypt_one, encrypted_hexs, (backend.name, privateKey_hex),
+        processes, chunksize,
+    )
+    for idx, result in enumerate(results):
+        if isinstance(result, Exception):
+            if errors == "raise":
+                raise result
+            results[idx] = None
+    return results
+
+
+def encrypt_many(items, processes=None, backend=None, chunksize=64):
+    """Encrypt a list of ``(publicKey_hex, plainText_string)``"""
+    backend = get_backend(backend)
+    return _map(_encrypt_one, items, (backend.name,), processes, chunksize)
@@ -2,8 +2,12 @@
 
 import logging
 import time
-import codecs
 import datetime
+import itertools
+import threading
+import collections
+
+from concurrent.futures import ThreadPoolExecutor
 
 ## Monkey-patching parsimonious 0.8 to support Python 3.11
 
@@ -30,10 +34,10 @@ if sys.version_info >= (3, 11):
 
 
 from web3 import Web3
-from web3.eth import Eth
 import eth_abi
 
 from . import store
+from . import rawtx
 from .wallet import Wallet
 from .ApiCommunication import ApiCommunication, ComChainABI
 from .ApiHandling import ApiHandling, Endpoint, APIErrorNoMessage
@@ -104,9 +108,15 @@ class Block(AddressableBridgeObject): pass
 
 class Pyc3l:
 
+    BLOCK_CACHE_SIZE = 1024
+
     def __init__(self, endpoint=None, block_number=None):
         self._additional_nonce = 0
 
+        ## LRU of block data by block number
+        self._block_cache = collections.OrderedDict()
+        self._block_cache_lock = threading.Lock()
+
         self._current_block = 0
         self._target_block = block_number or "pending"
 
@@ -167,6 +177,67 @@ class Pyc3l:
             self._contract_hex_to_currency = _contract_hex_to_currency
         return self._contract_hex_to_currency
 
+    @property
+    def abi_fn_index(self):
+        """Transaction functions of all the known currencies
+
+        Key is a tuple (contract, fn_hex), value is (currency symbol,
+        contract index, function name, arguments decoder).
+
+        """
+        if not hasattr(self, "_abi_fn_index"):
+            abi_fn_index = {}
+            currencies = {c.symbol: c for c in self.contract_hex_to_currency.values()}
+            for currency in currencies.values():
+                comchain = currency.comchain
+                contracts = [c.lower() for c in currency.contracts]
+                for key, fn_name in comchain.abi_rev_transaction_functions.items():
+                    abi_fn_index[key] = (
+                        currency.symbol,
+                        contracts.index(f"0x{key[0]}"),
+                        fn_name,
+                        comchain._abi._transaction_decoders[fn_name],
+                    )
+            self._abi_fn_index = abi_fn_index
+        return self._abi_fn_index
+
+    def _abi_fn(self, contract, abi_fn_hex):
+        """Return (contract_abi, fn_abi, arguments decoder or None)"""
+        if contract is None:
+            return ("", "loadContract", None)
+        entry = self.abi_fn_index.get((contract[2:].lower(), abi_fn_hex))
+        if entry is not None:
+            symbol, contract_idx, fn_name, decoder = entry
+            return (f"{symbol}-{contract_idx + 1}", fn_name, decoder)
+        abi_rev_fns = ComChainABI._rev_transaction_functions
+        if contract.lower() not in self.contract_hex_to_currency:
+            fn_name = abi_rev_fns.get(abi_fn_hex, f'[{abi_fn_hex}‥]')
+            contract_abi = f"[{contract[2:8]}‥]"
+        else:
+            fn_name = abi_rev_fns.get(abi_fn_hex, abi_fn_hex)
+            contract_abi = f"<{contract[2:8]}‥>"
+        return (
+            contract_abi, fn_name,
+            ComChainABI._transaction_decoders.get(fn_name),
+        )
+
+    def decode_calls(self, txs):
+        """Decode the calls of a batch of block transactions
+
+        Returns a list of (contract_abi, fn_abi, args) per transaction,
+        ``args`` being the dict of decoded arguments by name, or None
+        for unknown functions.
+
+        """
+        decoded = []
+        for tx in txs:
+            contract_abi, fn_abi, decoder = self._abi_fn(tx["to"], tx["input"][2:10])
+            decoded.append((
+                contract_abi, fn_abi,
+                None if decoder is None else decoder(tx["input"]),
+            ))
+        return decoded
+
     ## Blockchain information
 
     def getBlockNumber(self):
@@ -208,6 +279,15 @@ class Pyc3l:
     def getTxPool(self):
         return self.endpoint.pool.get()
 
+    def getLostTransactions(self, transaction_hashes):
+        """Return the subset of given hashes (with 0x) known as lost by the node"""
+        res = self.endpoint.lost_transactions.post(
+            data={"hashes": ",".join(transaction_hashes)}
+        )
+        if not res:
+            return []
+        return [r["hash"] if isinstance(r, dict) else r for r in res]
+
     def getAccountEthBalance(self, address):
         return self.endpoint.api.post(data={"balance": address})['balance']
 
@@ -218,9 +298,12 @@ class Pyc3l:
             "offset": offset,
         })
         ## XXXvlab: seems to need to be parsed twice (confirmed upon
-        ## reading the code of the comchain API).
+        ## reading the code of the comchain API). Entries are JSON
+        ## strings, parsed at once as a JSON list.
         import json
-        return [json.loads(r) for r in transactions]
+        if not transactions:
+            return []
+        return json.loads(f"[{','.join(transactions)}]")
 
     def hasChangedBlock(self, do_reset=False):
         new_current_block = self.getBlockNumber()
@@ -284,30 +367,43 @@ class Pyc3l:
         gas_price_gwei = Web3.fromWei(gas_price, "gwei")
         nonce = int(tr_infos["nonce"], 0)
         logger.info(f"Gas price: {gas_price!r} wei ({gas_price_gwei} gwei), Nonce: {nonce!r}")
-        transaction = {
-            "to": fn[0],
-            "value": 0,
-            # "gas": 2500000,
-            "gas": 5000000,
-            "gasPrice": gas_price,
-            "nonce": self.update_nonce(nonce),
-            "data": fn[1] + data,
-            "from": account.address,
-        }
-
-        signed = Eth.account.signTransaction(transaction, account.privateKey)
-        str_version = (
-            "0x" + str(codecs.getencoder("hex_codec")(signed.rawTransaction)[0])[2:-1]
+        transaction = self.prepare_transaction(
+            fn, data, account.address, self.update_nonce(nonce), gas_price
         )
-        raw_tx = {"rawtx": str_version}
+        raw_tx, _tx_hash = self.sign_transaction(transaction, account)
+        return self.send_raw_transaction(
+            raw_tx, ciphered_message_from, ciphered_message_to
+        )
+
+    def prepare_transaction(self, fn, data, address, nonce, gas_price):
+        """Return the transaction dict calling ``fn`` with ``data``"""
+        return rawtx.prepare_transaction(fn, data, address, nonce, gas_price)
+
+    def sign_transaction(self, transaction, account):
+        """Sign transaction and return its raw hex form and its hash
+
+        This is CPU bound and doesn't require any network access, see
+        :mod:`pyc3l.rawtx` to sign offline in batch.
+
+        """
+        return rawtx.sign_transaction(transaction, account.privateKey)
+
+    def send_raw_transaction(
+            self,
+            raw_tx,
+            ciphered_message_from="",
+            ciphered_message_to="",
+    ):
+        """Submit an already signed raw transaction to the node"""
+        data = {"rawtx": raw_tx}
 
         if ciphered_message_from != "":
-            raw_tx["memo_from"] = ciphered_message_from
+            data["memo_from"] = ciphered_message_from
 
         if ciphered_message_to != "":
-            raw_tx["memo_to"] = ciphered_message_to
+            data["memo_to"] = ciphered_message_to
 
-        return self.endpoint.api.post(data=raw_tx)
+        return self.endpoint.api.post(data=data)
 
     def update_nonce(self, nonce):
         if not self.hasChangedBlock(do_reset=True):
@@ -434,17 +530,92 @@ class Pyc3l:
 
         class Pyc3lAccount(Account):
 
+            MAX_TRANSACTIONS_BATCH_SIZE = 200
+
+            def iter_transactions(self, batch_size=15, max_batch_size=None,
+                                  prefetch=True, until_hash=None, since=None,
+                                  throttle=0, rate_limiter=None):
+                """Yield transactions from the most recent one
+
+                Pages of ``trnslist.php`` start at ``batch_size`` entries
+                and double after each full page up to ``max_batch_size``
+                (defaults to ``MAX_TRANSACTIONS_BATCH_SIZE``), or to the
+                size of the first short page, as the server may cap it.
+                The walk ends on an empty page. With ``prefetch``, the
+                next page is fetched in the background while a full one
+                is consumed. ``throttle`` is a
+                minimal delay in seconds between page requests, and
+                ``rate_limiter`` an object whose ``acquire()`` is called
+                before each page request, to share a rate between walks
+                (see ``pyc3l.history.TokenBucket``).
+
+                Stops before the transaction ``until_hash`` or the first
+                transaction older than the ``since`` timestamp, to catch
+                up with what's new since a previous walk.
+
+                """
+                max_batch_size = max_batch_size or self.MAX_TRANSACTIONS_BATCH_SIZE
+                if until_hash is not None:
+                    until_hash = until_hash.lower()
+                    if not until_hash.startswith("0x"):
+                        until_hash = f"0x{until_hash}"
+                last_request = [0]
+
+                def fetch(offset, count):
+                    wait = last_request[0] + throttle - time.time()
+                    if wait > 0:
+                        time.sleep(wait)
+                    last_request[0] = time.time()
+                    if rate_limiter is not None:
+                        rate_limiter.acquire()
+                    return pyc3l_instance.getAccountTransactions(
+                        self.address, count=count, offset=offset
+                    )
+
+                executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+                offset, count = 0, min(batch_size, max_batch_size)
+                page = fetch(offset, count)
+                seen = set()
+                try:
+                    while page:
+                        next_page = None
+                        next_offset = offset + len(page)
+                        if len(page) < count:
+                            ## end of history or page size capped by the
+                            ## server: no read-ahead, go on until an
+                            ## empty page with pages of the served size
+                            max_batch_size = next_count = len(page)
+                        else:
+                            next_count = min(count * 2, max_batch_size)
+                            if executor is not None:
+                                next_page = executor.submit(
+                                    fetch, next_offset, next_count
+                                )
+                        ## entries shifted by new transactions between pages
+                        page_hashes = set()
+                        for tx in page:
+                            tx_hash = tx["hash"].lower()
+                            page_hashes.add(tx_hash)
+                            if tx_hash in seen:
+                                continue
+                            if until_hash is not None and tx_hash == until_hash:
+                                return
+                            if since is not None and int(tx["time"]) < since:
+                                return
+                            yield pyc3l_instance.Transaction(tx["hash"], data=tx)
+                        seen = page_hashes
+                        offset, count = next_offset, next_count
+                        page = (
+                            next_page.result() if next_page is not None
+                            else fetch(offset, count)
+                        )
+                finally:
+                    if executor is not None:
+                        executor.shutdown(wait=False)
+
             @property
             def transactions(self):
-                batch_size = 15
-                offset = 0
-                while True:
-                    txs = pyc3l_instance.getAccountTransactions(self.address, count=batch_size, offset=offset)
-                    if not txs:
-                        break
-                    for tx in txs:
-                        yield pyc3l_instance.Transaction(tx["hash"], data=tx)
-                    offset += batch_size
+                return self.iter_transactions()
 
         return Pyc3lAccount
 
@@ -660,31 +831,14 @@ class Pyc3l:
             @property
             def abi_fn(self):
                 bc_tx_data = self.data
-                if bc_tx_data["to"] is None:
-                    return ("" , "loadContract")
-                abi_fn_hex = bc_tx_data["input"][2:10]
-                if not self.currency:
-                    abi_rev_fns = ComChainABI._rev_transaction_functions
-                    return (
-                        f"[{bc_tx_data['to'][2:8]}‥]",
-                        abi_rev_fns.get(abi_fn_hex, f'[{abi_fn_hex}‥]')
-                    )
-                abi_rev_fns =  self.currency.comchain.abi_rev_transaction_functions
-                key = (bc_tx_data["to"][2:].lower(), abi_fn_hex)
-                if key not in abi_rev_fns:
-                    abi_rev_fns = ComChainABI._rev_transaction_functions
-                    return (
-                        f"<{bc_tx_data['to'][2:8]}‥>",
-                        abi_rev_fns.get(abi_fn_hex, abi_fn_hex)
-                    )
-                contract_idx = [c.lower() for c in self.currency.contracts].index(
-                    bc_tx_data["to"]
-                )
-                assert contract_idx is not None
-                return (
-                    f"{self.currency.symbol}-{contract_idx + 1}",
-                    abi_rev_fns[key]
-                )
+                return pyc3l_instance._abi_fn(
+                    bc_tx_data["to"], bc_tx_data["input"][2:10]
+                )[:2]
+
+            @property
+            def abi_args(self):
+                """Decoded arguments of the call by name, or None"""
+                return pyc3l_instance.decode_calls([self.data])[0][2]
 
 
         return Pyc3lBCTransaction(*args, **kwargs)
@@ -696,7 +850,9 @@ class Pyc3l:
             @property
             def data(self):
                 if not hasattr(self, "_data"):
-                    self._data = pyc3l_instance.getBlockInfo(self.address)
+                    self._data = pyc3l_instance.getBlockByHash(f"0x{self.address}")
+                    if self._data is not None:
+                        pyc3l_instance._cache_block(self._data)
                 return self._data
 
             @property
@@ -741,15 +897,76 @@ class Pyc3l:
 
         return Pyc3lBlock(address, *args, **kwargs)
 
-    def BlockByNumber(self, nb):
+    def _cache_block(self, data):
+        nb = int(data["number"], 16)
+        with self._block_cache_lock:
+            self._block_cache[nb] = data
+            self._block_cache.move_to_end(nb)
+            while len(self._block_cache) > self.BLOCK_CACHE_SIZE:
+                self._block_cache.popitem(last=False)
+
+    def _cached_block(self, nb):
+        with self._block_cache_lock:
+            data = self._block_cache.get(nb)
+            if data is not None:
+                self._block_cache.move_to_end(nb)
+            return data
+
+    def _block_from_data(self, data):
         block = self.Block(None)
-        data = self.getBlockByNumber(nb)
-        if data is None:
-            data = {"number": hex(nb), "hash": "0x0"}
         block._data = data
         block.address = block._data["hash"]
         return block
 
+    def BlockByNumber(self, nb):
+        data = self._cached_block(nb)
+        if data is None:
+            data = self.getBlockByNumber(nb)
+            if data is None:
+                data = {"number": hex(nb), "hash": "0x0"}
+            else:
+                self._cache_block(data)
+        return self._block_from_data(data)
+
+    def iter_blocks(self, start, end=None, window=8):
+        """Yield blocks from ``start`` to ``end`` included, in order
+
+        ``end`` defaults to the current head, and can be lower than
+        ``start`` to walk backwards. ``window`` block requests are kept
+        in flight. Fetched blocks go through the block cache, so
+        ``next``/``prev`` of the yielded blocks resolve locally. Stops
+        at the first block the node doesn't have.
+
+        """
+        if end is None:
+            end = common.to_int(self.getBlockNumber())
+        step = 1 if end >= start else -1
+        block_numbers = iter(range(start, end + step, step))
+
+        def fetch(nb):
+            data = self._cached_block(nb)
+            if data is None:
+                data = self.getBlockByNumber(nb)
+                if data is not None:
+                    self._cache_block(data)
+            return data
+
+        in_flight = collections.deque()
+        with ThreadPoolExecutor(max_workers=window) as executor:
+            try:
+                for nb in itertools.islice(block_numbers, window):
+                    in_flight.append(executor.submit(fetch, nb))
+                while in_flight:
+                    data = in_flight.popleft().result()
+                    if data is None:
+                        return
+                    for nb in itertools.islice(block_numbers, 1):
+                        in_flight.append(executor.submit(fetch, nb))
+                    yield self._block_from_data(data)
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
 
 __all__ = [
     Pyc3l,
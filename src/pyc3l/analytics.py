@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Vectorized analytics on the transactions of a ``TxStore``
+
+Requires numpy (``pip install pyc3l[analytics]``).
+
+    >>> data = TxArrays.from_store(store)                 # doctest: +SKIP
+    >>> periods, matrix = balance_matrix(data, "month")   # doctest: +SKIP
+    >>> matrix[data.index[address]]                       # doctest: +SKIP
+
+Pledges credit their receiver, transfers debit their sender and credit
+their receiver. Amounts and balances are in cents.
+
+"""
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+TYPE_CODES = {"pledge": 1, "transfer": 2}
+PERIODS = {"day": "D", "month": "M"}  ## period: numpy datetime64 unit
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "pyc3l analytics requires numpy (pip install pyc3l[analytics])"
+        )
+    return numpy
+
+
+class TxArrays:
+    """Pledges and transfers of a ``TxStore`` as numpy arrays
+
+    Rows are in chronological order. ``sender`` and ``receiver`` are
+    indexes in ``accounts`` (-1 when missing), ``type`` holds
+    ``TYPE_CODES`` values, ``received_at`` timestamps.
+
+    """
+
+    def __init__(self, accounts, sender, receiver, amount, type, received_at):
+        self.accounts = accounts
+        self.sender = sender
+        self.receiver = receiver
+        self.amount = amount
+        self.type = type
+        self.received_at = received_at
+
+    def __len__(self):
+        return len(self.amount)
+
+    @property
+    def index(self):
+        """Dict of the index of each address in ``accounts``"""
+        return {address: i for i, address in enumerate(self.accounts)}
+
+    @classmethod
+    def from_store(cls, tx_store, end_time=None, batch_size=100000):
+        """Load the pledges and transfers received up to ``end_time``
+
+        Rows are fetched by batches of ``batch_size``, addresses are
+        interned on the fly.
+
+        """
+        np = _numpy()
+        tx_store._init()
+        where, params = "type IN ('pledge', 'transfer')", []
+        if end_time is not None:
+            where += " AND received_at <= ?"
+            params.append(end_time)
+        cursor = tx_store._sqlite3_conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT sender, receiver, amount, type, received_at
+            FROM transactions
+            WHERE {where}
+            ORDER BY received_at, rowid
+        """,
+            params,
+        )
+
+        index = {}
+
+        def intern(address):
+            if address is None:
+                return -1
+            return index.setdefault(address, len(index))
+
+        columns = [[], [], [], [], []]
+        for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+            senders, receivers, amounts, types, times = zip(*rows)
+            columns[0].append(np.fromiter(map(intern, senders), np.int64, len(rows)))
+            columns[1].append(np.fromiter(map(intern, receivers), np.int64, len(rows)))
+            columns[2].append(np.array(amounts, dtype=np.int64))
+            columns[3].append(np.fromiter(
+                (TYPE_CODES[t] for t in types), np.int8, len(rows)))
+            columns[4].append(np.array(times, dtype=np.int64))
+        dtypes = [np.int64, np.int64, np.int64, np.int8, np.int64]
+        sender, receiver, amount, type, received_at = [
+            np.concatenate(c) if c else np.zeros(0, dtype=dtype)
+            for c, dtype in zip(columns, dtypes)
+        ]
+        logger.info("Loaded %d transactions of %d accounts", len(amount), len(index))
+        return cls(list(index), sender, receiver, amount, type, received_at)
+
+
+def running_balances(data):
+    """Return the balance of each account after each of its movements
+
+    Returns the ``(account, row, balance)`` arrays, sorted by account
+    then chronologically, ``row`` being the index of the movement's
+    transaction in ``data``.
+
+    """
+    np = _numpy()
+    rows = np.arange(len(data))
+    is_transfer = data.type == TYPE_CODES["transfer"]
+    account = np.concatenate([data.receiver, data.sender[is_transfer]])
+    delta = np.concatenate([data.amount, -data.amount[is_transfer]])
+    row = np.concatenate([rows, rows[is_transfer]])
+    known = account >= 0
+    account, delta, row = account[known], delta[known], row[known]
+
+    order = np.lexsort((row, account))
+    account, delta, row = account[order], delta[order], row[order]
+    balance = np.cumsum(delta)
+    if len(balance):
+        ## restart the cumulative sum at each account
+        starts = np.flatnonzero(np.r_[True, account[1:] != account[:-1]])
+        offsets = balance[starts] - delta[starts]
+        balance -= np.repeat(offsets, np.diff(np.r_[starts, len(balance)]))
+    return account, row, balance
+
+
+def _period_indexes(data, period):
+    np = _numpy()
+    if period not in PERIODS:
+        raise ValueError(
+            f"Unsupported period {period!r}, expected one of {', '.join(PERIODS)}"
+        )
+    unit = PERIODS[period]
+    row_periods = data.received_at.astype("datetime64[s]").astype(f"datetime64[{unit}]")
+    if not len(row_periods):
+        return np.zeros(0, dtype=f"datetime64[{unit}]"), np.zeros(0, dtype=np.int64)
+    periods = np.arange(row_periods[0], row_periods[-1] + 1)
+    return periods, (row_periods - row_periods[0]).astype(np.int64)
+
+
+def end_of_period_balances(data, period="day"):
+    """Return the end of period balances of accounts, for the periods
+    where they changed
+
+    Returns the ``(account, period, balance)`` arrays, ``period`` being
+    numpy ``datetime64`` values.
+
+    """
+    np = _numpy()
+    periods, row_period = _period_indexes(data, period)
+    account, row, balance = running_balances(data)
+    period_idx = row_period[row]
+    last = np.r_[
+        (account[1:] != account[:-1]) | (period_idx[1:] != period_idx[:-1]), True
+    ][:len(account)]
+    return account[last], periods[period_idx[last]], balance[last]
+
+
+def balance_matrix(data, period="day"):
+    """Return the end of period balances of all accounts for all periods
+
+    Returns ``periods`` and a ``len(data.accounts) x len(periods)``
+    matrix of balances.
+
+    """
+    np = _numpy()
+    periods, row_period = _period_indexes(data, period)
+    account, row, balance = running_balances(data)
+    period_idx = row_period[row]
+    last = np.r_[
+        (account[1:] != account[:-1]) | (period_idx[1:] != period_idx[:-1]), True
+    ][:len(account)]
+    shape = (len(data.accounts), len(periods))
+    values = np.zeros(shape, dtype=np.int64)
+    values[account[last], period_idx[last]] = balance[last]
+    changed = np.zeros(shape, dtype=bool)
+    changed[account[last], period_idx[last]] = True
+    ## forward fill periods without movements with the previous balance
+    ## (index 0 holds 0 when there was no movement yet)
+    fill = np.where(changed, np.arange(len(periods)), 0)
+    np.maximum.accumulate(fill, axis=1, out=fill)
+    return periods, np.take_along_axis(values, fill, axis=1)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import logging
+import threading
+
+from .common import to_int
+
+
+logger = logging.getLogger(__name__)
+
+
+class BlockTimeIndex:
+    """Dense block -> timestamp index in a memory-mapped file
+
+    The file is an array of native uint32, one per block, holding the
+    block timestamp + 1 (0 meaning unknown). It grows by steps of
+    ``GROW_BLOCKS`` blocks as blocks are added.
+
+        >>> index = BlockTimeIndex(path, pyc3l)           # doctest: +SKIP
+        >>> index.set(1000, 1600000000)                   # doctest: +SKIP
+        >>> index.get(1000)                               # doctest: +SKIP
+        1600000000
+        >>> index.block_at(1600000000)                    # doctest: +SKIP
+        1000
+
+    Timestamps of unknown blocks probed by ``block_at`` are fetched with
+    ``getBlockByNumber`` when a ``pyc3l`` instance is given, and kept.
+
+    """
+
+    GROW_BLOCKS = 1 << 16
+
+    def __init__(self, path, pyc3l=None):
+        self.path = path
+        self.pyc3l = pyc3l
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        self._file = open(path, "r+b")
+        self._mmap = None
+        self._view = None
+        self._remap(1)
+
+    def _remap(self, nb_blocks):
+        size = os.fstat(self._file.fileno()).st_size
+        if size < nb_blocks * 4:
+            nb_blocks = -(-nb_blocks // self.GROW_BLOCKS) * self.GROW_BLOCKS
+            self._file.truncate(nb_blocks * 4)
+        elif self._mmap is not None:
+            return
+        if self._mmap is not None:
+            self._view.release()
+            self._mmap.close()
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._view = memoryview(self._mmap).cast("I")
+
+    def __len__(self):
+        """Number of block slots in the file"""
+        return len(self._view)
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._view.release()
+                self._mmap.close()
+                self._mmap = self._view = None
+            self._file.close()
+
+    def flush(self):
+        with self._lock:
+            self._mmap.flush()
+
+    def get(self, block):
+        """Return the timestamp of ``block`` or None if unknown"""
+        with self._lock:
+            if block >= len(self._view):
+                return None
+            value = self._view[block]
+        return value - 1 if value else None
+
+    def set(self, block, timestamp):
+        with self._lock:
+            if block >= len(self._view):
+                self._remap(block + 1)
+            self._view[block] = timestamp + 1
+
+    def set_many(self, items):
+        """Set the timestamps of an iterable of (block, timestamp)"""
+        for block, timestamp in items:
+            self.set(block, timestamp)
+
+    def timestamp(self, block):
+        """Return the timestamp of ``block``, asking the node if unknown"""
+        timestamp = self.get(block)
+        if timestamp is not None:
+            return timestamp
+        if self.pyc3l is None:
+            raise KeyError(f"Unknown timestamp of block {block}")
+        data = self.pyc3l.getBlockByNumber(block)
+        if not data:
+            raise KeyError(f"Block {block} not found on node")
+        timestamp = to_int(data["timestamp"])
+        self.set(block, timestamp)
+        return timestamp
+
+    def last_known_block(self):
+        """Return the greatest block with a known timestamp, or None"""
+        step = 1 << 20
+        with self._lock:
+            end = len(self._mmap)
+            while end > 0:
+                start = max(0, end - step)
+                chunk = self._mmap[start:end].rstrip(b"\0")
+                if chunk:
+                    return (start + len(chunk) - 1) // 4
+                end = start
+        return None
+
+    def block_at(self, timestamp, head=None, first=0):
+        """Return the last block with a timestamp <= ``timestamp``
+
+        Binary search over blocks ``first`` to ``head`` (defaults to the
+        node's head if a ``pyc3l`` instance was given, else to the last
+        known block). Returns None if block ``first`` is younger.
+        Without ``pyc3l``, probing an unknown block raises ``KeyError``.
+
+        """
+        if head is None:
+            head = (
+                to_int(self.pyc3l.getBlockNumber()) if self.pyc3l is not None
+                else self.last_known_block()
+            )
+        if head is None or head < first or self.timestamp(first) > timestamp:
+            return None
+        lo, hi = first, head
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.timestamp(mid) <= timestamp:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
@@ -14,3 +14,19 @@ def init_cache_dirs():
     if not os.path.exists(PYC3L_CACHE_DIR):
         os.makedirs(PYC3L_CACHE_DIR)
     return PYC3L_CACHE_DIR
+
+
+def to_int(value):
+    """Return the int value of an int or an hex/decimal string
+
+    >>> to_int(12)
+    12
+    >>> to_int("0x10")
+    16
+    >>> to_int("42")
+    42
+
+    """
+    if isinstance(value, str):
+        return int(value, 0)
+    return int(value)
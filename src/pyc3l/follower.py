@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import queue
+import asyncio
+import logging
+import itertools
+import threading
+import collections
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import to_int
+
+
+logger = logging.getLogger(__name__)
+
+
+_END = object()
+
+
+def tx_filter(contracts=None, fns=None):
+    """Return a predicate on ``BCTransaction`` objects
+
+    ``contracts`` is an iterable of contract addresses, ``fns`` of
+    function selectors (8 hex digits) or function names as given by
+    ``abi_fn``. None matches everything.
+
+    """
+    if contracts is not None:
+        contracts = set(
+            c.lower() if c.lower().startswith("0x") else f"0x{c.lower()}"
+            for c in contracts
+        )
+    selectors = names = None
+    if fns is not None:
+        fns = set(fns)
+        selectors = set(
+            f for f in fns
+            if len(f) == 8 and all(ch in "0123456789abcdef" for ch in f.lower())
+        )
+        names = fns - selectors
+        selectors = set(f.lower() for f in selectors)
+
+    def match(bc_tx):
+        if contracts is not None and (bc_tx.data["to"] or "").lower() not in contracts:
+            return False
+        if fns is None or bc_tx.fn in selectors:
+            return True
+        return bool(names) and bc_tx.abi_fn[1] in names
+
+    return match
+
+
+class Subscription:
+    """Bounded feed of the transactions of a :class:`BlockFollower`
+
+    Iterate over it, or ``async for`` in an asyncio loop. When the
+    queue is full, the follower waits for the consumer (backpressure).
+    ``last_block`` is the last block fully consumed, i.e. whose last
+    transaction was processed when the consumer asked for the next one.
+
+    """
+
+    def __init__(self, follower, match, maxsize=1000):
+        self._follower = follower
+        self._match = match
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._closed = threading.Event()
+        self.last_block = follower.last_block
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if self._follower._stop.is_set():
+                    return False
+        return False
+
+    def get(self, timeout=None):
+        """Return the next matching transaction
+
+        Raises ``StopIteration`` once the follower was stopped and the
+        feed is drained, ``queue.Empty`` on timeout.
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=max(0, wait))
+            except queue.Empty:
+                if self._follower._stop.is_set():
+                    raise StopIteration
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+                continue
+            if item is _END:
+                raise StopIteration
+            if isinstance(item, int):  ## end of block marker
+                self.last_block = item
+                continue
+            return item
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed.is_set():
+            raise StopIteration
+        return self.get()
+
+    def __aiter__(self):
+        return self
+
+    def _next_or_end(self):
+        ## StopIteration can't go through a future
+        try:
+            return self.__next__()
+        except StopIteration:
+            return _END
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        item = await loop.run_in_executor(None, self._next_or_end)
+        if item is _END:
+            raise StopAsyncIteration
+        return item
+
+    def close(self):
+        """Unsubscribe: the follower stops feeding, and waiting for, us"""
+        self._closed.set()
+        self._follower._unsubscribe(self)
+
+
+class BlockFollower:
+    """Follow the head of the chain and stream the new transactions
+
+    Blocks are read with ``getBlockByNumber`` as they are mined, and
+    fetched by ``workers`` threads when catching up. With
+    ``confirmations``, only blocks this deep below the head are read.
+
+    In the calling thread, as a generator:
+
+        >>> follower = BlockFollower(pyc3l, "follower.json")  # doctest: +SKIP
+        >>> for bc_tx in follower.follow(fns=["nantTransfer"]):  # doctest: +SKIP
+        ...     print(bc_tx.currency, bc_tx.abi_fn)
+
+    Or in a background thread feeding many consumers:
+
+        >>> sub = follower.subscribe(contracts=currency.contracts)  # doctest: +SKIP
+        >>> follower.start()                                   # doctest: +SKIP
+        >>> async for bc_tx in sub: ...                        # doctest: +SKIP
+
+    The last block consumed by all (``follow()`` or subscriptions) is
+    saved in the ``cursor_path`` JSON file, and followed from on
+    restart. Delivery is at least once: transactions of the block
+    being consumed when interrupted are delivered again.
+
+    """
+
+    def __init__(self, pyc3l, cursor_path=None, start_block=None,
+                 poll_interval=2, workers=4, confirmations=0):
+        self._pyc3l = pyc3l
+        self._cursor_path = cursor_path
+        self._poll_interval = poll_interval
+        self._workers = workers
+        self._confirmations = confirmations
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._saved_block = None
+        cursor = self._load_cursor()
+        if cursor is not None:
+            self.last_block = cursor
+        elif start_block is not None:
+            self.last_block = start_block - 1
+        else:
+            self.last_block = to_int(pyc3l.getBlockNumber()) - confirmations
+        self._saved_block = cursor
+
+    ## Cursor
+
+    def _load_cursor(self):
+        if self._cursor_path is None or not os.path.exists(self._cursor_path):
+            return None
+        with open(self._cursor_path) as f:
+            return json.load(f)["last_block"]
+
+    def save_cursor(self, block_nb):
+        """Durably record ``block_nb`` as the last block consumed"""
+        if self._cursor_path is None or block_nb == self._saved_block:
+            return
+        tmp = f"{self._cursor_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"last_block": block_nb}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._cursor_path)
+        self._saved_block = block_nb
+
+    ## Blocks
+
+    def _fetch_block(self, block_nb):
+        block = self._pyc3l.getBlockByNumber(block_nb)
+        if block is not None:
+            ## checked before ``last_block`` moves past it
+            self.block_transactions(block)
+        return block
+
+    def iter_blocks(self):
+        """Yield (number, block data) of the new blocks up to the head
+
+        Several blocks are fetched concurrently when more than one is
+        available. Advances ``last_block`` as blocks are yielded.
+
+        """
+        head = to_int(self._pyc3l.getBlockNumber()) - self._confirmations
+        block_numbers = iter(range(self.last_block + 1, head + 1))
+        if head - self.last_block <= 1:
+            for nb in block_numbers:
+                block = self._fetch_block(nb)
+                if block is None:
+                    return
+                self.last_block = nb
+                yield nb, block
+            return
+        window = collections.deque()
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            try:
+                for nb in itertools.islice(block_numbers, self._workers * 4):
+                    window.append((nb, executor.submit(self._fetch_block, nb)))
+                while window:
+                    nb, future = window.popleft()
+                    block = future.result()
+                    if block is None:
+                        return
+                    for next_nb in itertools.islice(block_numbers, 1):
+                        window.append(
+                            (next_nb, executor.submit(self._fetch_block, next_nb))
+                        )
+                    self.last_block = nb
+                    yield nb, block
+            finally:
+                for _nb, future in window:
+                    future.cancel()
+
+    def block_transactions(self, block):
+        """Return the ``BCTransaction`` objects of a block
+
+        Raises ``ValueError`` if transactions are given only by hash, as
+        they would be skipped while the cursor moves past the block.
+
+        """
+        txs = block.get("transactions") or []
+        for tx in txs:
+            if not isinstance(tx, dict):
+                raise ValueError(
+                    f"Block {block.get('number')} has transaction {tx!r} "
+                    "without its data"
+                )
+        return [self._pyc3l.BCTransaction(tx["hash"], data=tx) for tx in txs]
+
+    ## Generator
+
+    def follow(self, contracts=None, fns=None):
+        """Yield matching new transactions forever, from the calling thread
+
+        See :func:`tx_filter` for ``contracts`` and ``fns``.
+
+        """
+        match = tx_filter(contracts, fns)
+        while True:
+            for nb, block in self.iter_blocks():
+                for bc_tx in self.block_transactions(block):
+                    if match(bc_tx):
+                        yield bc_tx
+                self.save_cursor(nb)
+            self._stop.wait(self._poll_interval)
+
+    ## Subscriptions
+
+    def subscribe(self, contracts=None, fns=None, maxsize=1000):
+        """Return a new :class:`Subscription` fed by the background thread"""
+        subscription = Subscription(self, tx_filter(contracts, fns), maxsize)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def _dispatch(self, nb, block):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for bc_tx in self.block_transactions(block):
+            for subscription in subscriptions:
+                if subscription._match(bc_tx):
+                    subscription._put(bc_tx)
+        for subscription in subscriptions:
+            subscription._put(nb)
+
+    def _save_progress(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        if subscriptions:
+            self.save_cursor(min(s.last_block for s in subscriptions))
+        else:
+            self.save_cursor(self.last_block)
+
+    def poll(self):
+        """Dispatch the new blocks to subscriptions"""
+        for nb, block in self.iter_blocks():
+            if self._stop.is_set():
+                break
+            self._dispatch(nb, block)
+            self._save_progress()
+        self._save_progress()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warn("Follower polling failed: %s", e)
+            self._stop.wait(self._poll_interval)
+        self._save_progress()
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription._put(_END)
+
+    def start(self):
+        """Poll in a background thread until ``stop()`` is called"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
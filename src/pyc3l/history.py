@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import common
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting a request rate across threads
+
+    ``rate`` tokens per second are added to the bucket, up to ``burst``.
+
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HistoryStore:
+    """Local sqlite copy of account histories, synced incrementally
+
+    Each account has a watermark: the most recent confirmed transaction
+    seen (hash, time and block). A sync only reads ``trnslist.php``
+    pages until it meets the watermark, so refreshing histories costs
+    requests proportional to new activity. Pending transactions are
+    stored too, and updated once confirmed by a later sync.
+
+        >>> histories = HistoryStore(pyc3l)                # doctest: +SKIP
+        >>> histories.sync_many(addresses, rate=20)        # doctest: +SKIP
+        >>> list(histories.transactions(address))          # doctest: +SKIP
+
+    """
+
+    def __init__(self, pyc3l, path=None):
+        if path is None:
+            path = os.path.join(common.init_cache_dirs(), "account_history.sqlite")
+        self.pyc3l = pyc3l
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                account text NOT NULL,
+                hash text NOT NULL,
+                time integer,
+                block integer,
+                status integer,
+                data text,
+                PRIMARY KEY (account, hash)
+            )
+        """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_history_account_time "
+            "ON history (account, time)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS watermarks (
+                account text NOT NULL PRIMARY KEY,
+                hash text,
+                time integer,
+                block integer,
+                synced_at real
+            )
+        """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _account_key(address):
+        address = address.lower()
+        return address[2:] if address.startswith("0x") else address
+
+    def watermark(self, address):
+        """Return the (hash, time, block) watermark of the account or None"""
+        row = self._conn.execute(
+            "SELECT hash, time, block FROM watermarks WHERE account = ?",
+            (self._account_key(address), ),
+        ).fetchone()
+        return None if row is None or row["hash"] is None else tuple(row)
+
+    def _fetch(self, address, until_hash, rate_limiter=None,
+               max_batch_size=None, prefetch=False):
+        account = self.pyc3l.Account(address)
+        return [
+            tx._data for tx in account.iter_transactions(
+                max_batch_size=max_batch_size,
+                prefetch=prefetch,
+                until_hash=until_hash,
+                rate_limiter=rate_limiter,
+            )
+        ]
+
+    def fetch_new(self, address, rate_limiter=None, max_batch_size=None,
+                  prefetch=False):
+        """Return the transactions of the account newer than its watermark
+
+        Most recent first, as dicts of ``trnslist.php``.
+        """
+        watermark = self.watermark(address)
+        return self._fetch(
+            address, None if watermark is None else watermark[0],
+            rate_limiter=rate_limiter, max_batch_size=max_batch_size,
+            prefetch=prefetch,
+        )
+
+    def store(self, address, txs):
+        """Upsert fetched transactions and move the account watermark"""
+        account = self._account_key(address)
+        rows = []
+        watermark = None
+        for tx in txs:
+            block = tx.get("block")
+            block = None if block in (None, "") else int(block)
+            rows.append((
+                account, tx["hash"].lower(), int(tx["time"]), block,
+                tx.get("status"), json.dumps(tx),
+            ))
+            if watermark is None and block is not None:
+                ## most recent confirmed transaction
+                watermark = (tx["hash"].lower(), int(tx["time"]), block)
+        self._conn.executemany(
+            """
+            INSERT INTO history (account, hash, time, block, status, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (account, hash) DO UPDATE SET
+                time = excluded.time,
+                block = excluded.block,
+                status = excluded.status,
+                data = excluded.data
+        """,
+            rows,
+        )
+        if watermark is not None:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO watermarks (account, hash, time, block, synced_at)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+                (account, ) + watermark + (time.time(), ),
+            )
+        else:
+            self._conn.execute(
+                """
+                INSERT INTO watermarks (account, synced_at) VALUES (?, ?)
+                ON CONFLICT (account) DO UPDATE SET synced_at = excluded.synced_at
+            """,
+                (account, time.time()),
+            )
+        self._conn.commit()
+        return len(rows)
+
+    def sync(self, address, rate_limiter=None):
+        """Fetch and store the new transactions of the account
+
+        Returns the number of transactions stored.
+        """
+        return self.store(address, self.fetch_new(address, rate_limiter=rate_limiter))
+
+    def sync_many(self, addresses, max_workers=16, rate=10, burst=None,
+                  progress=None):
+        """Sync many accounts concurrently under a global request rate
+
+        Pages are fetched by ``max_workers`` threads sharing a token
+        bucket of ``rate`` requests per second, and stored from the
+        calling thread, which owns the sqlite connection.
+        ``progress``, if given, is called with the address and the
+        number of transactions stored, or the exception raised.
+        Returns a dict of these per address.
+
+        """
+        rate_limiter = TokenBucket(rate, burst)
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self._fetch, address,
+                    None if watermark is None else watermark[0],
+                    rate_limiter=rate_limiter,
+                ): address
+                for address, watermark in (
+                    (address, self.watermark(address)) for address in addresses
+                )
+            }
+            for future in as_completed(futures):
+                address = futures[future]
+                try:
+                    results[address] = self.store(address, future.result())
+                except Exception as e:
+                    logger.warn("Sync of history of %s failed: %s", address, e)
+                    results[address] = e
+                if progress is not None:
+                    progress(address, results[address])
+        return results
+
+    def transactions(self, address, since=None):
+        """Yield the locally stored transactions of the account, most
+        recent first, optionally only from the ``since`` timestamp"""
+        params = [self._account_key(address)]
+        where = "account = ?"
+        if since is not None:
+            where += " AND time >= ?"
+            params.append(since)
+        for row in self._conn.execute(
+                f"SELECT data FROM history WHERE {where} ORDER BY time DESC, block DESC",
+                params):
+            yield json.loads(row["data"])
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+
+
+def _encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data):
+    value, shift = 0, 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        yield value
+        value, shift = 0, 0
+
+
+class IntervalSet:
+    """Set of integers stored as sorted disjoint inclusive intervals
+
+    Intervals are kept merged (overlapping or adjacent ones are joined)
+    in two sorted lists of starts and ends, so that membership is a
+    bisection.
+
+    >>> s = IntervalSet([(7, 10), (1, 5)])
+    >>> s
+    IntervalSet([(1, 5), (7, 10)])
+    >>> 6 in s, 7 in s, 11 in s
+    (False, True, False)
+    >>> s.add(6, 6)
+    >>> s
+    IntervalSet([(1, 10)])
+    >>> s - IntervalSet([(3, 4)])
+    IntervalSet([(1, 2), (5, 10)])
+    >>> s & IntervalSet([(0, 1), (9, 12)])
+    IntervalSet([(1, 1), (9, 10)])
+    >>> IntervalSet.from_bytes(s.to_bytes()) == s
+    True
+
+    """
+
+    __slots__ = ("_starts", "_ends")
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        for s, e in sorted(intervals):
+            if self._ends and s <= self._ends[-1] + 1:
+                self._ends[-1] = max(self._ends[-1], e)
+            else:
+                self._starts.append(s)
+                self._ends.append(e)
+
+    @classmethod
+    def _from_sorted(cls, starts, ends):
+        new = cls()
+        new._starts, new._ends = starts, ends
+        return new
+
+    def copy(self):
+        return self._from_sorted(list(self._starts), list(self._ends))
+
+    def __iter__(self):
+        return zip(self._starts, self._ends)
+
+    def __len__(self):
+        """Number of intervals"""
+        return len(self._starts)
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __repr__(self):
+        return f"IntervalSet({list(self)!r})"
+
+    @property
+    def size(self):
+        """Number of integers in the set
+
+        >>> IntervalSet([(1, 5), (7, 7)]).size
+        6
+
+        """
+        return sum(e - s + 1 for s, e in self)
+
+    def interval_at(self, value):
+        """Return the interval with the greatest start <= value, or None
+
+        >>> IntervalSet([(1, 5), (8, 9)]).interval_at(6)
+        (1, 5)
+        >>> IntervalSet([(1, 5)]).interval_at(0) is None
+        True
+
+        """
+        i = bisect.bisect_right(self._starts, value) - 1
+        if i < 0:
+            return None
+        return (self._starts[i], self._ends[i])
+
+    def __contains__(self, value):
+        i = bisect.bisect_right(self._starts, value) - 1
+        return i >= 0 and value <= self._ends[i]
+
+    def add(self, start, end):
+        """Add [start, end], merging overlapping or adjacent intervals
+
+        >>> s = IntervalSet([(1, 2), (5, 6), (9, 10)])
+        >>> s.add(3, 8)
+        >>> s
+        IntervalSet([(1, 10)])
+
+        """
+        i = bisect.bisect_left(self._ends, start - 1)
+        j = bisect.bisect_right(self._starts, end + 1)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def union(self, other):
+        return IntervalSet(list(self) + list(other))
+
+    def difference(self, other):
+        """Return the intervals of self not in other
+
+        >>> IntervalSet([(1, 10)]).difference(IntervalSet([(0, 3), (7, 8)]))
+        IntervalSet([(4, 6), (9, 10)])
+
+        """
+        starts, ends = [], []
+        other = list(other)
+        j = 0
+        for s, e in self:
+            while j < len(other) and other[j][1] < s:
+                j += 1
+            k = j
+            while s <= e and k < len(other) and other[k][0] <= e:
+                os_, oe = other[k]
+                if os_ > s:
+                    starts.append(s)
+                    ends.append(os_ - 1)
+                s = max(s, oe + 1)
+                k += 1
+            if s <= e:
+                starts.append(s)
+                ends.append(e)
+        return self._from_sorted(starts, ends)
+
+    def intersection(self, other):
+        """Return the intervals both in self and other
+
+        >>> IntervalSet([(1, 5), (7, 10)]).intersection(IntervalSet([(3, 10)]))
+        IntervalSet([(3, 5), (7, 10)])
+
+        """
+        starts, ends = [], []
+        a, b = list(self), list(other)
+        i = j = 0
+        while i < len(a) and j < len(b):
+            s, e = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+            if s <= e:
+                starts.append(s)
+                ends.append(e)
+            if a[i][1] < b[j][1]:
+                i += 1
+            else:
+                j += 1
+        return self._from_sorted(starts, ends)
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
+
+    def to_bytes(self):
+        """Serialize as varint deltas between successive bounds
+
+        >>> len(IntervalSet([(1000000, 1000100), (1000200, 1000300)]).to_bytes())
+        6
+
+        """
+        out = bytearray()
+        previous = 0
+        for s, e in self:
+            _encode_varint(s - previous, out)
+            _encode_varint(e - s, out)
+            previous = e
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        values = list(_decode_varints(data))
+        starts, ends = [], []
+        previous = 0
+        for i in range(0, len(values), 2):
+            s = previous + values[i]
+            e = s + values[i + 1]
+            starts.append(s)
+            ends.append(e)
+            previous = e
+        return cls._from_sorted(starts, ends)
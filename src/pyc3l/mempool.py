@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+import collections
+
+from .common import to_int
+
+
+logger = logging.getLogger(__name__)
+
+
+def pool_entries(payload, section=None):
+    """Yield (hash, section, tx) of the transactions of a pool payload
+
+    Transactions are the dicts with a ``hash`` key, wherever they are
+    nested. ``section`` is the top-level key they were found under
+    (as ``pending`` or ``queued``).
+
+    >>> payload = {"pending": {"0xab": {"1": {"hash": "0xF1"}}},
+    ...            "queued": {"0xcd": {"3": {"hash": "0xf2"}}}}
+    >>> [(h, s) for h, s, _tx in pool_entries(payload)]
+    [('0xf1', 'pending'), ('0xf2', 'queued')]
+
+    """
+    if isinstance(payload, dict):
+        if isinstance(payload.get("hash"), str):
+            yield payload["hash"].lower(), section, payload
+            return
+        for key, value in payload.items():
+            yield from pool_entries(value, key if section is None else section)
+    elif isinstance(payload, list):
+        for value in payload:
+            yield from pool_entries(value, section)
+
+
+class TxPoolWatcher:
+    """Diff successive ``pool.php`` snapshots and time inclusions
+
+    Each ``poll()`` indexes the pool by hash and returns only the
+    changes since the previous snapshot:
+
+        >>> watcher = TxPoolWatcher(pyc3l)                # doctest: +SKIP
+        >>> added, removed, included = watcher.poll()     # doctest: +SKIP
+        >>> watcher.size, watcher.oldest_age              # doctest: +SKIP
+
+    ``added`` holds (hash, section, tx, seen_at), ``removed`` holds
+    (hash, first_seen, removed_at). New blocks are read on each poll,
+    and the departed (or still pooled) transactions found in them are
+    returned in ``included`` as (hash, block number, latency), the
+    latency going from the first time the transaction was seen in the
+    pool to the block timestamp. Departures not found in a block
+    after ``drop_after`` seconds are counted as dropped.
+
+    """
+
+    def __init__(self, pyc3l, poll_interval=5, drop_after=600,
+                 max_catch_up=100, nb_latencies=1000):
+        self._pyc3l = pyc3l
+        self._poll_interval = poll_interval
+        self._drop_after = drop_after
+        self._max_catch_up = max_catch_up
+        self._entries = {}   ## hash -> (section, tx, first_seen)
+        self._departed = collections.OrderedDict()  ## hash -> (first_seen, removed_at)
+        self.latencies = collections.deque(maxlen=nb_latencies)
+        self.nb_included = 0
+        self.nb_dropped = 0
+        self.last_poll = None
+        self.last_block = to_int(pyc3l.getBlockNumber())
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    ## Snapshots
+
+    def diff(self, payload, now=None):
+        """Update the snapshot from a pool payload, return (added, removed)"""
+        now = time.time() if now is None else now
+        current = {h: (section, tx) for h, section, tx in pool_entries(payload)}
+        added = []
+        for tx_hash in current.keys() - self._entries.keys():
+            section, tx = current[tx_hash]
+            self._entries[tx_hash] = (section, tx, now)
+            self._departed.pop(tx_hash, None)
+            added.append((tx_hash, section, tx, now))
+        removed = []
+        for tx_hash in self._entries.keys() - current.keys():
+            _section, _tx, first_seen = self._entries.pop(tx_hash)
+            self._departed[tx_hash] = (first_seen, now)
+            removed.append((tx_hash, first_seen, now))
+        for tx_hash in current.keys() & self._entries.keys():
+            section, tx = current[tx_hash]
+            if section != self._entries[tx_hash][0]:  ## e.g. queued -> pending
+                self._entries[tx_hash] = (section, tx, self._entries[tx_hash][2])
+        self.last_poll = now
+        return added, removed
+
+    ## Inclusions
+
+    def _included(self, block_nb, block):
+        collated_ts = to_int(block["timestamp"])
+        included = []
+        for tx in block.get("transactions") or []:
+            tx_hash = (tx if isinstance(tx, str) else tx["hash"]).lower()
+            if tx_hash in self._departed:
+                first_seen, _removed_at = self._departed.pop(tx_hash)
+            elif tx_hash in self._entries:
+                ## mined before the pool snapshot noticed it
+                first_seen = self._entries.pop(tx_hash)[2]
+            else:
+                continue
+            latency = max(0, collated_ts - first_seen)
+            self.latencies.append(latency)
+            self.nb_included += 1
+            included.append((tx_hash, block_nb, latency))
+        return included
+
+    def _expire_departed(self, now):
+        while self._departed:
+            tx_hash, (_first_seen, removed_at) = next(iter(self._departed.items()))
+            if now - removed_at < self._drop_after:
+                break
+            del self._departed[tx_hash]
+            self.nb_dropped += 1
+            logger.debug("Transaction %s left the pool without inclusion", tx_hash)
+
+    def read_blocks(self, now=None):
+        """Match the transactions of new blocks, return the inclusions"""
+        head = to_int(self._pyc3l.getBlockNumber())
+        if head - self.last_block > self._max_catch_up:
+            logger.warn(
+                "Skipping %d blocks to catch up with head",
+                head - self.last_block - self._max_catch_up,
+            )
+            self.last_block = head - self._max_catch_up
+        included = []
+        if head > self.last_block:
+            for block in self._pyc3l.iter_blocks(self.last_block + 1, head):
+                included.extend(self._included(block.number, block.data))
+                self.last_block = block.number
+        self._expire_departed(time.time() if now is None else now)
+        return included
+
+    def poll(self):
+        """Diff the current pool and read new blocks
+
+        Returns (added, removed, included).
+
+        """
+        with self._lock:
+            added, removed = self.diff(self._pyc3l.getTxPool())
+            ## blocks after the pool: departures get matched at once
+            included = self.read_blocks()
+        return added, removed, included
+
+    ## Metrics
+
+    @property
+    def size(self):
+        return len(self._entries)
+
+    @property
+    def sizes(self):
+        """Number of transactions per pool section"""
+        return dict(collections.Counter(s for s, _tx, _t in self._entries.values()))
+
+    def ages(self, now=None):
+        """Seconds since each pooled transaction was first seen"""
+        now = self.last_poll if now is None else now
+        return [now - first_seen for _s, _tx, first_seen in self._entries.values()]
+
+    @property
+    def oldest_age(self):
+        return max(self.ages(), default=None)
+
+    @property
+    def mean_age(self):
+        ages = self.ages()
+        return sum(ages) / len(ages) if ages else None
+
+    def latency_quantiles(self, quantiles=(0.5, 0.9, 0.99)):
+        """Return {quantile: latency} over the recent inclusion latencies"""
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {}
+        return {
+            q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+            for q in quantiles
+        }
+
+    def __repr__(self):
+        quantiles = self.latency_quantiles((0.5, ))
+        return (
+            f"<TxPoolWatcher {self.size} pooled, {len(self._departed)} departed, "
+            f"{self.nb_included} included (median latency "
+            f"{quantiles.get(0.5)}s), {self.nb_dropped} dropped>"
+        )
+
+    ## Background polling
+
+    def _run(self, callback):
+        while not self._stop.is_set():
+            try:
+                changes = self.poll()
+                if callback is not None and any(changes):
+                    callback(*changes)
+            except Exception as e:
+                logger.warn("Pool polling failed: %s", e)
+            self._stop.wait(self._poll_interval)
+
+    def start(self, callback=None):
+        """Poll in a background thread until ``stop()`` is called
+
+        ``callback``, if given, is called with added, removed and
+        included on each change.
+
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(callback, ), daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
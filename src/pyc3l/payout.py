@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import statistics
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import common
+from .ApiCommunication import encodeAddressForTransaction, encodeNumber
+from .tracker import TxTracker
+
+
+logger = logging.getLogger(__name__)
+
+
+NEW = "new"
+SIGNED = "signed"
+SUBMITTED = "submitted"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+def latency_stats(values):
+    """Return a summary dict of the given latencies (in seconds)
+
+    >>> latency_stats([])
+    {'nb': 0}
+    >>> latency_stats([1.0, 2.0, 3.0, 4.0])
+    {'nb': 4, 'mean': 2.5, 'p50': 2.5, 'p95': 4.0, 'max': 4.0}
+
+    """
+    if not values:
+        return {"nb": 0}
+    values = sorted(values)
+    return {
+        "nb": len(values),
+        "mean": statistics.mean(values),
+        "p50": statistics.median(values),
+        "p95": values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+        "max": values[-1],
+    }
+
+
+class PayoutJournal:
+    """Local sqlite journal of the state of each payout item
+
+    Every state change is committed right away, so a crashed payout
+    can be resumed from the journal without signing twice the same
+    item.
+
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(common.init_cache_dirs(), "payout_journal.sqlite")
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS payout_items (
+                batch text NOT NULL,
+                idx integer NOT NULL,
+                dest text,
+                amount real,
+                memo text,
+                state text,
+                nonce integer,
+                raw_tx text,
+                memo_from text,
+                memo_to text,
+                hash text,
+                response text,
+                error text,
+                signed_at real,
+                submitted_at real,
+                confirmed_at real,
+                PRIMARY KEY (batch, idx)
+            )
+        """
+        )
+        self._conn.commit()
+
+    def items(self, batch):
+        return self._conn.execute(
+            "SELECT * FROM payout_items WHERE batch = ? ORDER BY idx", (batch,)
+        ).fetchall()
+
+    def add_items(self, batch, items):
+        self._conn.executemany(
+            """
+            INSERT OR IGNORE INTO payout_items (batch, idx, dest, amount, memo, state)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+            [
+                (batch, idx, dest, amount, memo, NEW)
+                for idx, (dest, amount, memo) in enumerate(items)
+            ],
+        )
+        self._conn.commit()
+
+    def update(self, batch, idx, **fields):
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        self._conn.execute(
+            f"UPDATE payout_items SET {assignments} WHERE batch = ? AND idx = ?",
+            list(fields.values()) + [batch, idx],
+        )
+        self._conn.commit()
+
+
+class Payout:
+    """Pipelined bulk ``transferNant`` or ``pledge`` payout
+
+    ``items`` is a list of ``(dest, amount, memo)``, ``memo`` may be
+    ``None`` or ``""``. For ``transferNant`` the memo is sent to both
+    sender and receiver, for ``pledge`` only to the receiver.
+
+    Preflight reads are done once for the whole batch, nonces are
+    allocated contiguously to the items ready to be signed, signing
+    happens in a worker pool and submission with bounded concurrency.
+    Each item's state is kept in a :class:`PayoutJournal`: running
+    again the same payout (same ``label``, or same account, kind and
+    items) resumes it. Inclusions are followed by a
+    :class:`TxTracker` with ``run(wait_confirmation=True)``.
+
+    A ``snapshot`` of accounts as returned by ``currency.snapshot()``
+    can be given to avoid any preflight read.
+
+    """
+
+    KINDS = {
+        "transferNant": "nantTransfer",
+        "pledge": "pledge",
+    }
+
+    def __init__(self, currency, account, items, kind="transferNant",
+                 journal=None, label=None, sign_workers=4, submit_workers=4,
+                 snapshot=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unsupported payout kind {kind!r}")
+        self.currency = currency
+        self.account = account
+        self.items = [(dest, amount, memo or "") for dest, amount, memo in items]
+        self.kind = kind
+        self.journal = journal or PayoutJournal()
+        self.batch = label or self._batch_id()
+        self.sign_workers = sign_workers
+        self.submit_workers = submit_workers
+        self.snapshot = snapshot
+        self._pyc3l = currency._pyc3l
+        self._latencies = {"sign": [], "submit": []}
+
+    def _batch_id(self):
+        h = hashlib.sha256(json.dumps(
+            [self.kind, self.account.address.lower(), self.items]
+        ).encode("utf-8"))
+        return h.hexdigest()
+
+    def _rows(self, *states):
+        return [r for r in self.journal.items(self.batch) if r["state"] in states]
+
+    def _fail(self, row, error):
+        logger.error("Payout item %d to %s failed: %s", row["idx"], row["dest"], error)
+        self.journal.update(self.batch, row["idx"], state=FAILED, error=str(error))
+
+    ## Preflight
+
+    def preflight(self, rows):
+        """Check sender and destinations once for the whole batch
+
+        Raises if the sender can't do the payout, marks as failed the
+        items whose destination can't receive it and returns the
+        remaining rows.
+
+        """
+        currency = self.currency
+        address = self.account.address
+        dests = sorted(set(row["dest"] for row in rows))
+        reads = [("IsActive", dest) for dest in dests]
+        if self.kind == "pledge":
+            currency.checkAdmin(address, self.snapshot)
+        else:
+            reads += [("IsActive", address), ("NantBalance", address)]
+        infos = currency._preflight(reads, self.snapshot)
+
+        if self.kind != "pledge":
+            if not infos[("IsActive", address)]:
+                raise Exception(
+                    f"The sender wallet {address} is locked on "
+                    f"{currency._currency_name} and therefore cannot initiate a transfer."
+                )
+            total = sum(row["amount"] for row in rows)
+            balance = infos[("NantBalance", address)]
+            if balance < total:
+                raise Exception(
+                    f"The sender wallet {address} has an insufficient Nant balance "
+                    f"({balance}) on {currency._currency_name} to complete this "
+                    f"payout of {total}."
+                )
+
+        ok_rows = []
+        for row in rows:
+            if infos[("IsActive", row["dest"])]:
+                ok_rows.append(row)
+            elif self.kind == "pledge":
+                logger.warn("The target wallet %s is locked", row["dest"])
+                ok_rows.append(row)
+            else:
+                self._fail(row, f"The destination wallet {row['dest']} is locked")
+        return ok_rows
+
+    ## Signing
+
+    def _encrypt(self, memo, address, message_keys):
+        public_message_key = message_keys.get(address.lower())
+        if public_message_key is None:
+            logger.warn("No message key for account %s", address)
+            return ""
+        ciphered, _ = self.currency.encryptTransactionMessage(
+            memo, public_message_key=public_message_key
+        )
+        return ciphered
+
+    def _prepare(self, row, message_keys):
+        """Return the memos and call data of a row (no nonce involved)
+
+        ``message_keys`` is the dict of public message keys by lower
+        case address, as returned by ``prefetchMessageKeys()``.
+
+        """
+        memo_from = memo_to = ""
+        if row["memo"]:
+            memo_to = self._encrypt(row["memo"], row["dest"], message_keys)
+            if self.kind == "transferNant":
+                memo_from = self._encrypt(row["memo"], self.account.address, message_keys)
+        data = encodeAddressForTransaction(row["dest"])
+        data += encodeNumber(round(100 * row["amount"]))
+        return {"data": data, "memo_from": memo_from, "memo_to": memo_to}
+
+    def _sign(self, prepared, nonce, gas_price):
+        start = time.time()
+        fn = self.currency.comchain._get_contract_fn_hexs(self.KINDS[self.kind])[0]
+        transaction = self._pyc3l.prepare_transaction(
+            fn, prepared["data"], self.account.address, nonce, gas_price
+        )
+        raw_tx, tx_hash = self._pyc3l.sign_transaction(transaction, self.account)
+        return {
+            "nonce": nonce,
+            "raw_tx": raw_tx,
+            "hash": tx_hash,
+            "memo_from": prepared["memo_from"],
+            "memo_to": prepared["memo_to"],
+        }, time.time() - start
+
+    def sign(self, rows):
+        """Prepare given rows, then allocate nonces and sign them
+
+        Everything that can fail for a given item (memo encryption,
+        encoding) is done before allocating nonces, so that a failed
+        item doesn't leave a gap. Should signing fail anyway, the rows
+        signed after the gap are signed again with shifted nonces.
+
+        """
+        if not rows:
+            return
+        tr_infos = self._pyc3l.getTrInfos(self.account.address)
+        gas_price = int(tr_infos["gasprice"], 0)
+        nonce = int(tr_infos["nonce"], 0)
+        ## do not reuse nonces of already signed but not yet mined items
+        used = [r["nonce"] for r in self._rows(SIGNED, SUBMITTED) if r["nonce"] is not None]
+        if used:
+            nonce = max(nonce, max(used) + 1)
+        message_keys = {}
+        if any(row["memo"] for row in rows):
+            ## one concurrent bulk fetch instead of one request (and one
+            ## locked read of the key cache) per memo
+            message_keys = self.currency.prefetchMessageKeys(
+                [row["dest"] for row in rows if row["memo"]] + [self.account.address]
+            )
+
+        with ThreadPoolExecutor(max_workers=self.sign_workers) as executor:
+            futures = {
+                executor.submit(self._prepare, row, message_keys): row
+                for row in rows
+            }
+            prepared = {}
+            for future in as_completed(futures):
+                row = futures[future]
+                try:
+                    prepared[row["idx"]] = future.result()
+                except Exception as e:
+                    self._fail(row, e)
+            rows = [row for row in rows if row["idx"] in prepared]
+            logger.info("Signing %d payout items from nonce %d", len(rows), nonce)
+
+            while rows:
+                futures = [
+                    executor.submit(self._sign, prepared[row["idx"]], nonce + i, gas_price)
+                    for i, row in enumerate(rows)
+                ]
+                gap, failed = None, set()
+                for i, (row, future) in enumerate(zip(rows, futures)):
+                    try:
+                        fields, latency = future.result()
+                    except Exception as e:
+                        self._fail(row, e)
+                        failed.add(row["idx"])
+                        gap = i if gap is None else gap
+                        continue
+                    if gap is not None:
+                        ## signed after a gap: signed again below
+                        continue
+                    self._latencies["sign"].append(latency)
+                    self.journal.update(
+                        self.batch, row["idx"], state=SIGNED, signed_at=time.time(),
+                        **fields
+                    )
+                    nonce += 1
+                rows = [] if gap is None else [
+                    row for row in rows[gap + 1:] if row["idx"] not in failed
+                ]
+
+    ## Submission
+
+    def _submit(self, row):
+        start = time.time()
+        try:
+            response = self._pyc3l.send_raw_transaction(
+                row["raw_tx"], row["memo_from"] or "", row["memo_to"] or ""
+            )
+        except Exception as e:
+            ## It might have been sent already before a crash
+            if self._is_known(row["hash"]):
+                return None, time.time() - start
+            raise e
+        return response, time.time() - start
+
+    def _is_known(self, tx_hash):
+        try:
+            return bool(self._pyc3l.getTransactionInfo(tx_hash[2:]))
+        except Exception:
+            return False
+
+    def submit(self, rows):
+        """Submit signed rows with bounded concurrency (ordered by nonce)
+
+        Rows failing to be submitted stay signed, with their error, to
+        be submitted again by the next run: their nonce is needed by
+        all the following ones.
+
+        """
+        rows = sorted(rows, key=lambda r: r["nonce"])
+        with ThreadPoolExecutor(max_workers=self.submit_workers) as executor:
+            futures = {executor.submit(self._submit, row): row for row in rows}
+            for future in as_completed(futures):
+                row = futures[future]
+                try:
+                    response, latency = future.result()
+                except Exception as e:
+                    logger.error(
+                        "Submission of payout item %d (nonce %d) failed: %s",
+                        row["idx"], row["nonce"], e,
+                    )
+                    self.journal.update(self.batch, row["idx"], error=str(e))
+                    continue
+                self._latencies["submit"].append(latency)
+                self.journal.update(
+                    self.batch, row["idx"], state=SUBMITTED,
+                    submitted_at=time.time(),
+                    response=json.dumps(response),
+                )
+
+    ## Confirmation
+
+    def wait_confirmation(self, tracker, timeout=300):
+        """Follow new blocks with ``tracker`` until submitted items are included"""
+        def confirmed(idx):
+            return lambda tx_hash, bc_tx: self.journal.update(
+                self.batch, idx, state=CONFIRMED, confirmed_at=time.time()
+            )
+
+        rows = self._rows(SUBMITTED)
+        futures = {
+            row["idx"]: tracker.track(row["hash"], confirmed(row["idx"]))
+            for row in rows
+        }
+        ## items submitted by a previous run might be already mined
+        tracker.check_mined([row["hash"] for row in rows])
+        tracker.wait(timeout)
+        for idx, future in futures.items():
+            if future.done() and future.exception() is not None:
+                self.journal.update(
+                    self.batch, idx, state=FAILED, error=str(future.exception())
+                )
+
+    ## Main entry point
+
+    def run(self, wait_confirmation=False, timeout=300):
+        """Run (or resume) the payout and return its stats"""
+        start = time.time()
+        self.journal.add_items(self.batch, self.items)
+        ## start following blocks before any submission
+        tracker = TxTracker(self._pyc3l) if wait_confirmation else None
+
+        new_rows = self._rows(NEW)
+        if new_rows:
+            self.sign(self.preflight(new_rows))
+        self.submit(self._rows(SIGNED))
+
+        if wait_confirmation:
+            self.wait_confirmation(tracker, timeout - (time.time() - start))
+
+        return self.stats(time.time() - start)
+
+    def stats(self, elapsed):
+        rows = self.journal.items(self.batch)
+        states = {}
+        for row in rows:
+            states[row["state"]] = states.get(row["state"], 0) + 1
+        done = states.get(SUBMITTED, 0) + states.get(CONFIRMED, 0)
+        stats = {
+            "batch": self.batch,
+            "items": len(rows),
+            "states": states,
+            "elapsed": elapsed,
+            "throughput": done / elapsed if elapsed else 0.0,
+            "sign_latency": latency_stats(self._latencies["sign"]),
+            "submit_latency": latency_stats(self._latencies["submit"]),
+        }
+        logger.info(
+            "Payout %s: %d items %r in %.2fs (%.2f tx/s)",
+            self.batch[:8], len(rows), states, elapsed, stats["throughput"],
+        )
+        return stats
@@ -89,7 +89,7 @@ def locked_pickle_cache(path):
 class PersistentTTLCache(object):
     """Dict like key/value store that persists to disk.
 
-    Only implements get/set/del methods.
+    Only implements get/set/del methods, and their bulk versions.
 
     """
 
@@ -114,6 +114,39 @@ class PersistentTTLCache(object):
         with locked_pickle_cache(self.path) as cache:
             cache[key] = (time.time(), value)
 
+    def __delitem__(self, key):
+        with locked_pickle_cache(self.path) as cache:
+            del cache[key]
+
+    def get_many(self, keys):
+        """Return dict of the non expired values of given keys
+
+        Only one read of the underlying file is done.
+
+        """
+        now = time.time()
+        res = {}
+        with locked_pickle_cache(self.path) as cache:
+            for key in keys:
+                if key not in cache:
+                    continue
+                ttl, value = cache[key]
+                if (ttl is not None) and (now - ttl > self.ttl):
+                    del cache[key]
+                    continue
+                res[key] = value
+        return res
+
+    def set_many(self, dct):
+        """Set all key/values of ``dct`` with only one write of the file"""
+        now = time.time()
+        with locked_pickle_cache(self.path) as cache:
+            cache.update((key, (now, value)) for key, value in dct.items())
+
+    def clear(self):
+        with locked_pickle_cache(self.path) as cache:
+            cache.clear()
+
 SUPPORTED_DECORATOR = {
     property: lambda f: f.fget,
     classmethod: lambda f: f.__func__,
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Offline signing of transactions and durable raw transaction queue
+
+Signing (CPU bound, no network) is separated from the submission to
+the node: ``sign_many`` produces serialized raw transactions for known
+nonces and gas price into a :class:`RawTxQueue` file, using a process
+pool, and ``submit_queue`` drains this queue to ``api.php``.
+
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+
+from concurrent.futures import ProcessPoolExecutor
+
+from web3.eth import Eth
+
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_transaction(fn, data, address, nonce, gas_price):
+    """Return the transaction dict calling ``fn`` with ``data``"""
+    return {
+        "to": fn[0],
+        "value": 0,
+        # "gas": 2500000,
+        "gas": 5000000,
+        "gasPrice": gas_price,
+        "nonce": nonce,
+        "data": fn[1] + data,
+        "from": address,
+    }
+
+
+def sign_transaction(transaction, private_key):
+    """Sign transaction and return its raw hex form and its hash"""
+    signed = Eth.account.signTransaction(transaction, private_key)
+    return "0x" + bytes(signed.rawTransaction).hex(), "0x" + bytes(signed.hash).hex()
+
+
+class RawTxQueue:
+    """Durable queue of signed raw transactions
+
+    Signed transactions are appended as JSON lines to ``path``, and
+    the outcome of their submission is appended to ``path + '.done'``.
+    Both files are only appended to (and fsynced), under an exclusive
+    lock, so it is safe to resume a crashed signing or submission.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done_path = path + ".done"
+
+    def _append(self, path, records):
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    ## truncated last line of a crashed writer
+                    logger.warn("Ignoring malformed line in %r", path)
+        return records
+
+    def put(self, records):
+        self._append(self.path, records)
+
+    def mark_done(self, tx_hash, response=None):
+        self._append(self.done_path, [{
+            "hash": tx_hash,
+            "response": response,
+            "at": time.time(),
+        }])
+
+    def records(self):
+        return self._read(self.path)
+
+    def done(self):
+        """Return the dict of submission outcome by transaction hash"""
+        return {r["hash"]: r for r in self._read(self.done_path)}
+
+    def pending(self):
+        """Return signed records not yet submitted, in nonce order"""
+        done = self.done()
+        return sorted(
+            (r for r in self.records() if r["hash"] not in done),
+            key=lambda r: (r["from"].lower(), r["nonce"]),
+        )
+
+    def __len__(self):
+        return len(self.pending())
+
+
+## Signing stage
+
+_worker_private_key = None
+
+
+def _init_worker(private_key):
+    global _worker_private_key
+    _worker_private_key = private_key
+
+
+def _sign_request(request):
+    transaction = prepare_transaction(
+        request["fn"],
+        request["data"],
+        request["from"],
+        request["nonce"],
+        request["gas_price"],
+    )
+    raw_tx, tx_hash = sign_transaction(transaction, _worker_private_key)
+    return {
+        "hash": tx_hash,
+        "raw_tx": raw_tx,
+        "from": request["from"],
+        "to": request["fn"][0],
+        "nonce": request["nonce"],
+        "gas_price": request["gas_price"],
+        "memo_from": request.get("memo_from", ""),
+        "memo_to": request.get("memo_to", ""),
+        "meta": request.get("meta"),
+    }
+
+
+def sign_many(requests, account, queue, processes=None, chunksize=64):
+    """Sign requests in a process pool and append them to ``queue``
+
+    ``requests`` is an iterable of dicts with keys ``fn`` (a
+    ``(contract, fn_hex)`` tuple), ``data``, ``nonce``, ``gas_price``
+    and optionally ``memo_from``, ``memo_to`` (already ciphered) and a
+    JSON serializable ``meta``. No network access is required.
+
+    Returns the number of signed transactions.
+
+    """
+    requests = [dict(r, **{"from": account.address}) for r in requests]
+    nb = 0
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_worker,
+        initargs=(account.privateKey,),
+    ) as executor:
+        batch = []
+        for record in executor.map(_sign_request, requests, chunksize=chunksize):
+            batch.append(record)
+            if len(batch) >= chunksize:
+                queue.put(batch)
+                nb += len(batch)
+                batch = []
+        if batch:
+            queue.put(batch)
+            nb += len(batch)
+    logger.info("Signed %d transactions into %r", nb, queue.path)
+    return nb
+
+
+## Submission stage
+
+def _is_known(pyc3l, tx_hash):
+    try:
+        return bool(pyc3l.getTransactionInfo(tx_hash[2:]))
+    except Exception:
+        return False
+
+
+def submit_queue(pyc3l, queue, stop_on_error=True):
+    """Submit pending raw transactions of ``queue`` to the node
+
+    A submission raising an error (a timeout for instance) may still
+    have been accepted by the node: such transactions, as those sent
+    before a crash, are marked done once found on the node.
+
+    Returns a tuple ``(submitted, failed)`` counts.
+
+    """
+    submitted = failed = 0
+    for record in queue.pending():
+        try:
+            response = pyc3l.send_raw_transaction(
+                record["raw_tx"], record["memo_from"], record["memo_to"]
+            )
+        except Exception as e:
+            if _is_known(pyc3l, record["hash"]):
+                queue.mark_done(record["hash"], response=None)
+                submitted += 1
+                continue
+            ## left pending so that it is retried on next run
+            logger.error("Submission of %s failed: %s", record["hash"], e)
+            failed += 1
+            if stop_on_error:
+                ## following nonces would be stuck anyway
+                break
+            continue
+        queue.mark_done(record["hash"], response=response)
+        submitted += 1
+    logger.info("Submitted %d transactions from %r (%d failed)",
+                submitted, queue.path, failed)
+    return submitted, failed
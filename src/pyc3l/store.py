@@ -1,11 +1,23 @@
 # -*- coding: utf-8 -*-
 
 import pickle
+import random
 import sqlite3
 import os
+import json
+import hashlib
+import logging
+import itertools
 from collections import defaultdict
+from contextlib import contextmanager
 
 from . import common
+from .lib.intervals import IntervalSet
+from .blocktime import BlockTimeIndex
+from .common import to_int
+
+
+logger = logging.getLogger(__name__)
 
 
 def range_remove(target_range, current_block_ranges):
@@ -21,29 +33,7 @@ def range_remove(target_range, current_block_ranges):
     [(1, 5), (7, 10)]
 
     """
-    (start, end) = target_range
-    ## find missing blocks
-    missing_block_ranges = []
-    for s, e in current_block_ranges:
-        if e < start:
-            continue
-        if start < s:
-            if end < s:
-                missing_block_ranges.append((start, end))
-                return missing_block_ranges
-            ## start < s <= end
-            missing_block_ranges.append((start, s - 1))
-            if e > end:
-                return missing_block_ranges
-            ## start < s <= e <= end
-            start = e + 1
-            continue
-        ## s <= start <= e
-        start = e + 1
-        continue
-    if start <= end:
-        missing_block_ranges.append((start, end))
-    return missing_block_ranges
+    return list(IntervalSet([target_range]) - IntervalSet(current_block_ranges))
 
 
 def range_union(*ranges):
@@ -66,21 +56,7 @@ def range_union(*ranges):
 
 
     """
-    ranges = sorted(ranges)
-    union = []
-    if not ranges:
-        return union
-    (start, end) = ranges[0]
-    for s, e in ranges[1:]:
-        if e < start:
-            continue
-        if s <= end + 1:
-            end = max(end, e)
-            continue
-        union.append((start, end))
-        (start, end) = (s, e)
-    union.append((start, end))
-    return union
+    return list(IntervalSet(ranges))
 
 
 def range_intersection(*ranges):
@@ -139,13 +115,7 @@ def ranges_intersection_2(ranges1, ranges2):
     [(3, 5), (7, 10)]
 
     """
-    intersection = []
-    for r1 in ranges1:
-        for r2 in ranges2:
-            if r1[1] < r2[0] or r1[0] > r2[1]:
-                continue
-            intersection.append((max(r1[0], r2[0]), min(r1[1], r2[1])))
-    return intersection
+    return list(IntervalSet(ranges1) & IntervalSet(ranges2))
 
 
 def ranges_intersection(*ranges):
@@ -230,27 +200,30 @@ def curate_block_date(block_dates, ranges):
 
 
 class TxStore:
-    def __init__(self, pyc3l, currency, safe_wallet_add):
+    def __init__(self, pyc3l, currency, safe_wallet_add, balance_index=False):
         self.pyc3l = pyc3l
         self.inited = False
         self.currency = currency
-        self._current_ranges = None
-        self._current_block_dates = None
         self._sqlite3_conn = None
         self._sqlite3_cursor = None
         self._sqlite3_transaction_started = False
         self._safe_wallet_add = safe_wallet_add
+        self._balance_index = balance_index
+        self._txs_added = False
+        self._block_ranges = None  ## in-memory copy of ``block_ranges``
+        self._block_times = None
 
     def _init(self):
         if not self.inited:
             PYC3L_CACHE_DIR = common.init_cache_dirs()
 
+            ## legacy pickled states, migrated in the sqlite db
             self.cache_tx_db_state = os.path.join(
                 PYC3L_CACHE_DIR, f"tx_db_{self.currency}_state"
-            )  ## pickled state
+            )
             self.cache_block_dates_state = os.path.join(
                 PYC3L_CACHE_DIR, f"block_db_{self.currency}_state"
-            )  ## pickled state
+            )
             self.cache_tx_db = os.path.join(
                 PYC3L_CACHE_DIR, f"tx_db_{self.currency}.sqlite"
             )  ## sqlite db
@@ -263,6 +236,13 @@ class TxStore:
             self.init_db()
         self.inited = True
 
+    INSERT_TX_SQL = """
+        INSERT INTO transactions VALUES (
+            :hash, :block, :received_at, :caller, :contract, :contract_abi,
+            :fn, :fn_abi, :type, :sender, :receiver, :amount, :status
+        )
+    """
+
     def execute(self, *args):
         """Enforce transactionality of sqlite3 execute
 
@@ -274,13 +254,73 @@ class TxStore:
             self._sqlite3_transaction_started = True
         self._sqlite3_cursor.execute(*args)
 
+    def executemany(self, *args):
+        """Transactional sqlite3 executemany (see ``execute``)"""
+        if not self._sqlite3_transaction_started:
+            self._sqlite3_cursor.execute("BEGIN TRANSACTION")
+            self._sqlite3_transaction_started = True
+        self._sqlite3_cursor.executemany(*args)
+
     def commit(self):
-        """Commit the transaction to the database"""
+        """Commit the transaction to the database
+
+        Rollups, and the balance index if enabled, are updated with the
+        transactions added in the same transaction.
+        """
+        if self._txs_added:
+            self._txs_added = False
+            self._update_rollups()
+            if self._balance_index:
+                self._update_balance_index()
         self._sqlite3_conn.commit()
         self._sqlite3_transaction_started = False
 
-    def _create_db(self):
-        self.execute(
+    def rollback(self):
+        """Discard the changes of the current transaction"""
+        self._txs_added = False
+        self._block_ranges = None
+        self._sqlite3_conn.rollback()
+        self._sqlite3_transaction_started = False
+
+    def close(self):
+        """Close the database and the block timestamp index"""
+        if self._block_times is not None:
+            self._block_times.close()
+            self._block_times = None
+        if self._sqlite3_conn is not None:
+            self._sqlite3_conn.close()
+            self._sqlite3_conn = self._sqlite3_cursor = None
+        self._block_ranges = None
+        self._sqlite3_transaction_started = False
+        self.inited = False
+
+    @contextmanager
+    def _own_transaction(self):
+        """Commit changes made in the context, unless they were made in a
+        transaction the caller had already opened"""
+        in_transaction = self._sqlite3_transaction_started
+        yield
+        if not in_transaction and self._sqlite3_transaction_started:
+            self.commit()
+
+    ## Secondary indexes of ``transactions``, also re-created on open as
+    ## an interrupted ``bulk_ingest()`` may have left them dropped
+    TX_INDEXES = [
+        "CREATE INDEX IF NOT EXISTS idx_tx_received_at "
+        "ON transactions (received_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tx_sender_received_at "
+        "ON transactions (sender, received_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tx_receiver_received_at "
+        "ON transactions (receiver, received_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tx_type_received_at "
+        "ON transactions (type, received_at)",
+    ]
+
+    ## Each entry holds the statements upgrading the schema from its
+    ## index to the next version, stored in sqlite ``user_version``.
+    SCHEMA_MIGRATIONS = [
+        ## 1: base tables
+        [
             """
             CREATE TABLE IF NOT EXISTS transactions (
                 hash text NOT NULL UNIQUE,
@@ -297,126 +337,766 @@ class TxStore:
                 amount integer,
                 status text
             )
-        """
-        )
+            """,
+            ## disjoint ranges [first_block, last_block] of fullfilled blocks
+            """
+            CREATE TABLE IF NOT EXISTS block_ranges (
+                first_block integer NOT NULL PRIMARY KEY,
+                last_block integer NOT NULL
+            )
+            """,
+            ## collated timestamps of the blocks at boundaries of ranges
+            """
+            CREATE TABLE IF NOT EXISTS block_dates (
+                block integer NOT NULL PRIMARY KEY,
+                collated_ts integer
+            )
+            """,
+        ],
+        ## 2: secondary indexes for report queries (date range, per account)
+        TX_INDEXES,
+        ## 3: report rollups per safe wallet configuration
+        [
+            ## ``last_rowid`` is the last transaction aggregated in rollups
+            """
+            CREATE TABLE IF NOT EXISTS rollup_configs (
+                config text NOT NULL PRIMARY KEY,
+                safe_wallets text,
+                last_rowid integer NOT NULL DEFAULT 0
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS rollups (
+                config text NOT NULL,
+                granularity text NOT NULL,
+                period text NOT NULL,
+                pledge_total integer NOT NULL DEFAULT 0,
+                pledge_nb integer NOT NULL DEFAULT 0,
+                transfer_total integer NOT NULL DEFAULT 0,
+                transfer_nb integer NOT NULL DEFAULT 0,
+                reconv_total integer NOT NULL DEFAULT 0,
+                reconv_nb integer NOT NULL DEFAULT 0,
+                PRIMARY KEY (config, granularity, period)
+            )
+            """,
+        ],
+        ## 4: watermarks of incremental exports
+        [
+            """
+            CREATE TABLE IF NOT EXISTS exports (
+                target text NOT NULL PRIMARY KEY,
+                last_rowid integer NOT NULL DEFAULT 0
+            )
+            """,
+        ],
+        ## 5: running balance index
+        [
+            ## ``tx_order`` is the rowid of the transaction, ``balance``
+            ## the balance of ``account`` after it (amounts in cents)
+            """
+            CREATE TABLE IF NOT EXISTS balances (
+                account text NOT NULL,
+                block integer NOT NULL,
+                tx_order integer NOT NULL,
+                delta integer NOT NULL,
+                balance integer,
+                PRIMARY KEY (account, block, tx_order)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS watermarks (
+                name text NOT NULL PRIMARY KEY,
+                last_rowid integer NOT NULL DEFAULT 0
+            )
+            """,
+        ],
+        ## 6: hash of the transaction at the rollups watermark, to detect
+        ## a rowid reused by another transaction
+        [
+            "ALTER TABLE rollup_configs ADD COLUMN last_hash text",
+        ],
+        ## 7: same for the watermarks of incremental exports
+        [
+            "ALTER TABLE exports ADD COLUMN last_hash text",
+        ],
+    ]
+
+    ## strftime formats of ``_record_sql`` granularities kept in rollups
+    ROLLUP_GRANULARITIES = ("%Y-%m-%d", "%Y-%m")
+
+    @property
+    def schema_version(self):
+        (version, ) = self._sqlite3_conn.execute("PRAGMA user_version").fetchone()
+        return version
+
+    def _create_db(self):
+        """Apply the pending schema migrations, each in its own transaction"""
+        version = self.schema_version
+        for target, statements in enumerate(
+                self.SCHEMA_MIGRATIONS[version:], version + 1):
+            logger.info("Migrating %s schema to version %d", self.cache_tx_db, target)
+            for sql in statements:
+                self.execute(sql)
+            self.execute(f"PRAGMA user_version = {target}")
+            self.commit()
+
+    def _migrate_pickled_state(self):
+        """Import ranges and block dates of legacy pickled state files"""
+        for path in (self.cache_tx_db_state, self.cache_block_dates_state):
+            if not os.path.exists(path):
+                continue
+            state = pickle.load(open(path, "rb"))
+            if path == self.cache_tx_db_state:
+                for s, e in range_union(*state):
+                    self.execute(
+                        "INSERT OR REPLACE INTO block_ranges VALUES (?, ?)", (s, e)
+                    )
+            else:
+                for block, ts in state.items():
+                    self.execute(
+                        "INSERT OR REPLACE INTO block_dates VALUES (?, ?)", (block, ts)
+                    )
+            self.commit()
+            os.rename(path, f"{path}.migrated")
+
+    def _ensure_indexes(self):
+        for sql in self.TX_INDEXES:
+            self.execute(sql)
         self.commit()
 
     def init_db(self):
         self._create_db()
+        self._ensure_indexes()
+        self._migrate_pickled_state()
+        self._register_rollup_config()
+
+    @property
+    def block_ranges(self):
+        """``IntervalSet`` of fullfilled blocks
+
+        Loaded once from the ``block_ranges`` table, then kept in sync
+        by ``add_block()``.
+        """
+        self._init()
+        if self._block_ranges is None:
+            self._block_ranges = IntervalSet(
+                self._sqlite3_conn.execute(
+                    "SELECT first_block, last_block FROM block_ranges"
+                ).fetchall()
+            )
+        return self._block_ranges
 
     def current_ranges(self):
         """Return the ranges (s, e) of fullfilled blocks"""
-        if self._current_ranges is None:
-            self._init()
-            ## load current block from pickled state file
-            if os.path.exists(self.cache_tx_db_state):
-                self._current_ranges = pickle.load(open(self.cache_tx_db_state, "rb"))
-            else:
-                self._current_ranges = []
-        return self._current_ranges
+        return list(self.block_ranges)
 
     def has_block(self, block_number):
         """Return True if the block is in the current ranges"""
-        return any(s <= block_number <= e for s, e in self.current_ranges())
+        return block_number in self.block_ranges
 
     @property
-    def current_block_dates(self):
-        if self._current_block_dates is None:
-            self._init()
-            ## get block-date cache
-            if os.path.exists(self.cache_block_dates_state):
-                self._current_block_dates = pickle.load(open(self.cache_block_dates_state, "rb"))
-            else:
-                self._current_block_dates = {}
-        return self._current_block_dates
+    def block_times(self):
+        """Dense ``BlockTimeIndex`` of the timestamps of synced blocks"""
+        self._init()
+        if self._block_times is None:
+            path = os.path.join(
+                os.path.dirname(self.cache_tx_db), f"block_ts_{self.currency}.idx"
+            )
+            is_new = not os.path.exists(path)
+            self._block_times = BlockTimeIndex(path, self.pyc3l)
+            if is_new:
+                ## seed with the range boundaries known so far
+                self._block_times.set_many(self.current_block_dates.items())
+        return self._block_times
 
-    def add_block(self, block_number, collated_ts):
-        """Add a block to the current ranges"""
+    def block_at(self, timestamp):
+        """Return the last block with a timestamp <= ``timestamp``
 
-        ## update block range cache
+        Without a ``pyc3l`` instance to ask the node about the blocks of
+        the gaps, only synced blocks are considered.
 
-        self._current_ranges = range_union(
-            (block_number, block_number), *self.current_ranges()
-        )
+        """
+        index = self.block_times
+        if self.pyc3l is not None:
+            return index.block_at(timestamp)
+        ranges = self.current_ranges()
+        ## last range starting at or before ``timestamp``
+        lo, hi = 0, len(ranges)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if index.timestamp(ranges[mid][0]) <= timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        first, last = ranges[lo - 1]
+        try:
+            return index.block_at(timestamp, head=last, first=first)
+        except KeyError:
+            ## index created after these blocks were synced: only the
+            ## blocks having transactions have a known timestamp
+            (block, ) = self._sqlite3_conn.execute(
+                """
+                SELECT MAX(block) FROM transactions
+                WHERE block BETWEEN ? AND ? AND received_at <= ?
+            """,
+                (first, last, timestamp),
+            ).fetchone()
+            return first if block is None else block
+
+    def blocks_between(self, start_time=None, end_time=None):
+        """Return the (first, last) blocks with timestamps in the given
+        inclusive bounds, or None if there are none
 
-        pickle.dump(self._current_ranges, open(self.cache_tx_db_state, "wb"))
+        Allows to translate date bounded reports into block ranges.
+
+        """
+        if self.pyc3l is None and not self.block_ranges:
+            return None
+        if start_time is None:
+            first = 0 if self.pyc3l is not None else self.current_ranges()[0][0]
+        else:
+            before = self.block_at(start_time - 1)
+            first = 0 if before is None else before + 1
+        if end_time is None:
+            last = (
+                to_int(self.pyc3l.getBlockNumber()) if self.pyc3l is not None
+                else self.current_ranges()[-1][1]
+            )
+        else:
+            last = self.block_at(end_time)
+        if last is None or first > last:
+            return None
+        return (first, last)
 
+    @property
+    def current_block_dates(self):
+        self._init()
+        return dict(
+            self._sqlite3_conn.execute(
+                "SELECT block, collated_ts FROM block_dates ORDER BY block"
+            ).fetchall()
+        )
 
-        ## update block-date cache
+    def add_block(self, block_number, collated_ts):
+        """Add a block to the current ranges
 
-        self.current_block_dates[block_number] = collated_ts
-        self._current_block_dates = curate_block_date(self.current_block_dates, self.current_ranges())
+        Ranges and block dates are updated incrementally in the current
+        transaction, along with the transactions of the block: an
+        explicit ``commit()`` is required.
 
-        pickle.dump(self.current_block_dates, open(self.cache_block_dates_state, "wb"))
+        """
+        ranges = self.block_ranges
+        b = block_number
+        self.block_times.set(b, collated_ts)
+        prev = ranges.interval_at(b)
+        if prev is not None and b <= prev[1]:
+            ## already covered
+            return
+        nxt = ranges.interval_at(b + 1)
+        if nxt is not None and nxt[0] != b + 1:
+            nxt = None
+
+        (start, end) = (b, b)
+        if prev is not None and prev[1] == b - 1:
+            start = prev[0]
+            self.execute("DELETE FROM block_ranges WHERE first_block = ?", (prev[0],))
+            if prev[0] != prev[1]:
+                ## no longer a boundary
+                self.execute("DELETE FROM block_dates WHERE block = ?", (prev[1],))
+        if nxt is not None:
+            end = nxt[1]
+            self.execute("DELETE FROM block_ranges WHERE first_block = ?", (nxt[0],))
+            if nxt[0] != nxt[1]:
+                self.execute("DELETE FROM block_dates WHERE block = ?", (nxt[0],))
+        self.execute("INSERT INTO block_ranges VALUES (?, ?)", (start, end))
+        ranges.add(b, b)
+        if b in (start, end):
+            self.execute(
+                "INSERT OR REPLACE INTO block_dates VALUES (?, ?)", (b, collated_ts)
+            )
 
     def add_tx(self, data):
         """Add a transaction to the database"""
         self._init()
-        self.execute(
+        self.execute(self.INSERT_TX_SQL, data)
+        self._txs_added = True
+
+    def add_txs(self, txs, batch_size=10000):
+        """Add an iterable of transactions to the database
+
+        Transactions are inserted with ``executemany`` by batches of
+        ``batch_size`` in the current transaction, an explicit
+        ``commit()`` is required. Returns the number of transactions
+        added.
+
+        """
+        self._init()
+        nb = 0
+        txs = iter(txs)
+        for batch in iter(lambda: list(itertools.islice(txs, batch_size)), []):
+            self.executemany(self.INSERT_TX_SQL, batch)
+            self._txs_added = True
+            nb += len(batch)
+        return nb
+
+    @contextmanager
+    def bulk_ingest(self, defer_indexes=True, cache_size_mb=256):
+        """Tune the database for high throughput ingestion
+
+        Switches to WAL journal with ``synchronous=NORMAL`` and a larger
+        page cache (all restored when leaving the context) and, with ``defer_indexes``, drops the secondary
+        indexes of ``transactions`` to recreate them once after the
+        load (or on next open if the process was killed meanwhile).
+        Everything is committed when leaving the context.
+
+            >>> with store.bulk_ingest():        # doctest: +SKIP
+            ...     store.add_txs(txs)
+
+        """
+        self._init()
+        self.commit()
+        conn = self._sqlite3_conn
+        (journal_mode, ) = conn.execute("PRAGMA journal_mode").fetchone()
+        (synchronous, ) = conn.execute("PRAGMA synchronous").fetchone()
+        (cache_size, ) = conn.execute("PRAGMA cache_size").fetchone()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size={-1024 * cache_size_mb}")
+        indexes = []
+        if defer_indexes:
+            indexes = [
+                (name, sql) for name, sql in conn.execute(
+                    """
+                    SELECT name, sql FROM sqlite_master
+                    WHERE type = 'index' AND tbl_name = 'transactions'
+                        AND sql IS NOT NULL
                 """
-            INSERT INTO transactions VALUES (
-                :hash, :block, :received_at, :caller, :contract, :contract_abi,
-                :fn, :fn_abi, :type, :sender, :receiver, :amount, :status
+                )
+            ]
+            for name, _sql in indexes:
+                self.execute(f"DROP INDEX {name}")
+            self.commit()
+        try:
+            yield self
+            self.commit()
+        except Exception:
+            self.rollback()
+            raise
+        finally:
+            for name, sql in indexes:
+                logger.info("Re-creating index %s", name)
+                self.execute(sql)
+            self.commit()
+            ## WAL is persistent in the database file, leaving it also
+            ## checkpoints and removes the ``-wal`` and ``-shm`` files
+            conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            conn.execute(f"PRAGMA synchronous={synchronous}")
+            conn.execute(f"PRAGMA cache_size={cache_size}")
+
+    ## Columnar export
+
+    EXPORT_FORMATS = {"parquet": "parquet", "arrow": "arrow"}  ## format: extension
+
+    def _export_schema(self, pa):
+        string_columns = [
+            "hash", "caller", "contract", "contract_abi", "fn", "fn_abi",
+            "type", "sender", "receiver", "status",
+        ]
+        types = {
+            "block": pa.int64(),
+            "received_at": pa.timestamp("s", tz="UTC"),
+            "amount": pa.int64(),
+        }
+        types.update({name: pa.string() for name in string_columns})
+        return pa.schema([(name, types[name]) for name in (
+            "hash", "block", "received_at", "caller", "contract", "contract_abi",
+            "fn", "fn_abi", "type", "sender", "receiver", "amount", "status",
+        )])
+
+    def export(self, directory, format="parquet", start_block=None,
+               end_block=None, start_time=None, end_time=None,
+               incremental=True, batch_size=65536, compression="zstd"):
+        """Write transactions in a new part file of a columnar dataset
+
+        The ``transactions`` table, optionally filtered by block and
+        ``received_at`` timestamp (inclusive bounds), is streamed in
+        record batches of ``batch_size`` rows to a new
+        ``part-NNNNN.parquet`` (or ``.arrow`` for Arrow IPC) file in
+        ``directory``, so memory usage doesn't depend on the table size.
+
+        With ``incremental``, only the transactions added to the store
+        since the last incremental export to ``directory`` with the same
+        filters are written (whatever their block, as gaps may be filled
+        later). Each set of filters has its own watermark, so that rows
+        excluded by one are still exported by the others. If rowids
+        were renumbered or reused since, all the transactions are
+        written again. Returns the path of the part file, or None if
+        there was nothing to export.
+
+        Requires ``pyarrow`` (``pip install pyc3l[export]``).
+
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                "Exporting transactions requires pyarrow (pip install pyc3l[export])"
+            )
+        if format not in self.EXPORT_FORMATS:
+            raise ValueError(
+                f"Unsupported export format {format!r}, "
+                f"expected one of {', '.join(self.EXPORT_FORMATS)}"
             )
+        self._init()
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.abspath(directory)
+
+        where_clauses, params, filters = [], [], []
+        for column, op, value in [
+            ("block", ">=", start_block),
+            ("block", "<=", end_block),
+            ("received_at", ">=", start_time),
+            ("received_at", "<=", end_time),
+        ]:
+            if value is not None:
+                where_clauses.append(f"{column} {op} ?")
+                params.append(value)
+                filters.append(f"{column}{op}{value}")
+        if filters:
+            ## watermark of this filter, as in "/path/to/dir?block>=10"
+            target += "?" + "&".join(filters)
+        (max_rowid, ) = self._sqlite3_conn.execute(
+            "SELECT MAX(rowid) FROM transactions"
+        ).fetchone()
+        if max_rowid is None:
+            return None
+        where_clauses.append("rowid <= ?")
+        params.append(max_rowid)
+        if incremental:
+            row = self._sqlite3_conn.execute(
+                "SELECT last_rowid, last_hash FROM exports WHERE target = ?",
+                (target, ),
+            ).fetchone()
+            if row is not None:
+                last_rowid, last_hash = row
+                if last_rowid > max_rowid or (
+                        last_hash is not None
+                        and self._tx_hash_at(last_rowid) != last_hash):
+                    ## rowids were renumbered (ie: VACUUM) or reused
+                    ## after a deletion of the last transactions
+                    logger.warn(
+                        "Watermark of %s doesn't match the store anymore, "
+                        "exporting all transactions", target,
+                    )
+                else:
+                    where_clauses.append("rowid > ?")
+                    params.append(last_rowid)
+
+        schema = self._export_schema(pa)
+        extension = self.EXPORT_FORMATS[format]
+        part = 0
+        while os.path.exists(os.path.join(directory, f"part-{part:05d}.{extension}")):
+            part += 1
+        path = os.path.join(directory, f"part-{part:05d}.{extension}")
+        tmp_path = f"{path}.tmp"
+
+        cursor = self._sqlite3_conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT {", ".join(schema.names)}
+            FROM transactions
+            WHERE {" AND ".join(where_clauses)}
+            ORDER BY rowid
         """,
-        data,
+            params,
+        )
+        nb = 0
+        if format == "parquet":
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(tmp_path, schema, compression=compression)
+        else:
+            writer = pa.ipc.new_file(
+                tmp_path, schema,
+                options=pa.ipc.IpcWriteOptions(compression=compression),
             )
+        try:
+            for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+                columns = list(zip(*rows))
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(col, type=field.type)
+                     for col, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+                nb += len(rows)
+        except BaseException:
+            writer.close()
+            os.unlink(tmp_path)
+            raise
+        writer.close()
+        if not nb:
+            os.unlink(tmp_path)
+            path = None
+        else:
+            os.rename(tmp_path, path)
+            logger.info("Exported %d transactions to %s", nb, path)
+        if incremental:
+            with self._own_transaction():
+                self.execute(
+                    """
+                    INSERT OR REPLACE INTO exports (target, last_rowid, last_hash)
+                    VALUES (?, ?, ?)
+                """,
+                    (target, max_rowid, self._tx_hash_at(max_rowid)),
+                )
+        return path
+
+    ## Report aggregates
+
+    def _classification_sql(self, config, safe_wallets):
+        """Return the SQL joins and their params, and the conditions
+        classifying a transaction as top-up, transfer and reconversion
+
+        Safe wallets are loaded in an indexed temporary table, under
+        the ``config`` key, joined on sender and receiver.
 
+        """
+        if safe_wallets is None:
+            return "", [], ["type = 'pledge'", "type = 'transfer'", "0"]
+        self.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS safe_wallets (
+                config text NOT NULL,
+                address text NOT NULL,
+                PRIMARY KEY (config, address)
+            )
+        """
+        )
+        self.executemany(
+            "INSERT OR IGNORE INTO temp.safe_wallets VALUES (?, ?)",
+            ((config, address) for address in safe_wallets),
+        )
+        joins = """
+            LEFT JOIN temp.safe_wallets AS safe_sender
+                ON safe_sender.config = ? AND safe_sender.address = sender
+            LEFT JOIN temp.safe_wallets AS safe_receiver
+                ON safe_receiver.config = ? AND safe_receiver.address = receiver
+        """
+        is_topup_sql = "(type = 'pledge' AND safe_receiver.address IS NULL)"
+        is_topup_sql += " OR "
+        is_topup_sql += "(type = 'transfer' AND safe_sender.address IS NOT NULL)"
 
-    def _record_sql(self, granularity="%Y-%m"):
+        is_transfer_sql = "(type = 'transfer' AND safe_sender.address IS NULL"
+        is_transfer_sql += " AND safe_receiver.address IS NULL)"
 
+        is_reconv_sql = "(type = 'transfer' AND safe_receiver.address IS NOT NULL)"
+        return joins, [config, config], [is_topup_sql, is_transfer_sql, is_reconv_sql]
 
-        self._init()
+    def _aggregates_sql(self, config, safe_wallets):
+        """Return the SQL joins and their params, and the (total, nb)
+        aggregates of top-up, transfer and reconversion (amounts in cents)"""
+        joins, params, conditions = self._classification_sql(config, safe_wallets)
+        aggregates = []
+        for condition in conditions:
+            aggregates.append(f"SUM(CASE WHEN {condition} THEN amount ELSE 0 END)")
+            aggregates.append(f"COUNT(CASE WHEN {condition} THEN 1 ELSE NULL END)")
+        return joins, params, aggregates
+
+    ## Rollups
+
+    @property
+    def _rollup_config(self):
+        """Key of the safe wallet configuration of this store in rollups"""
         if self._safe_wallet_add is None:
-            query = """
+            return ""
+        return hashlib.sha1(
+            json.dumps(sorted(set(self._safe_wallet_add))).encode("utf-8")
+        ).hexdigest()
+
+    def _register_rollup_config(self):
+        safe_wallets = (
+            None if self._safe_wallet_add is None
+            else json.dumps(sorted(set(self._safe_wallet_add)))
+        )
+        self.execute(
+            "INSERT OR IGNORE INTO rollup_configs (config, safe_wallets) VALUES (?, ?)",
+            (self._rollup_config, safe_wallets),
+        )
+        self.commit()
+
+    def prune_rollup_configs(self):
+        """Remove the rollups of the other safe wallet configurations
+
+        Rollups of a configuration are only kept up to date by the
+        stores using it, and caught up with when one is opened again.
+        Returns the keys of the configurations removed.
+
+        """
+        self._init()
+        with self._own_transaction():
+            configs = [
+                config for (config, ) in self._sqlite3_conn.execute(
+                    "SELECT config FROM rollup_configs WHERE config != ?",
+                    (self._rollup_config, ),
+                )
+            ]
+            for config in configs:
+                self.execute("DELETE FROM rollups WHERE config = ?", (config, ))
+                self.execute(
+                    "DELETE FROM rollup_configs WHERE config = ?", (config, )
+                )
+        return configs
+
+    def _tx_hash_at(self, rowid):
+        row = self._sqlite3_conn.execute(
+            "SELECT hash FROM transactions WHERE rowid = ?", (rowid, )
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _update_rollups(self):
+        """Aggregate in rollups the transactions not yet aggregated
+
+        Called upon commit in the transaction inserting the
+        transactions, for the safe wallet configuration of this store
+        only. A newly registered configuration gets all its rollups
+        computed here from the raw data. Transactions without
+        ``received_at`` have no period and are left out, as in the
+        totals computed from the raw data.
+
+        """
+        (max_rowid, ) = self._sqlite3_conn.execute(
+            "SELECT MAX(rowid) FROM transactions"
+        ).fetchone()
+        config = self._rollup_config
+        row = self._sqlite3_conn.execute(
+            """
+            SELECT safe_wallets, last_rowid, last_hash
+            FROM rollup_configs WHERE config = ?
+        """,
+            (config, ),
+        ).fetchone()
+        if row is None:
+            return
+        safe_wallets, last_rowid, last_hash = row
+        rebuild = bool(last_rowid) and (
+            max_rowid is None or last_rowid > max_rowid
+            or (last_hash is not None
+                and self._tx_hash_at(last_rowid) != last_hash)
+        )
+        if rebuild:
+            ## rowids were renumbered (ie: VACUUM) or reused after a
+            ## deletion of the last transactions, start over
+            logger.warn("Rebuilding rollups of configuration %r", config)
+            self.execute("DELETE FROM rollups WHERE config = ?", (config, ))
+            last_rowid = 0
+        if max_rowid is None or last_rowid == max_rowid:
+            if rebuild:
+                self.execute(
+                    """
+                    UPDATE rollup_configs SET last_rowid = 0, last_hash = NULL
+                    WHERE config = ?
+                """,
+                    (config, ),
+                )
+            return
+        joins, params, aggregates = self._aggregates_sql(
+            config, None if safe_wallets is None else json.loads(safe_wallets)
+        )
+        for granularity in self.ROLLUP_GRANULARITIES:
+            self.execute(
+                f"""
+                INSERT INTO rollups (
+                    config, granularity, period,
+                    pledge_total, pledge_nb,
+                    transfer_total, transfer_nb,
+                    reconv_total, reconv_nb
+                )
                 SELECT
-                    strftime(?, received_at, 'unixepoch') AS month,
-                    SUM(CASE WHEN type = 'pledge' THEN amount ELSE 0 END)/100.0 AS pledge_total,
-                    COUNT(CASE WHEN type = 'pledge' THEN 1 ELSE NULL END) AS pledge_nb,
-                    SUM(CASE WHEN type = 'transfer' THEN amount ELSE 0 END)/100.0 AS transfer_total,
-                    COUNT(CASE WHEN type = 'transfer' THEN 1 ELSE NULL END) AS transfer_nb,
-                    0.0 AS reconv_total,
-                    0 AS reconv_nb
+                    ?, ?, strftime(?, received_at, 'unixepoch') AS period,
+                    {", ".join(aggregates)}
                 FROM
                     transactions
+                    {joins}
+                WHERE
+                    transactions.rowid > ? AND received_at IS NOT NULL
                 GROUP BY
-                    month
+                    period
+                ON CONFLICT (config, granularity, period) DO UPDATE SET
+                    pledge_total = pledge_total + excluded.pledge_total,
+                    pledge_nb = pledge_nb + excluded.pledge_nb,
+                    transfer_total = transfer_total + excluded.transfer_total,
+                    transfer_nb = transfer_nb + excluded.transfer_nb,
+                    reconv_total = reconv_total + excluded.reconv_total,
+                    reconv_nb = reconv_nb + excluded.reconv_nb
+            """,
+                [config, granularity, granularity] + params + [last_rowid],
+            )
+        self.execute(
+            """
+            UPDATE rollup_configs SET last_rowid = ?, last_hash = ?
+            WHERE config = ?
+        """,
+            (max_rowid, self._tx_hash_at(max_rowid), config),
+        )
+
+    def _record_query(self, granularity="%Y-%m", use_rollups=True):
+        """Return the query of ``_record_sql()`` and its params"""
+        self._init()
+        if use_rollups and granularity in self.ROLLUP_GRANULARITIES:
+            ## aggregate transactions not committed yet or written by
+            ## older versions
+            with self._own_transaction():
+                self._update_rollups()
+            query = """
+                SELECT
+                    period AS month,
+                    pledge_total/100.0, pledge_nb,
+                    transfer_total/100.0, transfer_nb,
+                    reconv_total/100.0, reconv_nb
+                FROM
+                    rollups
+                WHERE
+                    config = ? AND granularity = ?
                 ORDER BY
                     month;
             """
-            params = [granularity]
+            params = [self._rollup_config, granularity]
         else:
-
-            params = [granularity]
-            safe_wallets_sql = f"({','.join(['?' for _ in self._safe_wallet_add])})"
-            is_topup_sql = f"(type = 'pledge' AND receiver NOT IN {safe_wallets_sql})"
-            is_topup_sql += " OR "
-            is_topup_sql += f"(type = 'transfer' AND sender IN {safe_wallets_sql})"
-
-            is_transfer_sql = f"(type = 'transfer' AND sender NOT IN {safe_wallets_sql}"
-            is_transfer_sql += f" AND receiver NOT IN {safe_wallets_sql})"
-
-            is_reconv_sql = f"(type = 'transfer' AND receiver IN {safe_wallets_sql})"
-
-            params += 10 * list(self._safe_wallet_add)
-
+            with self._own_transaction():
+                joins, joins_params, aggregates = self._aggregates_sql(
+                    self._rollup_config, self._safe_wallet_add
+                )
             query = f"""
                 SELECT
                     strftime(?, received_at, 'unixepoch') AS month,
-                    SUM(CASE WHEN {is_topup_sql} THEN amount ELSE 0 END)/100.0 AS pledge_total,
-                    COUNT(CASE WHEN {is_topup_sql} THEN 1 ELSE NULL END) AS pledge_nb,
-                    SUM(CASE WHEN {is_transfer_sql} THEN amount ELSE 0 END)/100.0 AS transfer_total,
-                    COUNT(CASE WHEN {is_transfer_sql} THEN 1 ELSE NULL END) AS transfer_nb,
-                    SUM(CASE WHEN {is_reconv_sql} THEN amount ELSE 0 END)/100.0 AS reconv_total,
-                    COUNT(CASE WHEN {is_reconv_sql} THEN 1 ELSE NULL END) AS reconv_nb
+                    {aggregates[0]}/100.0 AS pledge_total,
+                    {aggregates[1]} AS pledge_nb,
+                    {aggregates[2]}/100.0 AS transfer_total,
+                    {aggregates[3]} AS transfer_nb,
+                    {aggregates[4]}/100.0 AS reconv_total,
+                    {aggregates[5]} AS reconv_nb
                 FROM
                     transactions
+                    {joins}
+                WHERE
+                    received_at IS NOT NULL
                 GROUP BY
                     month
                 ORDER BY
                     month;
             """
+            params = [granularity] + joins_params
+        return query, params
 
+    def _record_sql(self, granularity="%Y-%m", use_rollups=True):
+        """Yield per period top-up, transfer and reconversion totals
+
+        Daily and monthly granularities are read from the rollups,
+        other granularities are computed from the whole table.
+
+        """
+        query, params = self._record_query(granularity, use_rollups)
         cursor = self._sqlite3_conn.cursor()
 
         cursor.execute(query, params)
@@ -437,13 +1117,32 @@ class TxStore:
                    total_transfer, nb_transfer, total_reconv,
                    nb_reconv, pledge_minus_reconv)
 
-    def records(self, granularity="%Y-%m",
-                start_date=None,
-                end_date=None,
-                address_groups=None,
-                pledge_group="national currency"):
+    def _records_query(self, granularity="%Y-%m", start_date=None,
+                       end_date=None, address_groups=None,
+                       pledge_group="national currency"):
+        """Fill the groups table, return the query of ``records()`` and
+        its params"""
+        self._init()
+        with self._own_transaction():
+            self.execute(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS address_groups (
+                    address text NOT NULL PRIMARY KEY,
+                    grp text
+                )
+            """
+            )
+            self.execute("DELETE FROM temp.address_groups")
+            self.executemany(
+                "INSERT OR REPLACE INTO temp.address_groups VALUES (?, ?)",
+                (
+                    (addr, group)
+                    for group, addrs in (address_groups or {}).items()
+                    for addr in addrs
+                ),
+            )
 
-        params = [granularity]
+        params = [granularity, pledge_group]
         where_clauses = []
         if start_date is not None:
             start_date = start_date.timestamp
@@ -458,54 +1157,288 @@ class TxStore:
         if len(where_clauses) > 0:
             where_clause = "WHERE " + " AND ".join(where_clauses)
 
+        ## periods with only other types of transactions are kept, with
+        ## an empty matrix
         query = f"""
             SELECT
                 strftime(?, received_at, 'unixepoch') AS group_unit,
-                type, receiver, sender, amount
+                type IN ('pledge', 'transfer') AS is_transfer,
+                CASE WHEN type = 'pledge' THEN ? ELSE sg.grp END AS sender_group,
+                rg.grp AS receiver_group,
+                SUM(amount) AS total,
+                COUNT(*) AS nb
             FROM
                 transactions
+                LEFT JOIN temp.address_groups AS sg ON sg.address = sender
+                LEFT JOIN temp.address_groups AS rg ON rg.address = receiver
             {where_clause}
+            GROUP BY
+                group_unit, is_transfer, sender_group, receiver_group
             ORDER BY
                 group_unit;
         """
 
-        cursor = self._sqlite3_conn.cursor()
-        cursor.execute(query, params)
+        return query, params
 
-        ## reverse the dict to resolve addresses to group
-        addresses = {}
-        for group, addrs in address_groups.items():
-            for addr in addrs:
-                addresses[addr] = group
+    def records(self, granularity="%Y-%m",
+                start_date=None,
+                end_date=None,
+                address_groups=None,
+                pledge_group="national currency"):
+        """Yield per period the matrix of amounts exchanged between groups
 
-        try:
-            tx = next(cursor)
-        except StopIteration:
-            return
+        Sender and receiver groups are resolved by joining a temporary
+        table of ``address_groups``, and SQLite returns the totals per
+        period and pair of groups.
+
+        """
+        query, params = self._records_query(
+            granularity, start_date, end_date, address_groups, pledge_group
+        )
+        ## results are small, fetch them all so that the temporary table
+        ## can be reused before this generator is exhausted
+        rows = self._sqlite3_conn.execute(query, params).fetchall()
 
         def mk_new_matrix():
             return defaultdict(lambda: defaultdict(lambda: {"total": 0, "nb": 0}))
 
-        prev_group_unit = tx["group_unit"]
-        current_matrix = mk_new_matrix()
+        for group_unit, unit_rows in itertools.groupby(
+                rows, key=lambda row: row["group_unit"]):
+            matrix = mk_new_matrix()
+            for row in unit_rows:
+                if not row["is_transfer"]:
+                    continue
+                cell = matrix[row["sender_group"]][row["receiver_group"]]
+                cell["total"] += row["total"]
+                cell["nb"] += row["nb"]
+            yield (group_unit, matrix)
+
+    ## Balance index
+
+    ## pledges credit their receiver, transfers also debit their sender
+    BALANCE_MOVEMENTS_SQL = """
+        SELECT account, block, tx_order, SUM(delta) AS delta
+        FROM (
+            SELECT receiver AS account, block, rowid AS tx_order, amount AS delta
+            FROM transactions
+            WHERE type IN ('pledge', 'transfer') AND rowid > ? AND rowid <= ?
+            UNION ALL
+            SELECT sender, block, rowid, -amount
+            FROM transactions
+            WHERE type = 'transfer' AND rowid > ? AND rowid <= ?
+        )
+        WHERE account IS NOT NULL
+        GROUP BY account, block, tx_order
+    """
 
-        def consolidate_matrix(matrix, tx):
-            ## resolve groups
-            group_sender = pledge_group if tx["type"] == "pledge" else addresses.get(tx["sender"])
-            group_receiver = addresses.get(tx["receiver"])
-            ## Accumulate amount in matrix
-            matrix[group_sender][group_receiver]["total"] += tx["amount"]
-            matrix[group_sender][group_receiver]["nb"] += 1
+    def _balance_watermark(self):
+        row = self._sqlite3_conn.execute(
+            "SELECT last_rowid FROM watermarks WHERE name = 'balances'"
+        ).fetchone()
+        return 0 if row is None else row[0]
 
-        consolidate_matrix(current_matrix, tx)
+    def _set_balance_watermark(self, last_rowid):
+        self.execute(
+            "INSERT OR REPLACE INTO watermarks (name, last_rowid) VALUES ('balances', ?)",
+            (last_rowid, ),
+        )
 
-        for tx in cursor:
-            if tx["group_unit"] != prev_group_unit:
-                yield (prev_group_unit, current_matrix)
-                current_matrix = mk_new_matrix()
-                prev_group_unit = tx["group_unit"]
+    def rebuild_balance_index(self):
+        """Recompute the whole balance index from the transactions table
 
-            if tx["type"] in ("pledge", "transfer"):
-                consolidate_matrix(current_matrix, tx)
+        Doesn't commit.
+        """
+        self._init()
+        (max_rowid, ) = self._sqlite3_conn.execute(
+            "SELECT COALESCE(MAX(rowid), 0) FROM transactions"
+        ).fetchone()
+        self.execute("DELETE FROM balances")
+        self.execute(
+            f"""
+            INSERT INTO balances (account, block, tx_order, delta, balance)
+            SELECT
+                account, block, tx_order, delta,
+                SUM(delta) OVER (
+                    PARTITION BY account ORDER BY block, tx_order
+                )
+            FROM ({self.BALANCE_MOVEMENTS_SQL})
+        """,
+            (0, max_rowid, 0, max_rowid),
+        )
+        self._set_balance_watermark(max_rowid)
+
+    def _update_balance_index(self):
+        """Add the movements of transactions not yet indexed
+
+        Transactions of older blocks than already indexed ones (ie: when
+        filling a gap) shift the balances of the following movements of
+        their accounts, which are recomputed from the first new one.
 
-        yield (tx["group_unit"], current_matrix)
+        """
+        (max_rowid, ) = self._sqlite3_conn.execute(
+            "SELECT COALESCE(MAX(rowid), 0) FROM transactions"
+        ).fetchone()
+        last_rowid = self._balance_watermark()
+        if last_rowid == max_rowid:
+            return
+        if last_rowid > max_rowid:
+            ## rowids were renumbered (ie: VACUUM), start over
+            logger.warn("Rebuilding balance index")
+            self.rebuild_balance_index()
+            return
+        params = (last_rowid, max_rowid, last_rowid, max_rowid)
+        self.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS balance_updates (
+                account text NOT NULL PRIMARY KEY,
+                block integer NOT NULL,
+                tx_order integer NOT NULL,
+                base integer NOT NULL DEFAULT 0
+            )
+        """
+        )
+        self.execute("DELETE FROM temp.balance_updates")
+        ## first new movement of each account
+        self.execute(
+            f"""
+            INSERT INTO temp.balance_updates (account, block, tx_order)
+            SELECT account, block, tx_order
+            FROM (
+                SELECT
+                    account, block, tx_order,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY account ORDER BY block, tx_order
+                    ) AS n
+                FROM ({self.BALANCE_MOVEMENTS_SQL})
+            )
+            WHERE n = 1
+        """,
+            params,
+        )
+        ## balance before it
+        self.execute(
+            """
+            UPDATE temp.balance_updates SET base = COALESCE((
+                SELECT balance FROM balances AS previous
+                WHERE previous.account = balance_updates.account
+                    AND (previous.block, previous.tx_order)
+                        < (balance_updates.block, balance_updates.tx_order)
+                ORDER BY previous.block DESC, previous.tx_order DESC
+                LIMIT 1
+            ), 0)
+        """
+        )
+        self.execute(
+            f"INSERT INTO balances (account, block, tx_order, delta) "
+            f"{self.BALANCE_MOVEMENTS_SQL}",
+            params,
+        )
+        self.execute(
+            """
+            INSERT INTO balances (account, block, tx_order, delta, balance)
+            SELECT
+                b.account, b.block, b.tx_order, b.delta,
+                u.base + SUM(b.delta) OVER (
+                    PARTITION BY b.account ORDER BY b.block, b.tx_order
+                )
+            FROM
+                balances AS b
+                JOIN temp.balance_updates AS u ON u.account = b.account
+            WHERE
+                (b.block, b.tx_order) >= (u.block, u.tx_order)
+            ON CONFLICT (account, block, tx_order) DO UPDATE SET
+                balance = excluded.balance
+        """
+        )
+        self._set_balance_watermark(max_rowid)
+
+    def balance_at(self, account, block=None):
+        """Return the balance (in cents) of ``account`` after ``block``
+
+        Read from the balance index, ``block`` defaults to the last one.
+
+        """
+        self._init()
+        with self._own_transaction():
+            self._update_balance_index()
+        if block is None:
+            row = self._sqlite3_conn.execute(
+                """
+                SELECT balance FROM balances WHERE account = ?
+                ORDER BY block DESC, tx_order DESC LIMIT 1
+            """,
+                (account, ),
+            ).fetchone()
+        else:
+            row = self._sqlite3_conn.execute(
+                """
+                SELECT balance FROM balances WHERE account = ? AND block <= ?
+                ORDER BY block DESC, tx_order DESC LIMIT 1
+            """,
+                (account, block),
+            ).fetchone()
+        return 0 if row is None else row[0]
+
+    def statement(self, account, start_block=None, end_block=None):
+        """Yield the movements of ``account`` with its balance after each
+
+        Yields ``(block, received_at, hash, delta, balance)`` tuples in
+        chain order, amounts in cents.
+
+        """
+        self._init()
+        with self._own_transaction():
+            self._update_balance_index()
+        where_clauses, params = ["b.account = ?"], [account]
+        if start_block is not None:
+            where_clauses.append("b.block >= ?")
+            params.append(start_block)
+        if end_block is not None:
+            where_clauses.append("b.block <= ?")
+            params.append(end_block)
+        cursor = self._sqlite3_conn.execute(
+            f"""
+            SELECT b.block, t.received_at, t.hash, b.delta, b.balance
+            FROM
+                balances AS b
+                JOIN transactions AS t ON t.rowid = b.tx_order
+            WHERE {" AND ".join(where_clauses)}
+            ORDER BY b.block, b.tx_order
+        """,
+            params,
+        )
+        for row in cursor:
+            yield tuple(row)
+
+    def check_balance_index(self, accounts, sample=5):
+        """Compare indexed balances with on-chain ``getAccountGlobalBalance``
+
+        For each account, ``sample`` blocks are picked at random among
+        the blocks where it has movements. Returns the list of
+        ``(account, block, on_chain, indexed)`` mismatches (in cents).
+
+        """
+        self._init()
+        with self._own_transaction():
+            self._update_balance_index()
+        mismatches = []
+        for account in accounts:
+            blocks = [
+                block for (block, ) in self._sqlite3_conn.execute(
+                    "SELECT DISTINCT block FROM balances WHERE account = ?",
+                    (account, ),
+                )
+            ]
+            for block in random.sample(blocks, min(sample, len(blocks))):
+                pyc3l = type(self.pyc3l)(self.pyc3l.endpoint, block_number=hex(block))
+                on_chain = round(
+                    pyc3l.Currency(self.currency).getAccountGlobalBalance(account) * 100
+                )
+                indexed = self.balance_at(account, block)
+                if on_chain != indexed:
+                    logger.warn(
+                        "Balance of %s at block %d: %d on chain, %d indexed",
+                        account, block, on_chain, indexed,
+                    )
+                    mismatches.append((account, block, on_chain, indexed))
+        return mismatches
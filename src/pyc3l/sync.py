@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import itertools
+import threading
+import collections
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import to_int
+from .lib.intervals import IntervalSet
+
+
+logger = logging.getLogger(__name__)
+
+
+TRANSFER_FNS = {
+    ## fn_abi: (type, sender arg or None for caller, receiver arg)
+    "pledge": ("pledge", None, "address"),
+    "nantTransfer": ("transfer", None, "dest"),
+    "cmTransfer": ("transfer", None, "dest"),
+    "transferNantOnBehalf": ("transfer", "src", "to"),
+}
+
+
+def split_ranges(ranges, chunk_size):
+    """Split ranges (s, e) in chunks of at most ``chunk_size`` blocks
+
+    >>> split_ranges([(1, 5), (10, 10)], 2)
+    [(1, 2), (3, 4), (5, 5), (10, 10)]
+    >>> split_ranges([], 2)
+    []
+
+    """
+    chunks = []
+    for s, e in ranges:
+        for start in range(s, e + 1, chunk_size):
+            chunks.append((start, min(e, start + chunk_size - 1)))
+    return chunks
+
+
+class SyncMetrics:
+    """Progress, throughput and retry counters of a sync"""
+
+    def __init__(self, blocks_total):
+        self.blocks_total = blocks_total
+        self.blocks_done = 0
+        self.txs = 0
+        self.retries = 0
+        self.start = time.time()
+        self._lock = threading.Lock()
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start
+
+    @property
+    def progress(self):
+        return self.blocks_done / self.blocks_total if self.blocks_total else 1.0
+
+    @property
+    def blocks_per_sec(self):
+        return self.blocks_done / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def txs_per_sec(self):
+        return self.txs / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (
+            f"<SyncMetrics {self.blocks_done}/{self.blocks_total} blocks "
+            f"({self.progress:.1%}), {self.txs} txs, {self.retries} retries, "
+            f"{self.blocks_per_sec:.1f} blocks/s>"
+        )
+
+
+class BlockSync:
+    """Fill the missing block ranges of a ``TxStore``
+
+    Missing blocks of the target range are fetched concurrently across
+    the healthy endpoints, their transactions decoded, and written in
+    block order to the store. Each chunk of ``chunk_size`` blocks is
+    committed with its block range, so an interrupted sync can be
+    resumed by calling ``sync()`` again.
+
+        >>> sync = BlockSync(pyc3l, store)                 # doctest: +SKIP
+        >>> sync.sync((0, 1000000), progress=print)        # doctest: +SKIP
+
+    """
+
+    def __init__(self, pyc3l, tx_store, chunk_size=100, workers=8,
+                 max_retries=5, endpoints=None):
+        self.pyc3l = pyc3l
+        self.tx_store = tx_store
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self._endpoints = endpoints
+        self._endpoint_cycle = None
+        self._endpoint_lock = threading.Lock()
+        self.metrics = None
+
+    ## Endpoints
+
+    def _is_healthy(self, endpoint):
+        try:
+            endpoint.api.get()
+        except Exception as e:
+            logger.warn("Endpoint %s is not healthy: %s", endpoint, e)
+            return False
+        return True
+
+    def healthy_endpoints(self):
+        endpoints = list(self._endpoints or self.pyc3l.endpoints)
+        with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+            health = list(executor.map(self._is_healthy, endpoints))
+        healthy = [e for e, ok in zip(endpoints, health) if ok]
+        if not healthy:
+            raise Exception("No healthy endpoint available for sync")
+        return healthy
+
+    def _next_endpoint(self):
+        with self._endpoint_lock:
+            return next(self._endpoint_cycle)
+
+    ## Fetching
+
+    def fetch_block(self, block_number):
+        """Fetch block data, retrying on other endpoints on failure"""
+        for attempt in range(self.max_retries + 1):
+            endpoint = self._next_endpoint()
+            try:
+                block = endpoint.block.get(params={"block": hex(block_number)})
+                if not block:
+                    raise Exception("Empty block data")
+                if not all(isinstance(tx, dict)
+                           for tx in block.get("transactions") or []):
+                    raise Exception("Block data without full transactions")
+                return block
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise Exception(
+                        f"Couldn't fetch block {block_number} after "
+                        f"{self.max_retries} retries: {e}"
+                    )
+                logger.debug(
+                    "Fetching block %d on %s failed (%s), retrying",
+                    block_number, endpoint, e,
+                )
+                self.metrics.retried()
+                time.sleep(min(2 ** attempt * 0.1, 5))
+
+    ## Decoding
+
+    def tx_row(self, tx, collated_ts, decoded=None):
+        """Return the ``transactions`` table row of a block transaction
+
+        ``decoded`` is the (contract_abi, fn_abi, args) of the call as
+        given by ``Pyc3l.decode_calls()``, computed if not given.
+
+        """
+        if decoded is None:
+            decoded = self.pyc3l.decode_calls([tx])[0]
+        contract_abi, fn_abi, args = decoded
+        row = {
+            "hash": tx["hash"],
+            "block": to_int(tx["blockNumber"]),
+            "received_at": collated_ts,
+            "caller": tx["from"],
+            "contract": tx["to"],
+            "contract_abi": contract_abi,
+            "fn": tx["input"][2:10],
+            "fn_abi": fn_abi,
+            "type": None,
+            "sender": None,
+            "receiver": None,
+            "amount": None,
+            "status": None,
+        }
+        if fn_abi in TRANSFER_FNS and args is not None:
+            tx_type, sender_arg, receiver_arg = TRANSFER_FNS[fn_abi]
+            row["type"] = tx_type
+            row["sender"] = tx["from"] if sender_arg is None else args[sender_arg]
+            row["receiver"] = args[receiver_arg]
+            row["amount"] = args["amount"]
+        return row
+
+    def block_rows(self, block):
+        """Return the rows of the transactions of a block
+
+        Raises ``ValueError`` if transactions are given only by hash, as
+        the block would be recorded as synced without them.
+
+        """
+        collated_ts = to_int(block["timestamp"])
+        txs = block.get("transactions") or []
+        for tx in txs:
+            if not isinstance(tx, dict):
+                raise ValueError(
+                    f"Block {block.get('number')} has transaction {tx!r} "
+                    "without its data"
+                )
+        return [
+            self.tx_row(tx, collated_ts, decoded)
+            for tx, decoded in zip(txs, self.pyc3l.decode_calls(txs))
+        ]
+
+    ## Main loop
+
+    def sync(self, target_range, progress=None):
+        """Fill missing blocks of ``target_range`` (s, e) in the store
+
+        ``progress``, if given, is called with the :class:`SyncMetrics`
+        after each committed chunk. Returns the metrics.
+
+        """
+        missing = list(IntervalSet([target_range]) - self.tx_store.block_ranges)
+        chunks = split_ranges(missing, self.chunk_size)
+        self.metrics = metrics = SyncMetrics(sum(e - s + 1 for s, e in missing))
+        if not chunks:
+            return metrics
+        self._endpoint_cycle = itertools.cycle(self.healthy_endpoints())
+        logger.info(
+            "Syncing %d blocks in %d chunks of %s",
+            metrics.blocks_total, len(chunks), self.tx_store.currency,
+        )
+
+        block_numbers = (b for s, e in chunks for b in range(s, e + 1))
+        chunk_ends = set(e for _s, e in chunks)
+        window = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for nb in itertools.islice(block_numbers, self.workers * 4):
+                    window.append((nb, executor.submit(self.fetch_block, nb)))
+                while window:
+                    nb, future = window.popleft()
+                    block = future.result()
+                    for next_nb in itertools.islice(block_numbers, 1):
+                        window.append(
+                            (next_nb, executor.submit(self.fetch_block, next_nb))
+                        )
+                    rows = self.block_rows(block)
+                    self.tx_store.add_txs(rows)
+                    self.tx_store.add_block(nb, to_int(block["timestamp"]))
+                    metrics.blocks_done += 1
+                    metrics.txs += len(rows)
+                    if nb in chunk_ends:
+                        self.tx_store.commit()
+                        if progress is not None:
+                            progress(metrics)
+            except BaseException:
+                self.tx_store.rollback()
+                for _nb, future in window:
+                    future.cancel()
+                raise
+        logger.info("Sync done: %r", metrics)
+        return metrics
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .common import to_int
+
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionLost(Exception): pass
+
+
+class TxTracker:
+    """Follow new blocks to detect inclusion of many transactions at once
+
+    Instead of polling ``getTransactionInfo`` per hash, the tracker
+    reads each new block once through ``getBlockNumber`` and
+    ``getBlockByNumber`` and matches its transaction hashes against the
+    set of pending ones.
+
+        >>> tracker = TxTracker(pyc3l)                 # doctest: +SKIP
+        >>> future = tracker.track("0x1234...")        # doctest: +SKIP
+        >>> tracker.wait(timeout=120)                  # doctest: +SKIP
+        >>> future.result().block_nb                   # doctest: +SKIP
+
+    Hashes not included after ``lost_after`` blocks are checked in bulk
+    against ``lost_trn.php``, and their future gets a
+    :class:`TransactionLost` exception if the node reports them lost.
+
+    """
+
+    def __init__(self, pyc3l, start_block=None, poll_interval=2, lost_after=20):
+        self._pyc3l = pyc3l
+        self._poll_interval = poll_interval
+        self._lost_after = lost_after
+        self._lock = threading.Lock()
+        self._pending = {}  ## hash -> (future, callback, block at tracking time)
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_block = (
+            to_int(pyc3l.getBlockNumber()) if start_block is None else start_block - 1
+        )
+
+    def __len__(self):
+        return len(self._pending)
+
+    def track(self, tx_hash, callback=None):
+        """Track ``tx_hash`` and return a future resolved upon inclusion
+
+        ``callback``, if given, is called with the hash and the
+        ``BCTransaction`` object once the transaction is included.
+
+        """
+        tx_hash = tx_hash.lower()
+        if not tx_hash.startswith("0x"):
+            tx_hash = f"0x{tx_hash}"
+        with self._lock:
+            if tx_hash in self._pending:
+                return self._pending[tx_hash][0]
+            future = Future()
+            self._pending[tx_hash] = (future, callback, self.last_block)
+        return future
+
+    def track_many(self, tx_hashes, callback=None, check_mined=False):
+        """Track all ``tx_hashes``, return a dict of futures by hash
+
+        With ``check_mined``, transactions already mined (before the
+        blocks followed by the tracker) are resolved at once, see
+        :meth:`check_mined`.
+
+        """
+        futures = {h: self.track(h, callback) for h in tx_hashes}
+        if check_mined:
+            self.check_mined(futures.keys())
+        return futures
+
+    def check_mined(self, tx_hashes, max_workers=8):
+        """Resolve the given tracked transactions that are already mined
+
+        The node is asked once about each of them, concurrently. This
+        is meant for transactions that might have been included before
+        the tracker started following blocks. Returns the list of
+        resolved hashes.
+
+        """
+        hashes = []
+        for tx_hash in tx_hashes:
+            tx_hash = tx_hash.lower()
+            hashes.append(tx_hash if tx_hash.startswith("0x") else f"0x{tx_hash}")
+        if not hashes:
+            return []
+
+        def mined_tx(tx_hash):
+            try:
+                info = self._pyc3l.getTransactionInfo(tx_hash[2:])
+            except Exception as e:
+                logger.debug("Couldn't check transaction %s: %s", tx_hash, e)
+                return None
+            tx = (info or {}).get("transaction") or {}
+            return tx if tx.get("blockNumber") is not None else None
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(hashes))) as executor:
+            txs = list(executor.map(mined_tx, hashes))
+        resolved = []
+        for tx_hash, tx in zip(hashes, txs):
+            if tx is not None and self._resolve(tx_hash, tx):
+                resolved.append(tx_hash)
+        return resolved
+
+    def _resolve(self, tx_hash, tx):
+        with self._lock:
+            entry = self._pending.pop(tx_hash, None)
+        if entry is None:  ## already resolved
+            return False
+        future, callback, _ = entry
+        bc_tx = self._pyc3l.BCTransaction(tx_hash, data=tx)
+        if callback is not None:
+            try:
+                callback(tx_hash, bc_tx)
+            except Exception as e:
+                logger.error("Callback for %s raised: %s", tx_hash, e)
+        future.set_result(bc_tx)
+        return True
+
+    def _process_block(self, block_nb):
+        block = self._pyc3l.getBlockByNumber(block_nb)
+        if block is None:
+            return False
+        resolved = 0
+        for tx in block.get("transactions") or []:
+            if isinstance(tx, str):
+                tx = {"hash": tx, "blockNumber": hex(block_nb)}
+            tx_hash = tx["hash"].lower()
+            if tx_hash in self._pending and self._resolve(tx_hash, tx):
+                resolved += 1
+        if resolved:
+            logger.debug("Block %d: %d tracked transactions included", block_nb, resolved)
+        return True
+
+    def check_lost(self):
+        """Ask the node in bulk about the transactions awaiting for too long"""
+        with self._lock:
+            old = [
+                h for h, (_, _, since) in self._pending.items()
+                if self.last_block - since >= self._lost_after
+            ]
+        if not old:
+            return []
+        lost = [h.lower() for h in self._pyc3l.getLostTransactions(old)]
+        for tx_hash in lost:
+            with self._lock:
+                entry = self._pending.pop(tx_hash, None)
+            if entry is not None:
+                logger.warn("Transaction %s is lost", tx_hash)
+                entry[0].set_exception(TransactionLost(tx_hash))
+        return lost
+
+    def poll(self):
+        """Process all blocks up to the current head, return the count of
+        still pending transactions"""
+        head = to_int(self._pyc3l.getBlockNumber())
+        while self.last_block < head:
+            if not self._process_block(self.last_block + 1):
+                break
+            self.last_block += 1
+        if self._lost_after is not None:
+            self.check_lost()
+        return len(self._pending)
+
+    def wait(self, timeout=None):
+        """Poll until all tracked transactions are resolved or timeout
+
+        Returns the set of hashes still pending.
+
+        """
+        start = time.time()
+        while self.poll():
+            if timeout is not None and time.time() - start > timeout:
+                break
+            time.sleep(self._poll_interval)
+        return set(self._pending)
+
+    ## Background polling
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warn("Tracker polling failed: %s", e)
+            self._stop.wait(self._poll_interval)
+
+    def start(self):
+        """Poll in a background thread until ``stop()`` is called"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
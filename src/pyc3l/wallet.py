@@ -1,5 +1,12 @@
+import os
 import json
+import time
+import hmac
+import hashlib
 import logging
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
 
 from eth_account import Account
 
@@ -7,8 +14,60 @@ from eth_account import Account
 logger = logging.getLogger(__name__)
 
 
+## In-memory unlock sessions (opt-in): avoid running again the
+## (deliberately slow) keystore KDF for a wallet already unlocked in
+## this process. Sessions are keyed by a keyed hash of the keystore and
+## the password, with a secret that never leaves the process.
+
+_SESSION_SECRET = os.urandom(32)
+_sessions = {}  ## session key -> (expiration time, private key)
+_sessions_lock = threading.Lock()
+
+
+def _session_key(wallet, password):
+    keystore = json.dumps(wallet.get("crypto", wallet.get("Crypto")), sort_keys=True)
+    return hmac.new(
+        _SESSION_SECRET,
+        "\0".join([wallet["address"].lower(), keystore, password]).encode("utf-8"),
+        hashlib.sha256,
+    ).digest()
+
+
+def _session_get(key):
+    with _sessions_lock:
+        expires_at, private_key = _sessions.get(key, (0, None))
+        if expires_at < time.time():
+            _sessions.pop(key, None)
+            return None
+        return private_key
+
+
+def _session_set(key, private_key, ttl):
+    if not ttl:
+        return
+    with _sessions_lock:
+        _sessions[key] = (time.time() + ttl, private_key)
+
+
+def _session_del(key):
+    with _sessions_lock:
+        _sessions.pop(key, None)
+
+
+def clear_sessions():
+    """Forget all unlock sessions of this process"""
+    with _sessions_lock:
+        _sessions.clear()
+
+
+def _decrypt(wallet, password):
+    return Account.decrypt(wallet, password)
+
+
 class Wallet(object):
 
+    SESSION_TTL = 0  ## in sec, 0 disables unlock sessions
+
     def __init__(self, wallet):
         logger.info(
             "Load wallet with address 0x%s on server %r",
@@ -17,6 +76,7 @@ class Wallet(object):
         )
         self._wallet = wallet
         self._account = None
+        self._session_key = None
 
     @classmethod
     def from_file(cls, filename):
@@ -28,14 +88,69 @@ class Wallet(object):
         logger.info("Parsing JSON (size: %s)", len(json_string))
         return cls(json.loads(json_string))
 
-    def unlock(self, password):
-        self._account = Account.privateKeyToAccount(
-            Account.decrypt(self._wallet, password)
-        )
+    def unlock(self, password, session_ttl=None):
+        """Unlock the wallet, reusing a live unlock session if any
 
-    @property
-    def address(self):
-        return self._wallet["address"]
+        With a ``session_ttl`` (defaults to ``SESSION_TTL``, 0: no
+        session), the private key is kept in memory for this many
+        seconds, and unlocking again this wallet with the same password
+        in this process won't run the keystore KDF.
+
+        """
+        ttl = self.SESSION_TTL if session_ttl is None else session_ttl
+        key = _session_key(self._wallet, password)
+        private_key = _session_get(key)
+        if private_key is None:
+            private_key = _decrypt(self._wallet, password)
+            _session_set(key, private_key, ttl)
+        else:
+            logger.debug("Wallet 0x%s unlocked from session", self.address)
+        self._session_key = key
+        self._account = Account.privateKeyToAccount(private_key)
 
+    def lock(self):
+        """Lock the wallet and close its unlock session, if any"""
+        if self._session_key is not None:
+            _session_del(self._session_key)
+            self._session_key = None
+        self._account = None
 
+    @classmethod
+    def unlock_many(cls, wallets, passwords, max_workers=None, session_ttl=None):
+        """Unlock wallets, deriving their keys in parallel in a process pool
 
+        ``passwords`` is either a list matching ``wallets`` or a single
+        password for all of them.
+
+        """
+        wallets = list(wallets)
+        if isinstance(passwords, str):
+            passwords = [passwords] * len(wallets)
+        passwords = list(passwords)
+        if len(passwords) != len(wallets):
+            raise ValueError("Expected as many passwords as wallets")
+
+        keys = [_session_key(w._wallet, p) for w, p in zip(wallets, passwords)]
+        private_keys = [_session_get(key) for key in keys]
+        todo = [i for i, private_key in enumerate(private_keys) if private_key is None]
+        if todo:
+            logger.info("Deriving keys of %d wallets", len(todo))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                decrypted = executor.map(
+                    _decrypt,
+                    [wallets[i]._wallet for i in todo],
+                    [passwords[i] for i in todo],
+                )
+                for i, private_key in zip(todo, decrypted):
+                    private_keys[i] = private_key
+
+        for wallet, key, private_key in zip(wallets, keys, private_keys):
+            ttl = wallet.SESSION_TTL if session_ttl is None else session_ttl
+            _session_set(key, private_key, ttl)
+            wallet._session_key = key
+            wallet._account = Account.privateKeyToAccount(private_key)
+        return wallets
+
+    @property
+    def address(self):
+        return self._wallet["address"]
@@ -0,0 +1,72 @@
+"""Shared fixtures of the test suite"""
+
+import os
+import random
+import tempfile
+
+from pyc3l.store import TxStore
+
+
+def make_tx(i, **fields):
+    """Return a ``transactions`` row numbered ``i``
+
+    A transfer of 100 cents from 0xa to 0xb at block and timestamp
+    ``i``, with ``fields`` overriding any of its values.
+
+    """
+    tx = {
+        "hash": f"0x{i:064x}", "block": i, "received_at": i,
+        "caller": "0xa", "contract": "0xc", "contract_abi": "C-1",
+        "fn": "a5f7c148", "fn_abi": None, "type": "transfer",
+        "sender": "0xa", "receiver": "0xb", "amount": 100, "status": 0,
+    }
+    tx.update(fields)
+    return tx
+
+
+def random_tx(i, addresses, types=("pledge", "transfer", None),
+              amounts=(1, 10000), **fields):
+    """Return a ``transactions`` row of random type, accounts and amount
+
+    Draws from the ``random`` module, seed it for reproducible rows.
+
+    """
+    return make_tx(
+        i,
+        type=random.choice(types),
+        sender=random.choice(addresses),
+        receiver=random.choice(addresses),
+        amount=random.randint(*amounts),
+        **fields,
+    )
+
+
+class CacheDirMixin:
+    """Run each test with ``PYC3L_CACHE_DIR`` in a temporary directory
+
+    Stores opened with ``tx_store()`` are closed on tear down.
+
+    """
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = self._tmpdir.name
+        self._old_cache_dir = os.environ.get("PYC3L_CACHE_DIR")
+        os.environ["PYC3L_CACHE_DIR"] = self.cache_dir
+        self._tx_stores = []
+
+    def tearDown(self):
+        for store in self._tx_stores:
+            store.close()
+        if self._old_cache_dir is None:
+            del os.environ["PYC3L_CACHE_DIR"]
+        else:
+            os.environ["PYC3L_CACHE_DIR"] = self._old_cache_dir
+        self._tmpdir.cleanup()
+        super().tearDown()
+
+    def tx_store(self, currency="test", safe_wallet_add=None, **kwargs):
+        store = TxStore(None, currency, safe_wallet_add, **kwargs)
+        self._tx_stores.append(store)
+        return store
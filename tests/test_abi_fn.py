@@ -0,0 +1,79 @@
+import unittest
+
+from pyc3l import Pyc3l
+from pyc3l.sync import BlockSync
+
+
+CONTRACT_1 = "0x" + "1" * 40
+CONTRACT_2 = "0x" + "2" * 40
+UNKNOWN = "0x" + "9" * 40
+DEST = "0x" + "d" * 40
+
+
+def word(value):
+    return f"{value % 2 ** 256:064x}"
+
+
+def address_word(address):
+    return "0" * 24 + address[2:]
+
+
+class test_abi_fn(unittest.TestCase):
+    def setUp(self):
+        self.pyc3l = Pyc3l(endpoint="https://node.example.com")
+        currency = self.pyc3l.Currency("Test")
+        currency._metadata = {"server": {
+            "contract_1": CONTRACT_1,
+            "contract_2": CONTRACT_2,
+            "currencies": {"CUR": "TST"},
+        }}
+        self.pyc3l._contract_hex_to_currency = {
+            CONTRACT_1: currency, CONTRACT_2: currency,
+        }
+
+    def tx(self, to, input_hex):
+        return {
+            "hash": "0x" + "0" * 64, "blockNumber": "0x10", "from": "0x" + "c" * 40,
+            "to": to, "input": input_hex,
+        }
+
+    def test_abi_fn(self):
+        transfer = "0xa5f7c148" + address_word(DEST) + word(-250)
+        cases = [
+            (self.tx(CONTRACT_2, transfer), ("TST-2", "nantTransfer")),
+            (self.tx(CONTRACT_1, "0x6c343eef"), ("TST-1", "pledge")),
+            (self.tx(CONTRACT_1, transfer), ("<111111‥>", "a5f7c148")),
+            (self.tx(UNKNOWN, "0x6c343eef"), ("[999999‥]", "pledge")),
+            (self.tx(UNKNOWN, "0x12345678"), ("[999999‥]", "[12345678‥]")),
+            (self.tx(None, "0x6060"), ("", "loadContract")),
+        ]
+        for tx, expected in cases:
+            bc_tx = self.pyc3l.BCTransaction(tx["hash"], data=tx)
+            self.assertEqual(bc_tx.abi_fn, expected)
+        self.assertEqual(
+            self.pyc3l.BCTransaction(cases[0][0]["hash"], data=cases[0][0]).abi_args,
+            {"dest": DEST, "amount": -250},
+        )
+
+    def test_sync_rows(self):
+        sync = BlockSync(self.pyc3l, tx_store=None)
+        block = {"timestamp": "0x64", "transactions": [
+            self.tx(CONTRACT_2, "0x1b6b1ee5" + address_word(UNKNOWN)
+                    + address_word(DEST) + word(1000)),
+            self.tx(CONTRACT_1, "0x6c343eef" + address_word(DEST) + word(500)),
+            self.tx(CONTRACT_2, "0xa5f7c148"),  ## truncated input
+        ]}
+        rows = sync.block_rows(block)
+        self.assertEqual(
+            [(r["fn_abi"], r["type"], r["sender"], r["receiver"], r["amount"])
+             for r in rows],
+            [
+                ("transferNantOnBehalf", "transfer", UNKNOWN, DEST, 1000),
+                ("pledge", "pledge", "0x" + "c" * 40, DEST, 500),
+                ("nantTransfer", None, None, None, None),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
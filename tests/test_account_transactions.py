@@ -0,0 +1,69 @@
+import json
+import unittest
+
+from pyc3l import Pyc3l
+
+
+class FakeTransactionsApi:
+    def __init__(self, nb, max_count=None):
+        self.max_count = max_count
+        self.txs = [
+            json.dumps({"hash": f"0x{i:064x}", "time": str(1000 + i)})
+            for i in range(nb - 1, -1, -1)  ## most recent first
+        ]
+        self.requests = []
+
+    def get(self, params):
+        self.requests.append((params["offset"], params["count"]))
+        count = params["count"]
+        if self.max_count is not None:
+            count = min(count, self.max_count)
+        return self.txs[params["offset"]:params["offset"] + count]
+
+
+class FakeEndpoint:
+    def __init__(self, nb, max_count=None):
+        self.transactions = FakeTransactionsApi(nb, max_count)
+
+
+class test_iter_transactions(unittest.TestCase):
+    def account(self, nb, max_count=None):
+        self.endpoint = FakeEndpoint(nb, max_count)
+        return Pyc3l(endpoint=self.endpoint).Account("0x" + "a" * 40)
+
+    def test_adaptive_pages(self):
+        for prefetch in (True, False):
+            account = self.account(1000)
+            hashes = [tx.address for tx in account.iter_transactions(
+                batch_size=10, max_batch_size=100, prefetch=prefetch)]
+            self.assertEqual(hashes, [f"{i:064x}" for i in range(999, -1, -1)])
+            self.assertEqual(
+                self.endpoint.transactions.requests[:5],
+                [(0, 10), (10, 20), (30, 40), (70, 80), (150, 100)],
+            )
+
+    def test_server_capped_pages(self):
+        for prefetch in (True, False):
+            account = self.account(200, max_count=25)
+            hashes = [tx.address for tx in account.iter_transactions(
+                batch_size=10, max_batch_size=100, prefetch=prefetch)]
+            self.assertEqual(hashes, [f"{i:064x}" for i in range(199, -1, -1)])
+            requests = self.endpoint.transactions.requests
+            self.assertEqual(requests[:4], [(0, 10), (10, 20), (30, 40), (55, 25)])
+            self.assertEqual(requests[-2:], [(180, 25), (200, 20)])
+
+    def test_stop_conditions(self):
+        account = self.account(100)
+        txs = list(account.iter_transactions(until_hash=f"0x{90:064x}"))
+        self.assertEqual(
+            [tx.address for tx in txs], [f"{i:064x}" for i in range(99, 90, -1)]
+        )
+        txs = list(account.iter_transactions(since=1095))
+        self.assertEqual(len(txs), 5)
+
+    def test_transactions_property(self):
+        self.assertEqual(len(list(self.account(37).transactions)), 37)
+
+
+if __name__ == "__main__":
+    unittest.main()
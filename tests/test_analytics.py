@@ -0,0 +1,71 @@
+import random
+import datetime
+import unittest
+
+try:
+    import numpy
+except ImportError:  ## optional dependency
+    numpy = None
+
+from .helpers import CacheDirMixin, random_tx
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class test_analytics(CacheDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = self.tx_store()
+
+        random.seed(0)
+        addresses = ["0x%d" % i for i in range(20)]
+        self.txs = [
+            random_tx(i, addresses, ("pledge", "transfer", "transfer", None),
+                      received_at=1700000000 + i * 3600 * 7)
+            for i in range(2000)
+        ]
+        ## inserted out of order, as a sync would do
+        self.store.add_txs(sorted(self.txs, key=lambda tx: tx["hash"][::-1]))
+        self.store.commit()
+
+    def replay(self, period_fmt):
+        """Reference per-row end of period balances"""
+        balances, result = {}, {}
+        for tx in self.txs:
+            if tx["type"] not in ("pledge", "transfer"):
+                continue
+            if tx["type"] == "transfer":
+                balances[tx["sender"]] = balances.get(tx["sender"], 0) - tx["amount"]
+            balances[tx["receiver"]] = balances.get(tx["receiver"], 0) + tx["amount"]
+            period = datetime.datetime.fromtimestamp(
+                tx["received_at"], tz=datetime.timezone.utc
+            ).strftime(period_fmt)
+            result[period] = dict(balances)
+        return result
+
+    def test_balance_matrix(self):
+        from pyc3l.analytics import TxArrays, balance_matrix
+
+        data = TxArrays.from_store(self.store)
+        for period, period_fmt in [("day", "%Y-%m-%d"), ("month", "%Y-%m")]:
+            expected = self.replay(period_fmt)
+            periods, matrix = balance_matrix(data, period)
+            self.assertEqual(matrix.shape, (len(data.accounts), len(periods)))
+            for j, p in enumerate(periods):
+                p = str(p)
+                if p not in expected:
+                    continue
+                for address, i in data.index.items():
+                    self.assertEqual(matrix[i, j], expected[p].get(address, 0))
+
+    def test_end_of_period_balances(self):
+        from pyc3l.analytics import TxArrays, end_of_period_balances
+
+        data = TxArrays.from_store(self.store)
+        expected = self.replay("%Y-%m")
+        account, periods, balance = end_of_period_balances(data, "month")
+        for i, p, b in zip(account, periods, balance):
+            self.assertEqual(expected[str(p)][data.accounts[i]], b)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+from pyc3l import Pyc3l
+
+
+class FakeBlockApi:
+    def __init__(self, head):
+        self.head = head
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, params):
+        with self.lock:
+            self.requests.append(params)
+        if "hash" in params:
+            nb = int(params["hash"][2:], 16) - 0x1000
+        else:
+            nb = int(params["block"], 16)
+        if nb > self.head:
+            return None
+        return {
+            "number": hex(nb),
+            "hash": hex(0x1000 + nb),
+            "timestamp": hex(1000 + nb),
+            "transactions": [],
+        }
+
+
+class FakeApi:
+    def __init__(self, head):
+        self.head = head
+
+    def post(self):
+        return hex(self.head)
+
+
+class FakeEndpoint:
+    def __init__(self, head):
+        self.api = FakeApi(head)
+        self.block = FakeBlockApi(head)
+
+
+class test_iter_blocks(unittest.TestCase):
+    def setUp(self):
+        self.endpoint = FakeEndpoint(head=100)
+        self.pyc3l = Pyc3l(endpoint=self.endpoint)
+
+    def test_order_and_bounds(self):
+        self.assertEqual(
+            [b.number for b in self.pyc3l.iter_blocks(10, 30, window=4)],
+            list(range(10, 31)),
+        )
+        self.assertEqual(
+            [b.number for b in self.pyc3l.iter_blocks(5, 0)], [5, 4, 3, 2, 1, 0]
+        )
+        ## to the head by default, and stops at missing blocks
+        self.assertEqual(len(list(self.pyc3l.iter_blocks(90))), 11)
+        self.assertEqual(len(list(self.pyc3l.iter_blocks(95, 110))), 6)
+
+    def test_cached_next_prev(self):
+        blocks = list(self.pyc3l.iter_blocks(40, 50))
+        nb_requests = len(self.endpoint.block.requests)
+        self.assertEqual(blocks[3].next.number, 44)
+        self.assertEqual(blocks[3].prev.collated_ts, 1042)
+        self.assertEqual(len(self.endpoint.block.requests), nb_requests)
+        self.assertEqual(blocks[-1].next.number, 51)
+        self.assertEqual(len(self.endpoint.block.requests), nb_requests + 1)
+
+    def test_lru(self):
+        self.pyc3l.BLOCK_CACHE_SIZE = 10
+        list(self.pyc3l.iter_blocks(0, 30))
+        self.assertEqual(list(self.pyc3l._block_cache), list(range(21, 31)))
+
+    def test_block_data_by_hash(self):
+        block = self.pyc3l.Block(hex(0x1000 + 7))
+        self.assertEqual(block.number, 7)
+        self.assertEqual(self.endpoint.block.requests, [{"hash": hex(0x1000 + 7)}])
+
+
+if __name__ == "__main__":
+    unittest.main()
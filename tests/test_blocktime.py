@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from pyc3l.blocktime import BlockTimeIndex
+
+
+class FakePyc3l:
+    """Node with a block every 5 seconds"""
+
+    def __init__(self, head):
+        self.head = head
+        self.calls = 0
+
+    def getBlockNumber(self):
+        return hex(self.head)
+
+    def getBlockByNumber(self, nb):
+        self.calls += 1
+        return {"number": hex(nb), "timestamp": hex(1000 + nb * 5)}
+
+
+class test_BlockTimeIndex(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmpdir.name, "block_ts.idx")
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_get_set_persistence(self):
+        index = BlockTimeIndex(self.path)
+        self.assertIsNone(index.get(10))
+        self.assertIsNone(index.last_known_block())
+        index.set(0, 0)
+        index.set(10, 1234)
+        index.set(BlockTimeIndex.GROW_BLOCKS + 5, 5678)
+        self.assertEqual(index.get(0), 0)
+        self.assertEqual(len(index), 2 * BlockTimeIndex.GROW_BLOCKS)
+        index.close()
+
+        index = BlockTimeIndex(self.path)
+        self.assertEqual(index.get(10), 1234)
+        self.assertIsNone(index.get(11))
+        self.assertEqual(index.last_known_block(), BlockTimeIndex.GROW_BLOCKS + 5)
+        index.close()
+
+    def test_block_at(self):
+        pyc3l = FakePyc3l(head=100000)
+        index = BlockTimeIndex(self.path, pyc3l)
+        ## synced blocks resolve locally
+        index.set_many((b, 1000 + b * 5) for b in range(40000, 60000))
+        self.assertEqual(index.block_at(1000 + 50000 * 5), 50000)
+        self.assertEqual(index.block_at(1000 + 50000 * 5 + 4), 50000)
+        ## unknown blocks are fetched, and kept
+        calls = pyc3l.calls
+        self.assertEqual(index.block_at(1000 + 90000 * 5), 90000)
+        self.assertGreater(pyc3l.calls, calls)
+        calls = pyc3l.calls
+        self.assertEqual(index.block_at(1000 + 90000 * 5), 90000)
+        self.assertEqual(pyc3l.calls, calls)
+        self.assertIsNone(index.block_at(999))
+        self.assertEqual(index.block_at(10 ** 9), 100000)
+        index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
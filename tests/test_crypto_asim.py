@@ -0,0 +1,61 @@
+import unittest
+
+from ecdsa import SigningKey, SECP256k1
+
+from pyc3l import CryptoAsim
+
+
+def available_backends():
+    names = []
+    for name in CryptoAsim.BACKENDS:
+        try:
+            CryptoAsim.get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+class test_CryptoAsim(unittest.TestCase):
+    def setUp(self):
+        private_key = SigningKey.generate(curve=SECP256k1)
+        self.private_key_hex = private_key.to_string().hex()
+        self.public_key_hex = "0x" + private_key.get_verifying_key().to_string().hex()
+
+    def test_backends_are_wire_compatible(self):
+        for enc_backend in available_backends():
+            for dec_backend in available_backends():
+                ciphered = CryptoAsim.EncryptMessage(
+                    self.public_key_hex, "héllo", backend=enc_backend
+                )
+                self.assertEqual(
+                    CryptoAsim.DecryptMessage(
+                        self.private_key_hex, ciphered, backend=dec_backend
+                    ),
+                    "héllo",
+                )
+
+    def test_decrypt_many(self):
+        memos = ["memo %d" % i for i in range(10)]
+        ciphered = CryptoAsim.encrypt_many(
+            [(self.public_key_hex, m) for m in memos], processes=1
+        )
+        self.assertEqual(
+            CryptoAsim.decrypt_many(self.private_key_hex, ciphered, processes=1),
+            memos,
+        )
+
+        ## tampered memo
+        ciphered[0] = ciphered[0][:-2] + ("00" if ciphered[0][-2:] != "00" else "11")
+        with self.assertRaises(ValueError):
+            CryptoAsim.decrypt_many(self.private_key_hex, ciphered, processes=1)
+        self.assertEqual(
+            CryptoAsim.decrypt_many(
+                self.private_key_hex, ciphered, processes=1, errors="ignore"
+            ),
+            [None] + memos[1:],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
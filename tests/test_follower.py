@@ -0,0 +1,191 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from pyc3l import Pyc3l
+from pyc3l.follower import BlockFollower, tx_filter
+
+
+CONTRACT_A = "0x" + "a" * 40
+CONTRACT_B = "0x" + "b" * 40
+CONTRACT_1 = "0x" + "1" * 40
+CONTRACT_2 = "0x" + "2" * 40
+
+
+class FakeApi:
+    def __init__(self, chain):
+        self.chain = chain
+
+    def post(self):
+        return hex(self.chain.head)
+
+
+class FakeBlockApi:
+    def __init__(self, chain):
+        self.chain = chain
+
+    def get(self, params):
+        nb = int(params["block"], 16)
+        if nb > self.chain.head:
+            return None
+        self.chain.fetched.append(nb)
+        if nb in self.chain.hash_only:
+            return {
+                "number": hex(nb),
+                "timestamp": hex(1000 + nb),
+                "transactions": [f"0x{nb:064x}"],
+            }
+        return {
+            "number": hex(nb),
+            "timestamp": hex(1000 + nb),
+            "transactions": [
+                {
+                    "hash": f"0x{nb:060x}{i:04x}",
+                    "blockNumber": hex(nb),
+                    "from": "0x" + "c" * 40,
+                    "to": CONTRACT_A if i % 2 else CONTRACT_B,
+                    "input": "0x" + ("a9059cbb" if i < 2 else "095ea7b3"),
+                }
+                for i in range(3)
+            ],
+        }
+
+
+class FakeEndpoint:
+    def __init__(self, head):
+        self.head = head
+        self.fetched = []
+        self.hash_only = set()
+        self.api = FakeApi(self)
+        self.block = FakeBlockApi(self)
+
+
+class test_BlockFollower(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.cursor = os.path.join(self._tmpdir.name, "follower.json")
+        self.endpoint = FakeEndpoint(head=50)
+        self.pyc3l = Pyc3l(endpoint=self.endpoint)
+        self.pyc3l._contract_hex_to_currency = {}
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_follow_and_cursor(self):
+        follower = BlockFollower(self.pyc3l, self.cursor, start_block=11)
+        feed = follower.follow(contracts=[CONTRACT_A[2:]], fns=["a9059cbb"])
+        txs = [next(feed) for _ in range(40)]
+        self.assertEqual([int(tx.block_nb, 16) for tx in txs], list(range(11, 51)))
+        self.assertTrue(all(tx.data["to"] == CONTRACT_A for tx in txs))
+        feed.close()
+
+        ## resumes after the last fully consumed block
+        follower = BlockFollower(self.pyc3l, self.cursor)
+        self.assertEqual(follower.last_block, 49)
+        self.endpoint.head = 52
+        self.assertEqual([nb for nb, _ in follower.iter_blocks()], [50, 51, 52])
+
+    def test_hash_only_block(self):
+        follower = BlockFollower(self.pyc3l, self.cursor, start_block=11)
+        follower.save_cursor(10)
+        self.endpoint.hash_only.add(13)
+        feed = follower.follow()
+        with self.assertRaises(ValueError):
+            for _ in range(10):
+                next(feed)
+        self.assertEqual(follower.last_block, 12)
+        self.assertEqual(BlockFollower(self.pyc3l, self.cursor).last_block, 12)
+
+        ## blocks fetched concurrently, dispatched to subscriptions
+        follower = BlockFollower(self.pyc3l, self.cursor)
+        subscription = follower.subscribe()
+        with self.assertRaises(ValueError):
+            follower.poll()
+        self.assertEqual(follower.last_block, 12)
+        self.assertEqual(subscription._queue.qsize(), 0)
+        self.assertEqual(BlockFollower(self.pyc3l, self.cursor).last_block, 12)
+
+    def test_subscriptions(self):
+        follower = BlockFollower(self.pyc3l, self.cursor, start_block=1,
+                                 poll_interval=0.01)
+        all_txs = follower.subscribe(maxsize=5)
+        contract_b = follower.subscribe(contracts=[CONTRACT_B])
+        follower.start()
+        txs = [next(all_txs) for _ in range(150)]
+        self.assertEqual(len(set(tx.address for tx in txs)), 150)
+
+        async def consume():
+            txs = []
+            async for tx in contract_b:
+                txs.append(tx)
+                if len(txs) == 100:
+                    break
+            return txs
+
+        txs = asyncio.run(consume())
+        self.assertTrue(all(tx.data["to"] == CONTRACT_B for tx in txs))
+        follower.stop()
+        self.assertEqual(list(all_txs), [])
+        self.assertEqual(
+            BlockFollower(self.pyc3l, self.cursor).last_block,
+            min(all_txs.last_block, contract_b.last_block),
+        )
+
+
+class test_tx_filter(unittest.TestCase):
+    def setUp(self):
+        self.pyc3l = Pyc3l(endpoint="https://node.example.com")
+        currency = self.pyc3l.Currency("Test")
+        currency._metadata = {"server": {
+            "contract_1": CONTRACT_1,
+            "contract_2": CONTRACT_2,
+            "currencies": {"CUR": "TST"},
+        }}
+        self.pyc3l._contract_hex_to_currency = {
+            CONTRACT_1: currency, CONTRACT_2: currency,
+        }
+        self.txs = {}
+        for to in (CONTRACT_1, CONTRACT_2):
+            for selector in ("a5f7c148", "6c343eef", "12345678"):
+                tx_hash = f"0x{len(self.txs):064x}"
+                self.txs[(to, selector)] = self.pyc3l.BCTransaction(
+                    tx_hash,
+                    data={"hash": tx_hash, "to": to, "input": f"0x{selector}"},
+                )
+
+    def matching(self, **kwargs):
+        match = tx_filter(**kwargs)
+        return sorted(key for key, bc_tx in self.txs.items() if match(bc_tx))
+
+    def test_fns(self):
+        self.assertEqual(len(self.matching()), 6)
+        ## names as given by ``abi_fn``: nantTransfer is on contract 2 only
+        self.assertEqual(
+            self.matching(fns=["nantTransfer"]), [(CONTRACT_2, "a5f7c148")]
+        )
+        self.assertEqual(self.matching(fns=["transferNant"]), [])
+        ## selectors, in any case, mixed with names
+        self.assertEqual(
+            self.matching(fns=["6C343EEF", "nantTransfer"]),
+            [(CONTRACT_1, "6c343eef"), (CONTRACT_2, "6c343eef"),
+             (CONTRACT_2, "a5f7c148")],
+        )
+        self.assertEqual(
+            self.matching(fns=["a5f7c148"]),
+            [(CONTRACT_1, "a5f7c148"), (CONTRACT_2, "a5f7c148")],
+        )
+
+    def test_contracts(self):
+        self.assertEqual(
+            self.matching(contracts=[CONTRACT_2[2:].upper()], fns=["pledge"]),
+            [(CONTRACT_2, "6c343eef")],
+        )
+        self.assertEqual(
+            self.matching(contracts=[CONTRACT_1]),
+            [(CONTRACT_1, s) for s in ("12345678", "6c343eef", "a5f7c148")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from pyc3l import Pyc3l
+from pyc3l.history import HistoryStore, TokenBucket
+
+
+class FakeTransactionsApi:
+    def __init__(self):
+        self.txs = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def add(self, address, i, block=None):
+        self.txs.setdefault(address, []).insert(0, {
+            "hash": f"0x{i:064x}",
+            "time": str(1000 + i),
+            "block": "" if block is None else str(block),
+            "status": 1 if block is None else 0,
+        })
+
+    def get(self, params):
+        with self.lock:
+            self.requests += 1
+        txs = self.txs.get(params["addr"][2:].lower(), [])
+        return [
+            json.dumps(tx)
+            for tx in txs[params["offset"]:params["offset"] + params["count"]]
+        ]
+
+
+class FakeEndpoint:
+    def __init__(self):
+        self.transactions = FakeTransactionsApi()
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nb = 0
+
+    def acquire(self):
+        with self.lock:
+            self.nb += 1
+
+
+class test_HistoryStore(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.endpoint = FakeEndpoint()
+        self.history = HistoryStore(
+            Pyc3l(endpoint=self.endpoint),
+            os.path.join(self._tmpdir.name, "history.sqlite"),
+        )
+
+    def tearDown(self):
+        self.history._conn.close()
+        self._tmpdir.cleanup()
+
+    def test_incremental_sync(self):
+        address = "0x" + "a" * 40
+        api = self.endpoint.transactions
+        for i in range(50):
+            api.add(address[2:], i, block=100 + i)
+        api.add(address[2:], 50)  ## pending
+        self.assertEqual(self.history.sync(address), 51)
+        self.assertEqual(
+            self.history.watermark(address), (f"0x{49:064x}", 1049, 149)
+        )
+
+        ## pending one got mined, and a new one arrived
+        api.txs[address[2:]][0].update(block="150", status=0)
+        api.add(address[2:], 51, block=151)
+        requests = api.requests
+        self.assertEqual(self.history.sync(address), 2)
+        self.assertEqual(api.requests - requests, 1)
+        txs = list(self.history.transactions(address))
+        self.assertEqual(len(txs), 52)
+        self.assertEqual(txs[1]["block"], "150")
+        self.assertEqual(
+            self.history.watermark(address), (f"0x{51:064x}", 1051, 151)
+        )
+        self.assertEqual(len(list(self.history.transactions(address, since=1040))), 12)
+
+    def test_sync_many(self):
+        addresses = ["0x" + f"{i:040x}" for i in range(30)]
+        api = self.endpoint.transactions
+        for n, address in enumerate(addresses):
+            for i in range(n):
+                api.add(address[2:], i, block=i)
+        results = self.history.sync_many(addresses, max_workers=4, rate=1000)
+        self.assertEqual(results, {a: n for n, a in enumerate(addresses)})
+        self.assertIsNone(self.history.watermark(addresses[0]))
+        self.assertEqual(self.history.watermark(addresses[3])[2], 2)
+
+    def test_rate_limiter(self):
+        address = "0x" + "b" * 40
+        for i in range(100):
+            self.endpoint.transactions.add(address[2:], i, block=i)
+        limiter = CountingLimiter()
+        account = Pyc3l(endpoint=self.endpoint).Account(address)
+        self.assertEqual(len(list(account.iter_transactions(
+            batch_size=10, rate_limiter=limiter))), 100)
+        self.assertEqual(limiter.nb, self.endpoint.transactions.requests)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=1000, burst=5)
+        for _ in range(20):
+            bucket.acquire()
+        self.assertLess(bucket._tokens, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
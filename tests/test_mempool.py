@@ -0,0 +1,110 @@
+import unittest
+
+from pyc3l import Pyc3l
+from pyc3l.mempool import TxPoolWatcher
+
+
+class FakeChain:
+    def __init__(self):
+        self.head = 10
+        self.pool = {}
+        self.blocks = {}
+
+    def submit(self, tx_hash, section="pending"):
+        self.pool.setdefault(section, {})[tx_hash.lower()] = {"0": {"hash": tx_hash}}
+
+    def mine(self, timestamp, tx_hashes):
+        self.head += 1
+        self.blocks[self.head] = {
+            "number": hex(self.head),
+            "hash": hex(0x1000 + self.head),
+            "timestamp": hex(timestamp),
+            "transactions": [{"hash": h} for h in tx_hashes],
+        }
+        for section in self.pool.values():
+            for h in tx_hashes:
+                section.pop(h, None)
+
+
+class FakeApi:
+    def __init__(self, chain):
+        self.chain = chain
+
+    def post(self):
+        return hex(self.chain.head)
+
+
+class FakeBlockApi:
+    def __init__(self, chain):
+        self.chain = chain
+
+    def get(self, params):
+        return self.chain.blocks.get(int(params["block"], 16))
+
+
+class FakePoolApi:
+    def __init__(self, chain):
+        self.chain = chain
+
+    def get(self):
+        return self.chain.pool
+
+
+class FakeEndpoint:
+    def __init__(self, chain):
+        self.api = FakeApi(chain)
+        self.block = FakeBlockApi(chain)
+        self.pool = FakePoolApi(chain)
+
+
+class test_TxPoolWatcher(unittest.TestCase):
+    def setUp(self):
+        self.chain = FakeChain()
+        self.watcher = TxPoolWatcher(Pyc3l(endpoint=FakeEndpoint(self.chain)))
+
+    def poll(self, now):
+        with self.watcher._lock:
+            added, removed = self.watcher.diff(self.chain.pool, now=now)
+            included = self.watcher.read_blocks(now=now)
+        return added, removed, included
+
+    def test_diff_and_inclusion(self):
+        self.chain.submit("0xA1")
+        self.chain.submit("0xa2")
+        self.chain.submit("0xa3", section="queued")
+        added, removed, included = self.poll(now=1000)
+        self.assertEqual(sorted(h for h, *_ in added), ["0xa1", "0xa2", "0xa3"])
+        self.assertEqual((removed, included), ([], []))
+        self.assertEqual(self.watcher.sizes, {"pending": 2, "queued": 1})
+
+        ## no change, no event
+        self.assertEqual(self.poll(now=1005), ([], [], []))
+        self.assertEqual(self.watcher.oldest_age, 5)
+
+        self.chain.mine(1012, ["0xa1"])
+        self.chain.pool["pending"].pop("0xa2")  ## dropped
+        added, removed, included = self.poll(now=1015)
+        self.assertEqual(added, [])
+        self.assertEqual(sorted(h for h, *_ in removed), ["0xa1", "0xa2"])
+        self.assertEqual(included, [("0xa1", 11, 12)])
+        self.assertEqual(self.watcher.size, 1)
+
+        ## mined before a snapshot noticed its departure
+        self.chain.submit("0xa4")
+        self.poll(now=1020)
+        self.chain.blocks[12] = {
+            "number": hex(12), "hash": "0x100c", "timestamp": hex(1030),
+            "transactions": ["0xa4"],
+        }
+        self.chain.head = 12
+        added, removed, included = self.poll(now=1031)
+        self.assertEqual(included, [("0xa4", 12, 10)])
+        self.assertEqual(self.watcher.latency_quantiles((0.5, 1)), {0.5: 12, 1: 12})
+
+        self.poll(now=1015 + self.watcher._drop_after)
+        self.assertEqual(self.watcher.nb_dropped, 1)
+        self.assertEqual(self.watcher.nb_included, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from pyc3l.payout import Payout, PayoutJournal, SIGNED, SUBMITTED, FAILED
+
+
+SENDER = "0x" + "5" * 40
+
+
+class Crash(BaseException):
+    """Simulated process death (not caught as an ``Exception``)"""
+
+
+class FakeNode:
+    def __init__(self, nonce=7):
+        self.nonce = nonce
+        self.lock = threading.Lock()
+        self.accepted = {}   ## hash -> nonce
+        self.submits = []    ## accepted hashes, in order
+        self.fail_submit = set()   ## nonces rejected once with an error
+        self.crash_on_submit = None  ## crash after accepting the nth submit
+        self.fail_sign = set()     ## nonces failing once to be signed
+
+    def getTrInfos(self, address):
+        return {"gasprice": "0x1", "nonce": hex(self.nonce)}
+
+    def prepare_transaction(self, fn, data, address, nonce, gas_price):
+        return {"data": data, "nonce": nonce}
+
+    def sign_transaction(self, transaction, account):
+        nonce = transaction["nonce"]
+        if nonce in self.fail_sign:
+            self.fail_sign.discard(nonce)
+            raise Exception(f"Signing failure for nonce {nonce}")
+        tx_hash = f"0x{nonce:04x}{transaction['data'][-8:]}"
+        return f"raw:{tx_hash}", tx_hash
+
+    def send_raw_transaction(self, raw_tx, memo_from, memo_to):
+        tx_hash = raw_tx[4:]
+        nonce = int(tx_hash[2:6], 16)
+        with self.lock:
+            if tx_hash in self.accepted:
+                raise Exception("known transaction")
+            if nonce in self.fail_submit:
+                self.fail_submit.discard(nonce)
+                raise Exception("connection reset")
+            self.accepted[tx_hash] = nonce
+            self.submits.append(tx_hash)
+            if self.crash_on_submit == len(self.submits):
+                raise Crash()
+        return {"ok": True}
+
+    def getTransactionInfo(self, tx_hash):
+        return {"hash": tx_hash} if f"0x{tx_hash}" in self.accepted else {}
+
+
+class FakeComchain:
+    def _get_contract_fn_hexs(self, name):
+        return [("0x" + "c" * 40, "0xa5f7c148")]
+
+
+class FakeCurrency:
+    _currency_name = "Test"
+
+    def __init__(self, node):
+        self._pyc3l = node
+        self.comchain = FakeComchain()
+        self.no_key = set()
+
+    def _preflight(self, reads, snapshot=None):
+        return {
+            read: (1000000 if read[0] == "NantBalance" else True)
+            for read in reads
+        }
+
+    def prefetchMessageKeys(self, addresses):
+        return {a.lower(): f"key-{a.lower()}" for a in addresses}
+
+    def encryptTransactionMessage(self, plain_text, **kwargs):
+        key = kwargs["public_message_key"]  ## never by address
+        if key[4:] in self.no_key:
+            raise Exception("Can't encrypt")
+        return f"ciphered:{plain_text}:{key}", key
+
+
+class FakeAccount:
+    address = SENDER
+
+
+class test_Payout(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self._tmpdir.name, "journal.sqlite")
+        self.node = FakeNode()
+        self.currency = FakeCurrency(self.node)
+        self.items = [
+            (f"0x{i:040x}", i + 1, "memo" if i % 3 else "") for i in range(1, 21)
+        ]
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def payout(self):
+        return Payout(
+            self.currency, FakeAccount(), self.items,
+            journal=PayoutJournal(self.journal_path),
+        )
+
+    def assertPaidOnce(self, nb_items):
+        self.assertEqual(len(self.node.submits), len(set(self.node.submits)))
+        self.assertEqual(
+            sorted(self.node.accepted.values()),
+            list(range(self.node.nonce, self.node.nonce + nb_items)),
+        )
+
+    def test_crash_after_sign(self):
+        payout = self.payout()
+        payout.submit = lambda rows: (_ for _ in ()).throw(Crash())
+        with self.assertRaises(Crash):
+            payout.run()
+        self.assertEqual(len(payout._rows(SIGNED)), 20)
+        stats = self.payout().run()
+        self.assertEqual(stats["states"], {SUBMITTED: 20})
+        self.assertPaidOnce(20)
+
+    def test_crash_after_submit(self):
+        self.node.crash_on_submit = 5
+        with self.assertRaises(Crash):
+            self.payout().run()
+        self.node.crash_on_submit = None
+        stats = self.payout().run()
+        self.assertEqual(stats["states"], {SUBMITTED: 20})
+        self.assertPaidOnce(20)
+
+    def test_memos_use_prefetched_keys(self):
+        payout = self.payout()
+        payout.run()
+        rows = {row["idx"]: row for row in payout.journal.items(payout.batch)}
+        self.assertEqual(rows[0]["memo_to"], f"ciphered:memo:key-{self.items[0][0]}")
+        self.assertEqual(rows[0]["memo_from"], f"ciphered:memo:key-{SENDER}")
+        self.assertEqual(rows[2]["memo_to"], "")
+
+    def test_failures_leave_no_nonce_gap(self):
+        self.currency.no_key.add(self.items[3][0])  ## fails before signing
+        self.node.fail_sign.add(self.node.nonce + 5)
+        self.node.fail_submit.add(self.node.nonce + 10)
+        payout = self.payout()
+        stats = payout.run()
+        self.assertEqual(stats["states"], {SUBMITTED: 17, FAILED: 2, SIGNED: 1})
+        failed_submit = payout._rows(SIGNED)[0]
+        self.assertEqual(failed_submit["error"], "connection reset")
+        stats = self.payout().run()
+        self.assertEqual(stats["states"], {SUBMITTED: 18, FAILED: 2})
+        self.assertPaidOnce(18)
+
+
+if __name__ == "__main__":
+    unittest.main()
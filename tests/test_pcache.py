@@ -0,0 +1,107 @@
+import os
+import tempfile
+import time
+import unittest
+
+from pyc3l.pcache import PersistentTTLCache
+from pyc3l.ApiCommunication import ApiCommunication
+
+
+class test_PersistentTTLCache(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._old_cache_dir = os.environ.get("PYC3L_CACHE_DIR")
+        os.environ["PYC3L_CACHE_DIR"] = self._tmpdir.name
+        ## instances are memoized by arguments: one label per test
+        self.cache = PersistentTTLCache(f"test-{self.id()}", ttl=60)
+
+    def tearDown(self):
+        if self._old_cache_dir is None:
+            del os.environ["PYC3L_CACHE_DIR"]
+        else:
+            os.environ["PYC3L_CACHE_DIR"] = self._old_cache_dir
+        self._tmpdir.cleanup()
+
+    def test_bulk_and_delete(self):
+        self.cache.set_many({"a": 1, "b": 2, "c": 3})
+        self.cache["d"] = 4
+        self.assertEqual(self.cache.get_many(["a", "c", "d", "x"]), {"a": 1, "c": 3, "d": 4})
+        del self.cache["a"]
+        with self.assertRaises(KeyError):
+            self.cache["a"]
+        with self.assertRaises(KeyError):
+            del self.cache["a"]
+        self.assertEqual(self.cache.get_many(["a", "b"]), {"b": 2})
+
+    def test_expiry(self):
+        self.cache.set_many({"a": 1, "b": 2})
+        self.cache.ttl = 0.05
+        time.sleep(0.1)
+        self.cache["c"] = 3
+        self.assertEqual(self.cache.get_many(["a", "b", "c"]), {"c": 3})
+        with self.assertRaises(KeyError):
+            self.cache["a"]
+
+
+class FakeKeysApi:
+    def __init__(self):
+        self.requests = []
+
+    def get(self, params):
+        self.requests.append(params["addr"])
+        if params["addr"].startswith("0xnokey"):
+            return {}
+        return {"public_message_key": f"key-{params['addr']}"}
+
+
+class FakeEndpoint:
+    def __init__(self):
+        self.keys = FakeKeysApi()
+
+
+class FakePyc3l:
+    def __init__(self):
+        self.endpoint = FakeEndpoint()
+
+
+class test_message_keys(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._old_cache_dir = os.environ.get("PYC3L_CACHE_DIR")
+        os.environ["PYC3L_CACHE_DIR"] = self._tmpdir.name
+        cache = PersistentTTLCache(f"test-{self.id()}", ttl=60)
+        self.currency = type("Currency", (ApiCommunication, ), {
+            "message_key_cache": property(lambda self: cache),
+        })("Test", FakePyc3l())
+        self.requests = self.currency._pyc3l.endpoint.keys.requests
+
+    def tearDown(self):
+        if self._old_cache_dir is None:
+            del os.environ["PYC3L_CACHE_DIR"]
+        else:
+            os.environ["PYC3L_CACHE_DIR"] = self._old_cache_dir
+        self._tmpdir.cleanup()
+
+    def test_prefetch_and_invalidate(self):
+        keys = self.currency.prefetchMessageKeys(["0xA1", "0xa2", "0xnokey"])
+        self.assertEqual(keys, {"0xa1": "key-0xa1", "0xa2": "key-0xa2"})
+        self.assertEqual(sorted(self.requests), ["0xa1", "0xa2", "0xnokey"])
+
+        ## cached ones are not fetched again, key-less ones are
+        del self.requests[:]
+        self.assertEqual(len(self.currency.prefetchMessageKeys(["0xa1", "0xnokey"])), 1)
+        self.assertEqual(self.requests, ["0xnokey"])
+
+        del self.requests[:]
+        self.currency.invalidateMessageKeys("0xA1", "0xunknown")
+        self.currency.prefetchMessageKeys(["0xa1", "0xa2"])
+        self.assertEqual(self.requests, ["0xa1"])
+
+        del self.requests[:]
+        self.currency.invalidateMessageKeys()
+        self.currency.prefetchMessageKeys(["0xa1", "0xa2"])
+        self.assertEqual(sorted(self.requests), ["0xa1", "0xa2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
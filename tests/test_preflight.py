@@ -0,0 +1,157 @@
+import threading
+import unittest
+
+from pyc3l.ApiCommunication import ApiCommunication
+
+
+ADMIN = "0x" + "a" * 40
+SENDER = "0x" + "1" * 40
+DEST = "0x" + "2" * 40
+LOCKED = "0x" + "3" * 40
+
+
+class Account:
+    def __init__(self, address):
+        self.address = address
+
+
+class FakeContract:
+    """Account getters of the comchain contract, recording the reads"""
+
+    def __init__(self):
+        self.accounts = {
+            ADMIN: {"Type": 2, "IsActive": True},
+            SENDER: {"Type": 0, "IsActive": True, "NantBalance": 50.0},
+            DEST: {"Type": 0, "IsActive": True, "NantBalance": 0.0},
+            LOCKED: {"Type": 1, "IsActive": False,
+                     "CmLimitMin": -10.0, "CmLimitMax": 20.0},
+        }
+        self.reads = []
+        self.barrier = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, label):
+        if not label.startswith("getAccount"):
+            raise AttributeError(label)
+        field = label[len("getAccount"):]
+
+        def read(address):
+            with self._lock:
+                self.reads.append((field, address))
+            if self.barrier is not None:
+                ## only passes if all the expected reads run at once
+                self.barrier.wait()
+            return self.accounts[address][field]
+        return read
+
+    def _get_contract_fn_hexs(self, fn):
+        return [("0x" + "c" * 40, fn)]
+
+
+class FakePyc3l:
+    endpoint = "https://node.example.com"
+
+    def __init__(self):
+        self.block = 10
+        self.block_requests = 0
+        self.sent = []
+
+    def getBlockNumber(self):
+        self.block_requests += 1
+        return hex(self.block)
+
+    def getTrInfos(self, address):
+        return {"balance": "10000000"}
+
+    def send_transaction(self, fn, data, account, message_from="", message_to=""):
+        self.sent.append((fn[1], data, account.address))
+        return "0xhash"
+
+
+class test_preflight(unittest.TestCase):
+    def setUp(self):
+        self.pyc3l = FakePyc3l()
+        self.currency = ApiCommunication("Test", self.pyc3l)
+        self.currency._metadata = {"server": {
+            "contract_1": "0x" + "c" * 40, "contract_2": "0x" + "d" * 40,
+        }}
+        self.contract = self.currency._comchain = FakeContract()
+
+    def test_concurrent_grouped_reads(self):
+        self.contract.barrier = threading.Barrier(3, timeout=5)
+        self.currency.transferNant(Account(SENDER), DEST, 10)
+        self.assertEqual(sorted(self.contract.reads), [
+            ("IsActive", SENDER), ("IsActive", DEST), ("NantBalance", SENDER),
+        ])
+        self.assertEqual(self.pyc3l.sent[0][0], "nantTransfer")
+
+        ## the same read is made once
+        self.contract.barrier = None
+        self.contract.reads.clear()
+        infos = self.currency._preflight([
+            ("IsActive", SENDER), ("NantBalance", SENDER), ("IsActive", SENDER),
+        ])
+        self.assertEqual(len(infos), 2)
+        self.assertEqual(len(self.contract.reads), 2)
+
+    def test_snapshot(self):
+        snapshot = self.currency.snapshot([SENDER, DEST])
+        snapshot[ADMIN.lower()] = {"IsValidAdmin": True, "HasEnoughGas": True}
+        self.contract.reads.clear()
+        self.currency.transferNant(Account(SENDER), DEST, 10, snapshot=snapshot)
+        self.currency.pledge(Account(ADMIN), DEST, 5, snapshot=snapshot)
+        self.assertEqual(self.contract.reads, [])
+        self.assertEqual(self.pyc3l.block_requests, 0)
+        self.assertEqual(len(self.pyc3l.sent), 2)
+
+        ## snapshot values are trusted: the transfer is refused locally
+        snapshot[SENDER.lower()]["NantBalance"] = 1.0
+        with self.assertRaises(Exception):
+            self.currency.transferNant(Account(SENDER), DEST, 10, snapshot=snapshot)
+        self.assertEqual(self.contract.reads, [])
+
+    def test_admin_cache(self):
+        for _ in range(3):
+            self.currency.checkAdmin(ADMIN)
+        ## checks in a row: one read of the status and of the block
+        self.assertEqual(
+            sorted(self.contract.reads), [("IsActive", ADMIN), ("Type", ADMIN)]
+        )
+        self.assertEqual(self.pyc3l.block_requests, 1)
+
+        self.currency.ADMIN_CACHE_TTL = 0
+        self.contract.reads.clear()
+        self.currency.checkAdmin(ADMIN)
+        self.assertEqual(self.contract.reads, [])
+        self.assertEqual(self.pyc3l.block_requests, 2)
+
+        ## a new block invalidates the status
+        self.pyc3l.block += 1
+        self.contract.accounts[ADMIN]["IsActive"] = False
+        with self.assertRaises(Exception):
+            self.currency.checkAdmin(ADMIN)
+        self.assertEqual(len(self.contract.reads), 2)
+
+    def test_lock_unlock_reads(self):
+        self.currency.checkAdmin(ADMIN)
+        self.contract.reads.clear()
+        ## already in the requested state: only its status is read
+        self.assertIsNone(self.currency.disable(Account(ADMIN), LOCKED))
+        self.assertEqual(self.contract.reads, [("IsActive", LOCKED)])
+        self.assertEqual(self.pyc3l.sent, [])
+
+        self.contract.reads.clear()
+        self.currency.enable(Account(ADMIN), LOCKED)
+        self.assertEqual(sorted(self.contract.reads), [
+            ("CmLimitMax", LOCKED), ("CmLimitMin", LOCKED),
+            ("IsActive", LOCKED), ("Type", LOCKED),
+        ])
+        fn, data, _address = self.pyc3l.sent[0]
+        self.assertEqual(fn, "setAccountParam")
+        self.assertEqual(int(data[64:128], 16), 1)    ## status
+        self.assertEqual(int(data[128:192], 16), 1)   ## type
+        self.assertEqual(int(data[192:256], 16), 2000)  ## limit max
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+## pyc3l first: it patches ``inspect`` for eth_account dependencies
+from pyc3l.rawtx import RawTxQueue, sign_many, submit_queue
+
+from eth_account import Account
+from eth_utils import to_checksum_address
+
+
+PRIVATE_KEY = "0x" + "11" * 32
+FN = (to_checksum_address("0x" + "c" * 40), "0xa5f7c148")
+
+
+class FakeAccount:
+    privateKey = PRIVATE_KEY
+    address = Account.from_key(PRIVATE_KEY).address
+
+
+class FakeNode:
+    def __init__(self):
+        self.accepted = []
+        self.timeout_on = set()   ## accepted, but the call raises
+        self.reject_on = set()    ## not accepted, the call raises
+
+    def send_raw_transaction(self, raw_tx, memo_from, memo_to):
+        if raw_tx in self.reject_on:
+            self.reject_on.discard(raw_tx)
+            raise Exception("connection refused")
+        if raw_tx in self.accepted:
+            raise Exception("known transaction")
+        self.accepted.append(raw_tx)
+        if raw_tx in self.timeout_on:
+            raise Exception("read timed out")
+        return {"ok": True}
+
+    def getTransactionInfo(self, tx_hash):
+        return {"hash": tx_hash} if f"0x{tx_hash}" in self.hashes else {}
+
+    @property
+    def hashes(self):
+        return set(self.raw_to_hash[raw] for raw in self.accepted)
+
+
+class test_rawtx(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.queue = RawTxQueue(os.path.join(self._tmpdir.name, "queue.jsonl"))
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_sign_and_submit_round_trip(self):
+        requests = [
+            {"fn": FN, "data": f"{i:064x}", "nonce": 3 + i, "gas_price": 1,
+             "meta": {"i": i}}
+            for i in range(10)
+        ]
+        self.assertEqual(
+            sign_many(requests, FakeAccount(), self.queue, processes=2, chunksize=4),
+            10,
+        )
+        records = self.queue.pending()
+        self.assertEqual([r["nonce"] for r in records], list(range(3, 13)))
+        self.assertEqual(records[0]["meta"], {"i": 0})
+
+        node = FakeNode()
+        node.raw_to_hash = {r["raw_tx"]: r["hash"] for r in records}
+        node.timeout_on.add(records[2]["raw_tx"])
+        node.reject_on.add(records[5]["raw_tx"])
+        ## accepted despite the error, then stopped by a real failure
+        self.assertEqual(submit_queue(node, self.queue), (5, 1))
+        self.assertEqual(len(self.queue), 5)
+
+        ## resume
+        self.assertEqual(submit_queue(node, self.queue), (5, 0))
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(node.accepted, [r["raw_tx"] for r in records])
+        self.assertEqual(submit_queue(node, self.queue), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
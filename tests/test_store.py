@@ -0,0 +1,335 @@
+import os
+import random
+import unittest
+
+try:
+    import pyarrow
+except ImportError:  ## optional dependency
+    pyarrow = None
+
+from pyc3l.store import TxStore, range_union, curate_block_date
+
+from .helpers import CacheDirMixin, make_tx, random_tx
+
+
+class test_TxStore(CacheDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = self.tx_store()
+
+    def test_add_block_incremental_state(self):
+        random.seed(0)
+        blocks = random.sample(range(200), 120)
+        ranges, dates = [], {}
+        for b in blocks:
+            self.store.add_block(b, 1000 + b)
+            ## reference implementation
+            ranges = range_union((b, b), *ranges)
+            dates[b] = 1000 + b
+            dates = curate_block_date(dates, ranges)
+        self.store.commit()
+
+        self.assertEqual(self.store.current_ranges(), ranges)
+        self.assertEqual(self.store.current_block_dates, dates)
+        for b in range(200):
+            self.assertEqual(self.store.has_block(b), b in blocks)
+
+    def test_blocks_between(self):
+        for b in list(range(10, 20)) + list(range(30, 40)):
+            self.store.add_block(b, 1000 + b * 5)
+        self.store.commit()
+        self.assertEqual(self.store.block_times.get(15), 1075)
+        self.assertEqual(self.store.blocks_between(1075, 1075 + 4), (15, 15))
+        self.assertEqual(self.store.blocks_between(1000 + 12 * 5, 1000 + 33 * 5), (12, 33))
+        self.assertEqual(self.store.blocks_between(), (10, 39))
+        self.assertIsNone(self.store.blocks_between(2000, 3000))
+
+    def test_add_block_is_transactional(self):
+        self.store.add_block(10, 1000)
+        self.store.rollback()
+        self.assertEqual(self.store.current_ranges(), [])
+        self.store.add_block(10, 1000)
+        self.store.commit()
+        self.assertEqual(self.store.current_ranges(), [(10, 10)])
+
+    def test_schema_migrations(self):
+        self.store._init()
+        self.assertEqual(
+            self.store.schema_version, len(TxStore.SCHEMA_MIGRATIONS)
+        )
+        indexes = set(
+            name for (name, ) in self.store._sqlite3_conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        )
+        self.assertIn("idx_tx_received_at", indexes)
+
+    def test_bulk_ingest(self):
+        txs = (make_tx(i, block=i // 10) for i in range(2500))
+        self.store._init()
+        conn = self.store._sqlite3_conn
+        (journal_mode, ) = conn.execute("PRAGMA journal_mode").fetchone()
+        with self.store.bulk_ingest():
+            self.assertEqual(self.store.add_txs(txs, batch_size=1000), 2500)
+        (nb, ) = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()
+        self.assertEqual(nb, 2500)
+        self.assertEqual(
+            conn.execute("PRAGMA journal_mode").fetchone()[0], journal_mode
+        )
+        self.assertFalse(os.path.exists(f"{self.store.cache_tx_db}-wal"))
+
+    def test_indexes_restored_after_interrupted_bulk_ingest(self):
+        def indexes(store):
+            return set(
+                name for (name, ) in store._sqlite3_conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' "
+                    "AND tbl_name = 'transactions' AND sql IS NOT NULL"
+                )
+            )
+        self.store._init()
+        expected = indexes(self.store)
+        self.assertEqual(len(expected), len(TxStore.TX_INDEXES))
+        ## as left by a process killed within ``bulk_ingest()``
+        for name in expected:
+            self.store.execute(f"DROP INDEX {name}")
+        self.store.commit()
+        self.store.close()
+        self.store = self.tx_store()
+        self.store._init()
+        self.assertEqual(indexes(self.store), expected)
+
+    def test_rollups_match_raw_aggregates(self):
+        random.seed(0)
+        store = self.tx_store("test_safe", ["0xsafe"])
+        addresses = ["0xa", "0xb", "0xsafe"]
+
+        def tx(i):
+            return random_tx(i, addresses, amounts=(-100, 10000), received_at=i * 7200)
+
+        store.add_txs(tx(i) for i in range(1000))
+        for i in range(1000, 1100):
+            store.add_tx(tx(i))
+        store.commit()
+        ## configurations registered later are computed from raw data
+        stores = [
+            store,
+            self.tx_store("test_safe", None),
+            self.tx_store("test_safe", ["0xa", "0xsafe"]),
+        ]
+        for s in stores:
+            for granularity in TxStore.ROLLUP_GRANULARITIES:
+                self.assertEqual(
+                    list(s._record_sql(granularity)),
+                    list(s._record_sql(granularity, use_rollups=False)),
+                )
+
+    def test_rollups_rebuilt_on_rowid_reuse(self):
+        def tx(i, amount):
+            return make_tx(i, received_at=i * 86400, amount=amount)
+
+        self.store.add_txs(tx(i, 100) for i in range(10))
+        self.store.commit()
+        list(self.store._record_sql("%Y-%m-%d"))
+        ## last transactions removed, their rowids given to new ones
+        self.store.execute("DELETE FROM transactions WHERE rowid > 7")
+        self.store.add_txs(tx(i, 1000) for i in range(20, 22))
+        self.store.add_txs(tx(i, 1000) for i in range(22, 25))
+        self.store.commit()
+        for granularity in TxStore.ROLLUP_GRANULARITIES:
+            self.assertEqual(
+                list(self.store._record_sql(granularity)),
+                list(self.store._record_sql(granularity, use_rollups=False)),
+            )
+
+    def test_rollups_skip_undated_transactions(self):
+        self.store.add_txs(make_tx(i, received_at=i * 86400) for i in range(5))
+        self.store.add_tx(make_tx(5, received_at=None))
+        self.store.commit()
+        self.store.add_tx(make_tx(6, received_at=6 * 86400))
+        self.store.commit()
+        for granularity in TxStore.ROLLUP_GRANULARITIES + ("%Y",):
+            records = list(self.store._record_sql(granularity))
+            self.assertNotIn(None, [record[0] for record in records])
+            self.assertEqual(
+                records,
+                list(self.store._record_sql(granularity, use_rollups=False)),
+            )
+        self.assertEqual(sum(r[4] for r in self.store._record_sql()), 6)
+
+    def test_rollups_of_current_config_only(self):
+        other = self.tx_store("test", ["0xb"])
+        other._init()
+        self.store.add_txs(make_tx(i) for i in range(10))
+        self.store.commit()
+        last_rowids = dict(self.store._sqlite3_conn.execute(
+            "SELECT config, last_rowid FROM rollup_configs"))
+        self.assertEqual(last_rowids, {"": 10, other._rollup_config: 0})
+        ## caught up with when used again
+        self.assertEqual(
+            list(other._record_sql()), list(other._record_sql(use_rollups=False))
+        )
+        other.close()
+
+        self.assertEqual(self.store.prune_rollup_configs(), [other._rollup_config])
+        configs = [config for (config, ) in self.store._sqlite3_conn.execute(
+            "SELECT DISTINCT config FROM rollups")]
+        self.assertEqual(configs, [""])
+
+    def test_record_sql_safe_wallets(self):
+        store = self.tx_store("test_safe", ["0xsafe", "0xsafe2"])
+        txs = [
+            ("pledge", "0xa", "0xb", 100),          ## top-up
+            ("pledge", "0xa", "0xsafe", 200),       ## to a safe wallet: ignored
+            ("transfer", "0xsafe", "0xb", 400),     ## top-up
+            ("transfer", "0xa", "0xb", 800),        ## transfer
+            ("transfer", "0xa", "0xsafe2", 1600),   ## reconversion
+        ]
+        store.add_txs(
+            make_tx(i, caller=sender, type=kind, sender=sender,
+                    receiver=receiver, amount=amount)
+            for i, (kind, sender, receiver, amount) in enumerate(txs)
+        )
+        store.commit()
+        expected = [("1970-01", 5.0, 2, 8.0, 1, 16.0, 1, -11.0)]
+        self.assertEqual(list(store._record_sql()), expected)
+        self.assertEqual(list(store._record_sql(use_rollups=False)), expected)
+
+    def test_records_group_matrix(self):
+        random.seed(0)
+        addresses = ["0x%d" % i for i in range(10)]
+        address_groups = {"shops": addresses[:3], "users": addresses[3:8]}
+        txs = [
+            random_tx(i, addresses, received_at=i * 3600 * 5)
+            for i in range(1000)
+        ]
+        self.store.add_txs(txs)
+        self.store.commit()
+
+        ## reference implementation
+        groups = {a: g for g, addrs in address_groups.items() for a in addrs}
+        expected = {}
+        for tx in txs:
+            day = tx["received_at"] // 86400
+            matrix = expected.setdefault(day, {})
+            if tx["type"] not in ("pledge", "transfer"):
+                continue
+            sender = "bank" if tx["type"] == "pledge" else groups.get(tx["sender"])
+            cell = matrix.setdefault(sender, {}).setdefault(
+                groups.get(tx["receiver"]), {"total": 0, "nb": 0})
+            cell["total"] += tx["amount"]
+            cell["nb"] += 1
+
+        records = {
+            unit: {s: dict(r) for s, r in matrix.items()}
+            for unit, matrix in self.store.records(
+                "%Y-%m-%d", address_groups=address_groups, pledge_group="bank")
+        }
+        self.assertEqual(len(records), len(expected))
+        for unit, day in zip(sorted(records), sorted(expected)):
+            self.assertEqual(records[unit], expected[day])
+
+    def test_balance_index(self):
+        random.seed(0)
+        addresses = ["0x%d" % i for i in range(8)]
+        txs = [
+            random_tx(i, addresses, ("pledge", "transfer", "transfer", None),
+                      block=i // 3)
+            for i in range(600)
+        ]
+        store = self.tx_store("test_balances", balance_index=True)
+        ## blocks synced in shuffled chunks, as when filling gaps
+        chunks = [txs[i:i + 60] for i in range(0, len(txs), 60)]
+        random.shuffle(chunks)
+        for chunk in chunks:
+            store.add_txs(chunk)
+            store.commit()
+
+        balances, expected = {}, {}
+        for tx in txs:
+            if tx["type"] == "transfer":
+                balances[tx["sender"]] = balances.get(tx["sender"], 0) - tx["amount"]
+            if tx["type"] in ("pledge", "transfer"):
+                balances[tx["receiver"]] = balances.get(tx["receiver"], 0) + tx["amount"]
+            expected[tx["block"]] = dict(balances)
+        for block in (0, 57, 123, 199):
+            for address in addresses:
+                self.assertEqual(
+                    store.balance_at(address, block),
+                    expected[block].get(address, 0),
+                )
+        statement = list(store.statement(addresses[0]))
+        self.assertEqual(statement[-1][4], balances[addresses[0]])
+        self.assertEqual(
+            sum(delta for _b, _t, _h, delta, _bal in statement), balances[addresses[0]]
+        )
+
+        store.rebuild_balance_index()
+        store.commit()
+        self.assertEqual(list(store.statement(addresses[0])), statement)
+
+    @unittest.skipIf(pyarrow is None, "requires pyarrow")
+    def test_export_incremental(self):
+        import pyarrow.parquet as pq
+
+        def txs(start, end):
+            return (make_tx(i, amount=i) for i in range(start, end))
+
+        directory = os.path.join(self.cache_dir, "export")
+        self.store.add_txs(txs(0, 250))
+        self.store.commit()
+        self.assertTrue(self.store.export(directory, batch_size=100))
+        self.assertIsNone(self.store.export(directory))
+        self.store.add_txs(txs(250, 300))
+        self.store.commit()
+        self.store.export(directory)
+
+        table = pq.read_table(directory)
+        self.assertEqual(sorted(table.column("amount").to_pylist()), list(range(300)))
+
+    @unittest.skipIf(pyarrow is None, "requires pyarrow")
+    def test_export_incremental_filtered(self):
+        import pyarrow.parquet as pq
+
+        def exported(directory):
+            return sorted(pq.read_table(directory).column("block").to_pylist())
+
+        self.store.add_txs(make_tx(i) for i in range(100))
+        self.store.commit()
+        directory = os.path.join(self.cache_dir, "export")
+        self.store.export(directory, start_block=50)
+        ## rows excluded by a filter are still exported with another one
+        self.store.export(directory, end_block=79)
+        self.assertEqual(
+            exported(directory), sorted(list(range(50, 100)) + list(range(80)))
+        )
+        self.store.add_txs(make_tx(i) for i in range(100, 150))
+        self.store.commit()
+        path = self.store.export(directory, start_block=50)
+        self.assertEqual(
+            sorted(pq.read_table(path).column("block").to_pylist()),
+            list(range(100, 150)),
+        )
+        self.assertIsNone(self.store.export(directory, end_block=79))
+
+    @unittest.skipIf(pyarrow is None, "requires pyarrow")
+    def test_export_rowid_reuse(self):
+        import pyarrow.parquet as pq
+
+        directory = os.path.join(self.cache_dir, "export")
+        self.store.add_txs(make_tx(i) for i in range(10))
+        self.store.commit()
+        self.store.export(directory)
+        ## last transactions removed, their rowids given to new ones
+        self.store.execute("DELETE FROM transactions WHERE rowid > 7")
+        self.store.add_txs(make_tx(i) for i in range(20, 25))
+        self.store.commit()
+        path = self.store.export(directory)
+        self.assertEqual(
+            sorted(pq.read_table(path).column("block").to_pylist()),
+            list(range(7)) + list(range(20, 25)),
+        )
+        self.assertIsNone(self.store.export(directory))
+
+
+if __name__ == "__main__":
+    unittest.main()
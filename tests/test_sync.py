@@ -0,0 +1,104 @@
+import unittest
+
+from pyc3l import Pyc3l
+from pyc3l.sync import BlockSync
+
+from .helpers import CacheDirMixin
+
+
+class FakeNode:
+    """Node serving blocks of one transaction each on ``block.get``"""
+
+    def __init__(self, hash_only=()):
+        self.fail_on = set()
+        self.hash_only = set(hash_only)
+        self.requests = []
+        self.api = self
+        self.block = FakeBlockApi(self)
+
+    def get(self):  ## health check
+        return {}
+
+    def block_data(self, nb):
+        tx = {
+            "hash": f"0x{nb:064x}", "blockNumber": hex(nb),
+            "from": "0x" + "c" * 40, "to": "0x" + "9" * 40,
+            "input": "0x12345678",
+        }
+        return {
+            "number": hex(nb), "timestamp": hex(1000 + nb * 5),
+            "transactions": [tx["hash"] if nb in self.hash_only else tx],
+        }
+
+
+class FakeBlockApi:
+    def __init__(self, node):
+        self.node = node
+
+    def get(self, params):
+        nb = int(params["block"], 16)
+        self.node.requests.append(nb)
+        if nb in self.node.fail_on:
+            raise Exception("Connection reset")
+        return self.node.block_data(nb)
+
+
+class test_BlockSync(CacheDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = self.tx_store()
+        self.pyc3l = Pyc3l(endpoint="https://node.example.com")
+        self.pyc3l._contract_hex_to_currency = {}
+
+    def block_sync(self, node):
+        return BlockSync(
+            self.pyc3l, self.store, chunk_size=10, workers=2,
+            max_retries=0, endpoints=[node],
+        )
+
+    def nb_txs(self):
+        (nb, ) = self.store._sqlite3_conn.execute(
+            "SELECT COUNT(*) FROM transactions").fetchone()
+        return nb
+
+    def test_resume(self):
+        node = FakeNode()
+        node.fail_on.add(25)
+        with self.assertRaises(Exception):
+            self.block_sync(node).sync((0, 49))
+        ## only whole chunks were committed
+        self.assertEqual(self.store.current_ranges(), [(0, 19)])
+        self.assertEqual(self.nb_txs(), 20)
+
+        node.fail_on.clear()
+        node.requests.clear()
+        metrics = self.block_sync(node).sync((0, 49))
+        self.assertEqual(sorted(node.requests), list(range(20, 50)))
+        self.assertEqual(metrics.blocks_done, 30)
+        self.assertEqual(self.store.current_ranges(), [(0, 49)])
+        self.assertEqual(self.nb_txs(), 50)
+
+    def test_gap_in_range(self):
+        node = FakeNode()
+        for nb in range(10, 20):
+            self.store.add_block(nb, 1000 + nb * 5)
+        self.store.commit()
+        self.block_sync(node).sync((0, 29))
+        self.assertEqual(
+            sorted(node.requests), list(range(0, 10)) + list(range(20, 30))
+        )
+        self.assertEqual(self.store.current_ranges(), [(0, 29)])
+        self.assertEqual(self.store.block_times.get(25), 1125)
+
+    def test_hash_only_transactions(self):
+        node = FakeNode(hash_only=[3])
+        with self.assertRaises(Exception):
+            self.block_sync(node).sync((0, 9))
+        self.assertFalse(self.store.has_block(3))
+        self.assertEqual(self.nb_txs(), 0)
+        with self.assertRaises(ValueError):
+            self.block_sync(node).block_rows(node.block_data(3))
+
+
+if __name__ == "__main__":
+    unittest.main()
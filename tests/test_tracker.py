@@ -0,0 +1,74 @@
+import unittest
+
+from pyc3l.tracker import TxTracker
+
+
+class FakeChain:
+    """Block source mining a new block at each ``getBlockNumber`` call"""
+
+    def __init__(self, head=100):
+        self.head = head
+        self.blocks = {}
+        self.scheduled = {}   ## block number -> hashes to include
+        self.mined = {}       ## hash -> block number, before tracking
+        self.info_requests = 0
+
+    def getBlockNumber(self):
+        self.head += 1
+        self.blocks[self.head] = {
+            "number": hex(self.head),
+            "transactions": [
+                {"hash": h, "blockNumber": hex(self.head)}
+                for h in self.scheduled.get(self.head, [])
+            ],
+        }
+        return hex(self.head)
+
+    def getBlockByNumber(self, nb):
+        return self.blocks.get(nb)
+
+    def getLostTransactions(self, hashes):
+        return []
+
+    def getTransactionInfo(self, tx_hash):
+        self.info_requests += 1
+        block = self.mined.get(f"0x{tx_hash}")
+        return {"transaction": {
+            "hash": f"0x{tx_hash}",
+            "blockNumber": None if block is None else hex(block),
+        }}
+
+    def BCTransaction(self, tx_hash, data=None):
+        return data
+
+
+class test_TxTracker(unittest.TestCase):
+    def test_inclusion_and_timeout(self):
+        chain = FakeChain()
+        tracker = TxTracker(chain, poll_interval=0.01, lost_after=None)
+        included, never = "0x" + "a" * 64, "0x" + "b" * 64
+        target = chain.head + 5
+        chain.scheduled[target] = [included]
+        calls = []
+        future = tracker.track(included, lambda h, tx: calls.append(h))
+        other = tracker.track(never)
+        self.assertEqual(tracker.wait(timeout=0.5), {never})
+        self.assertEqual(future.result(timeout=0)["blockNumber"], hex(target))
+        self.assertEqual(calls, [included])
+        self.assertFalse(other.done())
+        self.assertEqual(chain.info_requests, 0)
+
+    def test_check_mined(self):
+        chain = FakeChain()
+        tracker = TxTracker(chain)
+        mined, pending = "0x" + "c" * 64, "0x" + "d" * 64
+        chain.mined[mined] = 42
+        futures = tracker.track_many([mined, pending], check_mined=True)
+        self.assertEqual(futures[mined].result(timeout=0)["blockNumber"], hex(42))
+        self.assertFalse(futures[pending].done())
+        self.assertEqual(chain.info_requests, 2)
+        self.assertEqual(len(tracker), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import time
+import unittest
+
+from unittest import mock
+
+## pyc3l first: it patches ``inspect`` for eth_account dependencies
+from pyc3l import wallet as wallet_module
+from pyc3l.wallet import Wallet, clear_sessions
+
+from eth_account import Account
+
+
+def make_wallet(password, name="Test"):
+    account = Account.create()
+    keystore = Account.encrypt(account.key, password, kdf="pbkdf2", iterations=1000)
+    keystore["address"] = keystore["address"].lower()
+    keystore["server"] = {"name": name}
+    return keystore, account.address
+
+
+class test_Wallet(unittest.TestCase):
+    def setUp(self):
+        clear_sessions()
+        self.keystore, self.address = make_wallet("secret")
+        self.decrypt = mock.patch.object(
+            wallet_module, "_decrypt", wraps=wallet_module._decrypt
+        ).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        clear_sessions()
+
+    def test_no_session_by_default(self):
+        Wallet(self.keystore).unlock("secret")
+        wallet = Wallet(self.keystore)
+        wallet.unlock("secret")
+        self.assertEqual(wallet._account.address, self.address)
+        self.assertEqual(self.decrypt.call_count, 2)
+
+    def test_session_reuse_and_expiry(self):
+        Wallet(self.keystore).unlock("secret", session_ttl=60)
+        Wallet(self.keystore).unlock("secret", session_ttl=60)
+        self.assertEqual(self.decrypt.call_count, 1)
+        with self.assertRaises(ValueError):  ## wrong password never reuses it
+            Wallet(self.keystore).unlock("wrong", session_ttl=60)
+
+        clear_sessions()
+        Wallet(self.keystore).unlock("secret", session_ttl=0.05)
+        time.sleep(0.1)
+        Wallet(self.keystore).unlock("secret", session_ttl=0.05)
+        self.assertEqual(self.decrypt.call_count, 4)
+
+    def test_lock_closes_session(self):
+        wallet = Wallet(self.keystore)
+        wallet.unlock("secret", session_ttl=60)
+        wallet.lock()
+        self.assertIsNone(wallet._account)
+        Wallet(self.keystore).unlock("secret", session_ttl=60)
+        self.assertEqual(self.decrypt.call_count, 2)
+
+    def test_unlock_many(self):
+        mock.patch.stopall()  ## keys are derived in other processes
+        keystore2, address2 = make_wallet("other")
+        wallets = Wallet.unlock_many(
+            [Wallet(self.keystore), Wallet(keystore2)], ["secret", "other"],
+            max_workers=2, session_ttl=60,
+        )
+        self.assertEqual([w._account.address for w in wallets], [self.address, address2])
+        self.assertEqual(len(wallet_module._sessions), 2)
+
+        clear_sessions()
+        wallets = [Wallet(self.keystore), Wallet(keystore2)]
+        with self.assertRaises(ValueError):
+            Wallet.unlock_many(wallets, ["secret", "wrong"], max_workers=2,
+                               session_ttl=60)
+        self.assertEqual([w._account for w in wallets], [None, None])
+        self.assertEqual(wallet_module._sessions, {})
+
+
+if __name__ == "__main__":
+    unittest.main()